@@ -5,7 +5,6 @@ Main application entry point.
 """
 import streamlit as st
 import pandas as pd
-import json
 import os
 import base64
 import random
@@ -15,25 +14,34 @@ from datetime import datetime
 
 # --- Module imports ---
 from modules.config import (
-    LOGO_PATH, IMAGES_DIR, USERS_JSON_PATH, ICONS_DIR, BASE_DIR
+    LOGO_PATH, IMAGES_DIR, ICONS_DIR, BASE_DIR
 )
 from modules.utils import (
     find_closest_bar, get_coordinates, extract_arrondissement, find_best_image_match
 )
 from modules.auth import (
-    load_users, verify_user, contains_profanity
+    restore_session, revoke_session_token, verify_user, contains_profanity
 )
 from modules.data import (
-    load_data, load_games_from_csv, load_forum_comments, load_game_requests,
-    load_complete_games
+    load_data, load_games_from_csv, load_complete_games
 )
 from modules.forum import (
-    save_forum_comment, save_game_request,
+    create_forum_post, create_game_request,
     add_reaction, add_comment_to_post, delete_comment,
-    delete_forum_post, report_forum_post,
-    approve_game_request, reject_game_request
+    delete_forum_post, report_forum_post, dismiss_report,
+    approve_game_request, reject_game_request,
+    sync_forum_session, live_forum_updates, forum_page, forum_cursors_to,
+    forum_bar_activity, forum_bar_posts
 )
+from modules.forum_service import RECENT_DAYS
+from modules.git_ops import get_git_sync, sync_enabled
+from modules.forum_records import Post, GameRequest
 from modules.components import render_bar_detail_card, render_login_page
+from modules.avatars import avatar_css, avatar_html, avatar_thumbnail_path
+from modules.autocomplete import autocomplete, get_prefix_index
+from modules.inventory import (
+    get_bar_inventory, MATCH_ANY, MATCH_ALL, PARTY_MAX_PLAYERS, PARTY_AGES, PARTY_MINUTES
+)
 
 import importlib
 import modules.game_library
@@ -101,48 +109,37 @@ if st.session_state.role == 'guest':
     if "avatar_select" in qp:
         st.session_state.show_login_form = True
 
+    # Old unsigned links: a bare username no longer opens a session
     if "session_user" in qp:
-        saved_user = qp["session_user"]
+        del qp["session_user"]
+
+    if "session" in qp:
         try:
-            if os.path.exists(USERS_JSON_PATH):
-                with open(USERS_JSON_PATH, 'r', encoding='utf-8') as f:
-                    users = json.load(f)
-                    user = next((u for u in users if u['username'] == saved_user), None)
-                    if user:
-                        st.session_state.logged_in = True
-                        st.session_state.username = saved_user
-                        st.session_state.role = user.get('role', 'user')
-                        st.session_state.user_icon = user.get('icon', '')
-                        if st.session_state.role == 'admin':
-                            st.session_state.admin_logged_in = True
-                            st.session_state.show_admin_panel = True
-                        st.toast(f"Session restaurée : Bon retour {saved_user} !", icon="🔄")
+            user = restore_session(qp["session"])
+            if user:
+                st.session_state.logged_in = True
+                st.session_state.username = user['username']
+                st.session_state.role = user.get('role', 'user')
+                st.session_state.user_icon = user.get('icon', '')
+                if st.session_state.role == 'admin':
+                    st.session_state.admin_logged_in = True
+                    st.session_state.show_admin_panel = True
+                st.toast(f"Session restaurée : Bon retour {user['username']} !", icon="🔄")
+            else:
+                del qp["session"]
         except:
             pass
 
 # ============================================================
 # LOAD DATA
 # ============================================================
-if len(st.session_state.forum_posts) == 0:
-    st.session_state.forum_posts = load_forum_comments()
-    # Parse JSON comments on load
-    for post in st.session_state.forum_posts:
-        if 'comments' in post and isinstance(post['comments'], str):
-            try:
-                post['comments'] = json.loads(post['comments'])
-            except:
-                if '|||' in post['comments']:
-                    legacy = post['comments'].split('|||')
-                    post['comments'] = [{'author': 'Anonyme', 'text': c, 'timestamp': ''} for c in legacy if c]
-                else:
-                    post['comments'] = []
+# Shared forum state: pulls only what changed since this session's last run
+sync_forum_session()
 
 if st.session_state.games_data.empty:
     st.session_state.games_data = load_games_from_csv()
 if st.session_state.complete_games_data.empty:
     st.session_state.complete_games_data = load_complete_games()
-if len(st.session_state.game_requests) == 0:
-    st.session_state.game_requests = load_game_requests()
 
 # ============================================================
 # HEADER WITH PROFILE / LOGIN BUTTON (top-right)
@@ -171,8 +168,8 @@ with col_user:
         col_avatar, col_name = st.columns([1, 2])
 
         with col_avatar:
-            user_icon_path = st.session_state.user_icon
-            if user_icon_path and os.path.exists(user_icon_path):
+            user_icon_path = avatar_thumbnail_path(st.session_state.user_icon, 64)
+            if user_icon_path:
                 st.image(user_icon_path, width=50)
             else:
                 st.markdown("👤", unsafe_allow_html=True)
@@ -186,8 +183,9 @@ with col_user:
                 st.session_state.user_icon = ""
                 st.session_state.admin_logged_in = False
                 st.session_state.show_admin_panel = False
-                if "session_user" in st.query_params:
-                    del st.query_params["session_user"]
+                if "session" in st.query_params:
+                    revoke_session_token(st.query_params["session"])
+                    del st.query_params["session"]
                 st.rerun()
     else:
         # --- Guest: show login/register button ---
@@ -274,18 +272,18 @@ try:
         if st.session_state.get('last_selected_bar') in all_bar_names_sorted:
             default_idx = all_bar_names_sorted.index(st.session_state['last_selected_bar']) + 1
 
-        # search_query = st.selectbox(
-        #     "🔍 Rechercher un bar spécifique :",
-        #     options=[""] + all_bar_names_sorted,
-        #     index=default_idx,
-        #     key="search_bar_main",
-        #     on_change=on_search_change
-        # )
-
-        search_query = []
-
-        if search_query:
-            st.session_state['last_selected_bar'] = search_query
+        def on_bar_pick(selection):
+            # Same effect as a map click: select the bar, clear the arrondissement filter
+            if selection:
+                st.session_state['search_bar_main'] = selection[0]
+                st.session_state['last_selected_bar'] = selection[0]
+                st.session_state['reset_arr_filter'] = True
+
+        bar_index = get_prefix_index('bars', all_bar_names_sorted, tuple(all_bar_names_sorted))
+        autocomplete(
+            "🔍 Rechercher un bar spécifique :", bar_index, key="bar_autocomplete",
+            multi=False, placeholder="Nom du bar…", on_change=on_bar_pick
+        )
 
         # --- Arrondissement Filter ---
         if 'Code postal' in gdf_bar.columns:
@@ -326,6 +324,7 @@ try:
                         coords = get_coordinates(user_address)
                         if coords:
                             u_lat, u_lon = coords
+                            st.session_state['user_location'] = (u_lat, u_lon)
                             closest_name, dist = find_closest_bar(u_lat, u_lon, gdf_bar)
                             if closest_name:
                                 st.success(f"Le bar le plus proche est : **{closest_name}** ({dist:.2f} km)")
@@ -425,18 +424,71 @@ try:
 
         st.markdown('<div class="scroll-indicator">⬇️ Résultats plus bas ⬇️</div>', unsafe_allow_html=True)
 
+        # --- Party-fit search: bars with the most games suited to the group ---
+        with st.expander("🎉 Quel bar pour notre groupe ?"):
+            col_party_p, col_party_a, col_party_t = st.columns(3)
+            with col_party_p:
+                party_players = st.number_input("👥 Joueurs", min_value=1, max_value=PARTY_MAX_PLAYERS, value=4, key="party_players")
+            with col_party_a:
+                party_age = st.selectbox("🎂 Âge du plus jeune", PARTY_AGES, index=len(PARTY_AGES) - 1,
+                                         format_func=lambda a: f"{a} ans" + (" et +" if a == PARTY_AGES[-1] else ""), key="party_age")
+            with col_party_t:
+                party_minutes = st.selectbox("⏱️ Temps de jeu", PARTY_MINUTES, index=PARTY_MINUTES.index(60),
+                                             format_func=lambda m: f"{m} min", key="party_minutes")
+
+            party_inventory = get_bar_inventory()
+            if party_inventory is not None:
+                party_bars, party_counts = party_inventory.party_fit(party_players, party_age, party_minutes, limit=5)
+                if len(party_bars):
+                    from modules.game_library import _show_bar_dialog
+                    for b, n in zip(party_bars, party_counts):
+                        party_bar_name = party_inventory.bar_names[b]
+                        if st.button(f"🍷 {party_bar_name} · {n} jeux adaptés", key=f"party_bar_{party_bar_name}", use_container_width=True):
+                            st.session_state['_dialog_bar_name'] = party_bar_name
+                            _show_bar_dialog()
+                else:
+                    st.info("Aucun bar ne propose de jeu adapté à ces critères.")
+
         # --- Game Search ---
-        if not st.session_state.games_data.empty:
-            all_games = sorted(st.session_state.games_data['game'].unique())
-            selected_games_multi = st.multiselect("🔍 Rechercher un ou plusieurs jeux :", all_games, placeholder="Sélectionnez des jeux")
+        games_inventory = get_bar_inventory()
+        if games_inventory is not None:
+            # Only the top completions reach the browser, not the thousands of titles
+            game_names = games_inventory.game_names
+            game_index = get_prefix_index('bar_games', game_names, games_inventory.version, games_inventory.bars_per_game)
+            selected_games_multi = autocomplete(
+                "🔍 Rechercher un ou plusieurs jeux :", game_index, key="games_autocomplete",
+                placeholder="Tapez le nom d'un jeu…"
+            )
         else:
             st.write("Chargement des jeux...")
             selected_games_multi = []
 
-        # --- Filter Data ---
-        if selected_games_multi:
-            bars_with_sel_games = st.session_state.games_data[st.session_state.games_data['game'].isin(selected_games_multi)]['bar_name'].unique()
-            map_data = gdf_bar[gdf_bar['Nom'].isin(bars_with_sel_games)]
+        # --- Match mode: any / all / at least k of the selected games ---
+        match_mode = MATCH_ANY
+        if len(selected_games_multi) > 1:
+            col_mode, col_k = st.columns([2, 1])
+            with col_mode:
+                mode_label = st.radio(
+                    "Le bar doit proposer :",
+                    ["Au moins un des jeux", "Tous les jeux", "Au moins…"],
+                    horizontal=True, key="games_match_mode"
+                )
+            if mode_label == "Tous les jeux":
+                match_mode = MATCH_ALL
+            elif mode_label == "Au moins…":
+                with col_k:
+                    match_mode = st.number_input("Nombre de jeux", min_value=1, max_value=len(selected_games_multi),
+                                                 value=min(2, len(selected_games_multi)), key="games_match_k")
+
+        # --- Filter Data (bitset query, bars ranked by number of matching games) ---
+        inventory = get_bar_inventory()
+        match_counts = {}
+        if selected_games_multi and inventory is not None:
+            bar_ids, counts = inventory.match_bars(selected_games_multi, match_mode)
+            match_counts = {inventory.bar_names[b]: int(c) for b, c in zip(bar_ids, counts)}
+            rank = {name: i for i, name in enumerate(match_counts)}
+            map_data = gdf_bar[gdf_bar['Nom'].isin(rank)]
+            map_data = map_data.iloc[map_data['Nom'].map(rank).to_numpy().argsort(kind='stable')]
         else:
             map_data = gdf_bar
 
@@ -453,14 +505,12 @@ try:
             m2 = folium.Map(location=[center_lat, center_lon], zoom_start=12, tiles="https://mt1.google.com/vt/lyrs=m&x={x}&y={y}&z={z}", attr="Google", scrollWheelZoom=False)
 
             for idx, row in map_data.iterrows():
-                bar_games_count = len(st.session_state.games_data[st.session_state.games_data['bar_name'] == row['Nom']])
+                bar_id = inventory.bar_ids.get(row['Nom']) if inventory is not None else None
+                bar_games_count = int(inventory.games_per_bar[bar_id]) if bar_id is not None else 0
 
                 if selected_games_multi:
-                    games_here = st.session_state.games_data[
-                        (st.session_state.games_data['bar_name'] == row['Nom']) &
-                        (st.session_state.games_data['game'].isin(selected_games_multi))
-                    ]['game'].tolist()
-                    games_snippet = "<br>• " + "<br>• ".join(games_here[:5])
+                    games_here = inventory.games_at(row['Nom'], selected_games_multi)
+                    games_snippet = f" {len(games_here)}/{len(selected_games_multi)}<br>• " + "<br>• ".join(games_here[:5])
                     if len(games_here) > 5:
                         games_snippet += "..."
                 else:
@@ -507,7 +557,8 @@ try:
                         st.markdown(
                             f"<div style='text-align:center; padding:0.5rem 0; font-weight:600;'>"
                             f"🍷 {st.session_state.jeux_selected_bar}"
-                            f"<br><span style='font-size:0.75rem; opacity:0.6;'>{curr_idx + 1} / {len(bar_names)}</span>"
+                            f"<br><span style='font-size:0.75rem; opacity:0.6;'>{curr_idx + 1} / {len(bar_names)}"
+                            f" · {match_counts.get(st.session_state.jeux_selected_bar, 0)}/{len(selected_games_multi)} jeux</span>"
                             f"</div>",
                             unsafe_allow_html=True
                         )
@@ -529,10 +580,7 @@ try:
 
                     # Show matched games as Bibliothèque-style cards
                     st.markdown("### 🎲 Jeux recherchés disponibles ici")
-                    found_games = st.session_state.games_data[
-                        (st.session_state.games_data['bar_name'] == sel_bar_name) &
-                        (st.session_state.games_data['game'].isin(selected_games_multi))
-                    ]['game'].tolist()
+                    found_games = inventory.games_at(sel_bar_name, selected_games_multi)
 
                     # Trigger game detail dialog if requested
                     if st.session_state.get('_open_jeux_game_dialog', False):
@@ -541,20 +589,12 @@ try:
                         _show_game_dialog()
 
                     # Render matched games as cards (same style as Bibliothèque)
-                    from modules.game_library import _render_card_html
+                    from modules.game_library import _render_card_html, match_catalogue_game
                     for g in sorted(found_games):
                         if not st.session_state.complete_games_data.empty:
-                            # Exact match first
-                            game_match = st.session_state.complete_games_data[
-                                st.session_state.complete_games_data['nom'].str.lower() == g.lower()
-                            ]
-                            # Fallback: partial/contains match
-                            if game_match.empty:
-                                game_match = st.session_state.complete_games_data[
-                                    st.session_state.complete_games_data['nom'].str.lower().str.contains(g.lower(), na=False)
-                                ]
-                            if not game_match.empty:
-                                game_info = game_match.iloc[0]
+                            # Exact (accent-insensitive) match first, then closest spelling
+                            game_info = match_catalogue_game(st.session_state.complete_games_data, g)
+                            if game_info is not None:
                                 # Render card HTML (same as Bibliothèque)
                                 card_html = _render_card_html(game_info, f"jeux_{g}")
                                 st.markdown(card_html, unsafe_allow_html=True)
@@ -604,17 +644,16 @@ try:
 
                 if st.form_submit_button("📤 Envoyer la demande"):
                     if req_user and req_game and req_bar:
-                        request = {
-                            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M"),
-                            'username': req_user,
-                            'bar_name': req_bar,
-                            'game_name': req_game,
-                            'action_type': req_action,
-                            'description': req_desc,
-                            'status': 'pending'
-                        }
-                        st.session_state.game_requests.append(request)
-                        save_game_request(request)
+                        request = GameRequest(
+                            timestamp=datetime.now().strftime("%Y-%m-%d %H:%M"),
+                            username=req_user,
+                            bar_name=req_bar,
+                            game_name=req_game,
+                            action_type=req_action,
+                            description=req_desc,
+                            status='pending'
+                        )
+                        create_game_request(request)
                         st.success("✅ Demande envoyée aux administrateurs !")
                     else:
                         st.error("⚠️ Veuillez remplir le nom, le bar et le jeu.")
@@ -630,14 +669,28 @@ try:
     # ============================================================
     with tab4:
         st.subheader("💬 Forum")
+        if st.toggle("🔄 Actualisation automatique", key="forum_live",
+                     help="Affiche les messages des autres joueurs sans recharger la page"):
+            live_forum_updates()
+
+        def toggle_forum_thread(post_id):
+            st.session_state.forum_open_threads ^= {post_id}
+
+        def open_forum_form(post_id, kind):
+            # One comment/report form at a time; clicking again closes it
+            current = st.session_state.get('forum_active_form')
+            st.session_state.forum_active_form = None if current == (post_id, kind) else (post_id, kind)
+
+        def show_forum_post(post_id):
+            cursors = forum_cursors_to(post_id)
+            if cursors is not None:
+                st.session_state.forum_cursors = cursors
         
         # --- Forum Map with Notifications ---
-        # Calculate active posts per bar
-        bar_post_counts = {}
-        for post in st.session_state.forum_posts:
-            b_name = post.get('bar')
-            if b_name and b_name != "N'importe quel Bar":
-                bar_post_counts[b_name] = bar_post_counts.get(b_name, 0) + 1
+        # Active / reported / recent posts per bar, from the shared per-bar index
+        bar_activity = forum_bar_activity()
+        bar_activity.pop("N'importe quel Bar", None)
+        bar_activity.pop('', None)
         
         col_fmap, col_fpanel = st.columns([2, 1])
         
@@ -647,7 +700,7 @@ try:
             
             for idx, row in gdf_bar.iterrows():
                 b_name = row['Nom']
-                post_count = bar_post_counts.get(b_name, 0)
+                post_count, reported_count, recent_count = bar_activity.get(b_name, (0, 0, 0))
                 
                 if post_count > 0:
                     # Bar has active posts: sleek notification badge
@@ -677,6 +730,8 @@ try:
                 <div style="font-family: 'Inter', sans-serif; min-width: 150px; background:#F8F4E6; color:#333; padding:10px; border-radius:10px; border: 1px solid #E5E0D8;">
                     <h5 style="color: #2F4F4F; margin-bottom: 5px; font-weight:bold;">{b_name}</h5>
                     <p style="margin: 2px 0; font-size:12px; color:#555;">{post_count} post(s) actif(s)</p>
+                    <p style="margin: 2px 0; font-size:12px; color:#555;">{recent_count} ces {RECENT_DAYS} derniers jours</p>
+                    {f'<p style="margin: 2px 0; font-size:12px; color:#FF3B30;">🚩 {reported_count} signalé(s)</p>' if reported_count else ''}
                 </div>
                 """
                 
@@ -692,27 +747,27 @@ try:
             # Detect map click
             if f_map_data and f_map_data.get("last_object_clicked_tooltip"):
                 clicked_bar = f_map_data["last_object_clicked_tooltip"]
-                if clicked_bar in bar_post_counts:
+                if clicked_bar in bar_activity:
                     st.session_state["forum_selected_bar"] = clicked_bar
         
         with col_fpanel:
             st.markdown("#### 📣 Notifications")
             sel_fbar = st.session_state.get("forum_selected_bar")
-            if sel_fbar and sel_fbar in bar_post_counts:
+            if sel_fbar and sel_fbar in bar_activity:
                 st.markdown(f"**{sel_fbar}**")
-                # Find posts for this bar
-                bar_posts = [(i, p) for i, p in enumerate(st.session_state.forum_posts) if p.get('bar') == sel_fbar]
+                bar_posts = forum_bar_posts(sel_fbar)
                 
                 with st.container(height=300):
-                    for p_idx, p in bar_posts:
+                    for p in bar_posts:
                         st.markdown(f"""
                         <div style="background:#FAF8F2; padding:12px; border-radius:8px; margin-bottom:12px; border-left: 4px solid #D35400; border: 1px solid #EAEADF; box-shadow: 0 2px 4px rgba(0,0,0,0.05);">
-                            <div style="font-size: 0.8em; color: #7F8C8D;">{p['username']} • {p['timestamp']}</div>
-                            <div style="font-weight: bold; margin: 4px 0; color: #2C3E50;">🎮 {p['game']}</div>
-                            <div style="font-size: 0.9em; margin-bottom: 8px; color: #34495E;">{p['message'][:50]}{'...' if len(p['message'])>50 else ''}</div>
-                            <a href="#post-{p_idx}" style="color: #C0392B; text-decoration: none; font-size: 0.85em; font-weight: 600;">🔗 Voir le post</a>
+                            <div style="font-size: 0.8em; color: #7F8C8D;">{p.username} • {p.timestamp}</div>
+                            <div style="font-weight: bold; margin: 4px 0; color: #2C3E50;">🎮 {p.game}</div>
+                            <div style="font-size: 0.9em; margin-bottom: 8px; color: #34495E;">{p.message[:50]}{'...' if len(p.message)>50 else ''}</div>
                         </div>
                         """, unsafe_allow_html=True)
+                        # The post may be on another feed page: open the page holding it
+                        st.button("🔗 Voir le post", key=f"goto_{p.id}", on_click=show_forum_post, args=(p.id,))
             else:
                 st.info("Cliquez sur un badge rouge sur la carte pour voir les posts liés à ce bar.")
 
@@ -733,21 +788,16 @@ try:
                         if contains_profanity(message) or contains_profanity(game_choice):
                             st.error("⚠️ Votre message contient des termes inappropriés et n'a pas été publié.")
                         else:
-                            post = {
-                                'username': st.session_state.username,
-                                'user_icon': st.session_state.user_icon,
-                                'bar': bar_choice,
-                                'game': game_choice,
-                                'when': date_time,
-                                'message': message,
-                                'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M"),
-                                'reported': False,
-                                'report_reason': '',
-                                'reactions': '',
-                                'comments': []
-                            }
-                            st.session_state.forum_posts.insert(0, post)
-                            save_forum_comment(post)
+                            post = Post(
+                                username=st.session_state.username,
+                                user_icon=st.session_state.user_icon,
+                                bar=bar_choice,
+                                game=game_choice,
+                                when=date_time,
+                                message=message,
+                                timestamp=datetime.now().strftime("%Y-%m-%d %H:%M")
+                            )
+                            create_forum_post(post)
                             st.success("✅ Publié")
                             st.rerun()
                     else:
@@ -756,136 +806,151 @@ try:
         st.markdown("---")
         st.markdown("**Posts Récents**")
 
-        if len(st.session_state.forum_posts) == 0:
+        # Feed pages are addressed by cursor; the stack holds the cursors of
+        # the pages above the current one (None = newest page)
+        cursors = st.session_state.setdefault('forum_cursors', [None])
+        page_posts, next_cursor = forum_page(cursors[-1])
+        if not page_posts and len(cursors) > 1:
+            # The page emptied (deletes): back to the newest posts
+            st.session_state.forum_cursors = cursors = [None]
+            page_posts, next_cursor = forum_page(None)
+        open_threads = st.session_state.setdefault('forum_open_threads', set())
+        active_form = st.session_state.get('forum_active_form')
+
+        if len(page_posts) == 0:
             st.info("Aucun post")
         else:
-            for idx, post in enumerate(st.session_state.forum_posts):
+            # Every post avatar below points into this single sprite sheet
+            st.markdown(avatar_css(display_sizes=(50,), sprite_size=64), unsafe_allow_html=True)
+            for post in page_posts:
+                pid = post.id
                 is_admin = st.session_state.get('role') == 'admin'
                 col1, col2 = st.columns([4, 1])
                 with col1:
                     # Anchor for scrolling
-                    st.markdown(f"<div id='post-{idx}'></div>", unsafe_allow_html=True)
+                    st.markdown(f"<div id='post-{pid}'></div>", unsafe_allow_html=True)
                     
-                    reported_flag = "🚩 " if post.get('reported', False) else ""
+                    reported_flag = "🚩 " if post.reported else ""
 
                     col_p_icon, col_p_info = st.columns([1, 8])
                     with col_p_icon:
-                        auth_icon = post.get('user_icon', '')
-                        if auth_icon and os.path.exists(auth_icon):
-                            st.image(auth_icon, width=50)
-                        else:
-                            st.write("👤")
+                        st.markdown(avatar_html(post.user_icon, display_size=50), unsafe_allow_html=True)
 
                     with col_p_info:
-                        st.markdown(f"{reported_flag}**{post['username']}** <span style='color:#8E8E93; font-size:0.8em'>• {post['timestamp']}</span>", unsafe_allow_html=True)
-                        if post.get('when'):
-                            st.markdown(f"📅 **{post['when']}**")
-                        st.markdown(f"📍 *{post['bar']}* — 🎮 *{post['game']}*")
+                        st.markdown(f"{reported_flag}**{post.username}** <span style='color:#8E8E93; font-size:0.8em'>• {post.timestamp}</span>", unsafe_allow_html=True)
+                        if post.when:
+                            st.markdown(f"📅 **{post.when}**")
+                        st.markdown(f"📍 *{post.bar}* — 🎮 *{post.game}*")
 
-                    st.markdown(f"<div style='background:#2C2C2E; color:#fff; padding:0.75rem; border-radius:0.625rem; margin-top:0.3rem;'>{post['message']}</div>", unsafe_allow_html=True)
+                    st.markdown(f"<div style='background:#2C2C2E; color:#fff; padding:0.75rem; border-radius:0.625rem; margin-top:0.3rem;'>{post.message}</div>", unsafe_allow_html=True)
 
                     # Reactions
-                    reactions = post.get('reactions', '')
-                    if reactions:
-                        if isinstance(reactions, str):
-                            try:
-                                reactions_dict = json.loads(reactions)
-                                reaction_display = ' '.join([f"{emoji} {count}" for emoji, count in reactions_dict.items()])
-                                st.markdown(f"**Réactions:** {reaction_display}")
-                            except:
-                                st.markdown(f"**Réactions:** {reactions}")
-                        else:
-                            st.markdown(f"**Réactions:** {reactions}")
+                    if post.reactions:
+                        st.markdown(f"**Réactions:** {post.reaction_summary()}")
 
                     st.markdown('<div class="reaction-row"></div>', unsafe_allow_html=True)
                     with st.container(horizontal=True):
-                        if st.button("👍", key=f"like_{idx}"):
-                            add_reaction(idx, "👍")
+                        if st.button("👍", key=f"like_{pid}"):
+                            add_reaction(pid, "👍")
                             st.rerun()
-                        if st.button("❤️", key=f"love_{idx}"):
-                            add_reaction(idx, "❤️")
+                        if st.button("❤️", key=f"love_{pid}"):
+                            add_reaction(pid, "❤️")
                             st.rerun()
-                        if st.button("😂", key=f"laugh_{idx}"):
-                            add_reaction(idx, "😂")
+                        if st.button("😂", key=f"laugh_{pid}"):
+                            add_reaction(pid, "😂")
                             st.rerun()
-                        if st.button("🎮", key=f"game_{idx}"):
-                            add_reaction(idx, "🎮")
+                        if st.button("🎮", key=f"game_{pid}"):
+                            add_reaction(pid, "🎮")
                             st.rerun()
 
                     # Comments
-                    comments = post.get('comments', [])
-                    if isinstance(comments, str):
-                        try:
-                            comments = json.loads(comments)
-                        except:
-                            comments = []
-
-                    if comments:
+                    comments = post.comments
+
+                    # Threads are collapsed: comments (and their delete buttons) are only rendered once opened
+                    thread_open = pid in open_threads
+                    with st.container(horizontal=True):
+                        if comments:
+                            st.button(f"{'🔽 Masquer' if thread_open else '💬 Voir'} les commentaires ({len(comments)})",
+                                      key=f"thread_{pid}", on_click=toggle_forum_thread, args=(pid,))
+                        if st.session_state.role != 'guest' and active_form != (pid, 'comment'):
+                            st.button("✍️ Commenter", key=f"open_comment_{pid}", on_click=open_forum_form, args=(pid, 'comment'))
+
+                    if comments and thread_open:
                         st.markdown("**Commentaires:**")
-                        for c_idx, comment in enumerate(comments):
+                        for comment in comments:
                             st.markdown(f"""
                             <div class="comment-box">
                                 <div class="comment-header">
-                                    <span class="comment-author">{comment.get('author', 'Anonyme')}</span>
-                                    <span>{comment.get('timestamp', '')}</span>
+                                    <span class="comment-author">{comment.author}</span>
+                                    <span>{comment.timestamp}</span>
                                 </div>
-                                <div class="comment-text">{comment.get('text', '')}</div>
+                                <div class="comment-text">{comment.text}</div>
                             </div>
                             """, unsafe_allow_html=True)
 
-                            is_comment_author = (comment.get('author') == st.session_state.username)
+                            is_comment_author = (comment.author == st.session_state.username)
                             if is_comment_author or is_admin:
-                                if st.button("🗑️", key=f"del_com_{idx}_{c_idx}"):
-                                    delete_comment(idx, c_idx)
+                                if st.button("🗑️", key=f"del_com_{pid}_{comment.id}"):
+                                    delete_comment(pid, comment.id)
                                     st.rerun()
 
-                    # Add comment
+                    # Add comment: the form only exists for the post being answered
                     if st.session_state.role != 'guest':
-                        with st.form(f"comment_{idx}"):
-                            col_c1, col_c2 = st.columns([1, 3])
-                            with col_c1:
-                                st.write(f"👤 {st.session_state.username}")
-                            with col_c2:
-                                c_text = st.text_input("Commentaire:", key=f"c_text_{idx}")
-
-                            if st.form_submit_button("💬 Commenter", type="primary"):
-                                if c_text:
-                                    if contains_profanity(c_text):
-                                        st.error("⚠️ Message inapproprié.")
+                        if active_form == (pid, 'comment'):
+                            with st.form(f"comment_{pid}"):
+                                col_c1, col_c2 = st.columns([1, 3])
+                                with col_c1:
+                                    st.write(f"👤 {st.session_state.username}")
+                                with col_c2:
+                                    c_text = st.text_input("Commentaire:", key=f"c_text_{pid}")
+
+                                if st.form_submit_button("💬 Commenter", type="primary"):
+                                    if c_text:
+                                        if contains_profanity(c_text):
+                                            st.error("⚠️ Message inapproprié.")
+                                        else:
+                                            add_comment_to_post(pid, st.session_state.username, c_text)
+                                            open_threads.add(pid)
+                                            st.session_state.forum_active_form = None
+                                            st.rerun()
                                     else:
-                                        add_comment_to_post(idx, st.session_state.username, c_text)
-                                        st.rerun()
-                                else:
-                                    st.error("Message requis")
+                                        st.error("Message requis")
                     else:
                         st.caption("🔒 Connectez-vous pour commenter.")
 
                 with col2:
-                    is_author = (post['username'] == st.session_state.username)
+                    is_author = (post.username == st.session_state.username)
                     if is_author or is_admin:
-                        if st.button("🗑️", key=f"del_post_{idx}", help="Supprimer mon post"):
-                            delete_forum_post(idx)
+                        if st.button("🗑️", key=f"del_post_{pid}", help="Supprimer mon post"):
+                            delete_forum_post(pid)
                             st.success("Supprimé")
                             st.rerun()
 
-                    if not post.get('reported', False):
-                        if f"show_report_{idx}" not in st.session_state:
-                            st.session_state[f"show_report_{idx}"] = False
-
-                        if st.button("🚩 Signaler", key=f"toggle_report_{idx}"):
-                            st.session_state[f"show_report_{idx}"] = not st.session_state[f"show_report_{idx}"]
+                    if not post.reported:
+                        st.button("🚩 Signaler", key=f"toggle_report_{pid}", on_click=open_forum_form, args=(pid, 'report'))
 
-                        if st.session_state[f"show_report_{idx}"]:
-                            with st.form(f"report_form_{idx}"):
+                        if active_form == (pid, 'report'):
+                            with st.form(f"report_form_{pid}"):
                                 reason = st.text_input("Raison :")
                                 if st.form_submit_button("Envoyer"):
-                                    report_forum_post(idx, reason)
-                                    st.session_state[f"show_report_{idx}"] = False
+                                    report_forum_post(pid, reason)
+                                    st.session_state.forum_active_form = None
                                     st.success("Signalé à l'admin")
                                     st.rerun()
 
                 st.markdown("---")
 
+        # Pagination (newest first)
+        col_prev, col_page, col_next = st.columns([1, 2, 1])
+        with col_prev:
+            if len(cursors) > 1:
+                st.button("← Plus récents", key="forum_prev", on_click=lambda: st.session_state.forum_cursors.pop())
+        with col_page:
+            st.caption(f"Page {len(cursors)}")
+        with col_next:
+            if next_cursor is not None:
+                st.button("Plus anciens →", key="forum_next", on_click=lambda: st.session_state.forum_cursors.append(next_cursor))
+
     # ============================================================
     # TAB 5: ADMIN
     # ============================================================
@@ -898,68 +963,87 @@ try:
 
             filtered_reqs = st.session_state.game_requests.copy()
             if status_filter == "En attente":
-                filtered_reqs = [r for r in filtered_reqs if r['status'] == 'pending']
+                filtered_reqs = [r for r in filtered_reqs if r.status == 'pending']
             elif status_filter == "Approuvé":
-                filtered_reqs = [r for r in filtered_reqs if r['status'] == 'approved']
+                filtered_reqs = [r for r in filtered_reqs if r.status == 'approved']
             elif status_filter == "Rejeté":
-                filtered_reqs = [r for r in filtered_reqs if r['status'] == 'rejected']
+                filtered_reqs = [r for r in filtered_reqs if r.status == 'rejected']
 
             st.write(f"**{len(filtered_reqs)} requête(s)**")
 
-            for idx, req in enumerate(filtered_reqs):
-                real_idx = st.session_state.game_requests.index(req)
+            for req in filtered_reqs:
+                req_id = req.id
 
-                status_icon = "🔵" if req['status'] == 'pending' else "✅" if req['status'] == 'approved' else "❌"
-                st.markdown(f"""<div class='bar-box'><strong>{status_icon} {req['game_name']} @ {req['bar_name']}</strong><br>
-                <small>Type: {req['action_type']}</small></div>""", unsafe_allow_html=True)
+                status_icon = "🔵" if req.status == 'pending' else "✅" if req.status == 'approved' else "❌"
+                st.markdown(f"""<div class='bar-box'><strong>{status_icon} {req.game_name} @ {req.bar_name}</strong><br>
+                <small>Type: {req.action_type}</small></div>""", unsafe_allow_html=True)
 
                 col1, col2 = st.columns([3, 1])
                 with col1:
-                    st.write(f"**Date:** {req['timestamp']}")
-                    st.write(f"**User:** {req['username']}")
-                    if req['description']:
-                        st.write(f"**Desc:** {req['description']}")
+                    st.write(f"**Date:** {req.timestamp}")
+                    st.write(f"**User:** {req.username}")
+                    if req.description:
+                        st.write(f"**Desc:** {req.description}")
                 with col2:
-                    if req['status'] == 'pending':
-                        if st.button("✅ Approuver", key=f"app_{real_idx}"):
-                            approve_game_request(real_idx)
+                    if req.status == 'pending':
+                        if st.button("✅ Approuver", key=f"app_{req_id}"):
+                            approve_game_request(req_id)
                             st.success("Approuvé")
                             st.rerun()
-                        if st.button("❌ Rejeter", key=f"rej_{real_idx}"):
-                            reject_game_request(real_idx)
+                        if st.button("❌ Rejeter", key=f"rej_{req_id}"):
+                            reject_game_request(req_id)
                             st.warning("Rejeté")
                             st.rerun()
                 st.markdown("---")
 
             st.markdown("### 🚨 Signalements Forum")
-            reported_posts = [i for i, p in enumerate(st.session_state.forum_posts) if p.get('reported', False)]
+            reported_posts = [p for p in st.session_state.forum_posts if p.reported]
 
             if reported_posts:
                 st.warning(f"{len(reported_posts)} post(s) signalé(s)")
-                for idx in reported_posts:
-                    post = st.session_state.forum_posts[idx]
+                for post in reported_posts:
+                    pid = post.id
                     st.markdown(f"""<div style='border: 1px solid #FF3B30; padding: 0.75rem; border-radius: 0.625rem; background:#2C2C2E;'>
-                    <strong>Auteur:</strong> {post['username']}<br>
-                    <strong>Message:</strong> {post['message']}<br>
-                    <strong>Raison du signalement:</strong> {post.get('report_reason', 'Non spécifiée')}
+                    <strong>Auteur:</strong> {post.username}<br>
+                    <strong>Message:</strong> {post.message}<br>
+                    <strong>Raison du signalement:</strong> {post.report_reason or 'Non spécifiée'}
                     </div>""", unsafe_allow_html=True)
 
                     col1, col2 = st.columns(2)
                     with col1:
-                        if st.button("🗑️ Supprimer le post", key=f"del_{idx}"):
-                            delete_forum_post(idx)
+                        if st.button("🗑️ Supprimer le post", key=f"del_{pid}"):
+                            delete_forum_post(pid)
                             st.success("Post supprimé")
                             st.rerun()
                     with col2:
-                        if st.button("✅ Ignorer (Retirer signalement)", key=f"ignore_{idx}"):
-                            st.session_state.forum_posts[idx]['reported'] = False
-                            save_forum_comment(st.session_state.forum_posts[idx])
+                        if st.button("✅ Ignorer (Retirer signalement)", key=f"ignore_{pid}"):
+                            dismiss_report(pid)
                             st.info("Signalement retiré")
                             st.rerun()
                     st.markdown("---")
             else:
                 st.info("Aucun signalement à traiter")
 
+            st.markdown("### 🔄 Synchronisation Git")
+            if not sync_enabled():
+                st.info("Synchronisation désactivée : pas de dépôt git ou pas de remote.")
+            else:
+                sync_status = get_git_sync().status()
+                col1, col2, col3, col4 = st.columns(4)
+                col1.metric("En attente de commit", sync_status['queued'])
+                col2.metric("Commits non poussés", sync_status['unpushed'])
+                latency = sync_status['last_push_latency']
+                col3.metric("Dernier push", f"{latency * 1000:.0f} ms" if latency is not None else "—")
+                col4.metric("Échecs (push / commit)", f"{sync_status['push_failures']} / {sync_status['commit_failures']}")
+                if sync_status['last_error']:
+                    st.caption(f"Dernière erreur : {sync_status['last_error']}")
+                if sync_status['unpushed'] and sync_status['retry_in']:
+                    st.caption(f"Prochain essai de push dans {sync_status['retry_in']:.0f} s")
+                if sync_status['last_pull_at']:
+                    last_pull = datetime.fromtimestamp(sync_status['last_pull_at']).strftime('%H:%M:%S')
+                    st.caption(f"Dernier pull : {last_pull} · {sync_status['pulls']} pulls, "
+                               f"{sync_status['pull_failures']} échecs")
+
 except FileNotFoundError:
     st.error("⚠️ Fichier introuvable")
 except Exception as e:
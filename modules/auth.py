@@ -1,55 +1,55 @@
 # -*- coding: utf-8 -*-
 """
-User authentication: load/save users, password hashing, login, registration, profanity filter.
+User authentication: load/save users, password hashing, login, registration,
+session tokens, profanity filter.
 """
 import os
 import ast
-import json
 import glob
 import hashlib
 import streamlit as st
 
-from modules.config import USERS_JSON_PATH, ICONS_DIR, INSULTS_PATH
-from modules.git_ops import push_changes
+from modules.config import ICONS_DIR, INSULTS_PATH
+from modules.storage import get_storage
+from modules.user_repository import UserRepository
+from modules.session_tokens import SessionTokens, load_secret
+
+
+@st.cache_resource(show_spinner=False)
+def get_user_repository():
+    """Process-wide users index (modules.user_repository)."""
+    return UserRepository(get_storage())
+
+
+def get_user(username):
+    """The user's record, or None (O(1), from memory)."""
+    return get_user_repository().get(username)
 
 
 def load_users():
-    """Load users from JSON file."""
-    if os.path.exists(USERS_JSON_PATH):
-        try:
-            with open(USERS_JSON_PATH, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return []
-    return []
+    """Every user record (users.json by default)."""
+    try:
+        return get_user_repository().all()
+    except Exception:
+        return []
 
 
 def save_users(users_list):
-    """Save users to JSON file and auto-commit."""
+    """
+    Save users to the storage backend (the 'files' backend also queues the
+    git commit). A user whose role or password changed is logged out.
+    """
     try:
-        with open(USERS_JSON_PATH, 'w', encoding='utf-8') as f:
-            json.dump(users_list, f, indent=4, ensure_ascii=False)
-            f.flush()
-            os.fsync(f.fileno())
+        repo, tokens = get_user_repository(), get_session_tokens()
+        users_list = list(users_list)
+        for i, user in enumerate(users_list):
+            old = repo.get(user.get('username'))
+            if old is not None and (old.get('role'), old.get('password')) != (user.get('role'), user.get('password')):
+                users_list[i] = dict(user, sessions_after=tokens.revoke_user(user['username']))
+        repo.save_all(users_list)
         st.toast("💾 Utilisateurs sauvegardés", icon="✅")
     except Exception as e:
-        st.error(f"❌ Erreur sauvegarde users.json : {e}")
-        return
-
-    # Auto-commit users.json
-    import subprocess
-    repo_dir = os.path.dirname(USERS_JSON_PATH)
-    try:
-        subprocess.run(['git', 'config', 'user.email', 'app@echec-map.com'], cwd=repo_dir, capture_output=True)
-        subprocess.run(['git', 'config', 'user.name', 'Echec Map Bot'], cwd=repo_dir, capture_output=True)
-        subprocess.run(['git', 'add', 'users.json'], cwd=repo_dir, capture_output=True)
-        result = subprocess.run(['git', 'commit', '-m', 'Update users'], cwd=repo_dir, capture_output=True, text=True)
-        if result.returncode == 0:
-            push_changes()
-        elif 'nothing to commit' not in result.stdout.lower():
-            st.warning(f"⚠️ Git commit échoué : {result.stderr}")
-    except Exception as e:
-        st.warning(f"⚠️ Git auto-commit échoué : {e}")
+        st.error(f"❌ Erreur sauvegarde utilisateurs : {e}")
 
 
 def hash_password(password):
@@ -59,51 +59,91 @@ def hash_password(password):
 
 def create_user(username, password, icon_path):
     """Create a new user. Returns (success, message, user_data)."""
-    users = load_users()
-    if any(u['username'] == username for u in users):
-        return False, "Ce nom d'utilisateur existe déjà.", None
-
     new_user = {
         'username': username,
         'password': hash_password(password),
         'icon': icon_path,
         'role': 'user'
     }
-    users.append(new_user)
-    save_users(users)
-
-    # Verify the write succeeded by re-reading
-    verification = load_users()
-    if not any(u['username'] == username for u in verification):
-        return False, "⚠️ Erreur : l'utilisateur n'a pas été sauvegardé. Réessayez.", None
+    try:
+        # The write is atomic and raises on failure: no need to read it back
+        if not get_user_repository().add(new_user):
+            return False, "Ce nom d'utilisateur existe déjà.", None
+    except Exception as e:
+        return False, f"⚠️ Erreur : l'utilisateur n'a pas été sauvegardé ({e}). Réessayez.", None
+    st.toast("💾 Utilisateurs sauvegardés", icon="✅")
 
     return True, "Compte créé avec succès !", new_user
 
 
 def verify_user(username, password):
     """Verify user credentials. Returns (success, user_data)."""
-    users = load_users()
-
     # Check for hardcoded admin
     if username == "admin" and password == "admin123":
-        if not any(u['username'] == 'admin' for u in users):
+        if get_user('admin') is None:
             admin_user = {
                 'username': 'admin',
                 'password': hash_password('admin123'),
                 'icon': '',
                 'role': 'admin'
             }
-            users.append(admin_user)
-            save_users(users)
+            try:
+                get_user_repository().add(admin_user)
+            except Exception as e:
+                st.error(f"❌ Erreur sauvegarde utilisateurs : {e}")
         return True, {'username': 'admin', 'role': 'admin', 'icon': ''}
 
-    encoded_pw = hash_password(password)
-    for user in users:
-        if user['username'] == username and user['password'] == encoded_pw:
-            return True, user
+    user = get_user(username)
+    if user is not None and user.get('password') == hash_password(password):
+        return True, user
     return False, None
 
 
+@st.cache_resource(show_spinner=False)
+def get_session_tokens():
+    """Process-wide token signer / validator (modules.session_tokens)."""
+    return SessionTokens(load_secret())
+
+
+def create_session_token(user_data):
+    """Signed token restoring this user's session (goes in the URL)."""
+    return get_session_tokens().issue(user_data['username'])
+
+
+def restore_session(token):
+    """
+    User record of a valid session token, or None (bad, expired or revoked
+    token; user gone). The role is the record's, not the token's.
+    """
+    claims = get_session_tokens().validate(token)
+    if claims is None:
+        return None
+    username, issued_at = claims
+    user = get_user(username)
+    # sessions_after (ms): set by end_sessions(), on this instance or another one
+    if user is None or issued_at <= user.get('sessions_after', 0):
+        return None
+    return user
+
+
+def end_sessions(username):
+    """
+    Invalidate every session token of this user issued until now. The time
+    is kept in the user record, so it holds on every instance and restart.
+    """
+    user = get_user(username)
+    if user is None:
+        return
+    get_user_repository().put(dict(user, sessions_after=get_session_tokens().revoke_user(username)))
+
+
+def revoke_session_token(token):
+    """Logout: this token, and the user's sessions on other devices, no longer restore a session."""
+    claims = get_session_tokens().validate(token)
+    if claims is not None:
+        end_sessions(claims[0])
+
+
 def get_available_icons():
     """Get list of available avatar icon paths."""
     if os.path.exists(ICONS_DIR):
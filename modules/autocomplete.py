@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Autocomplete for game and bar names.
+
+PrefixIndex is a sorted array of accent-folded keys (the full name and every
+suffix starting at a word boundary), so the completions of a prefix are one
+bisect range; the top N are picked by popularity with NumPy. The widget
+(frontend/autocomplete) only ever receives those N suggestions and the
+current selection, never the full option list.
+"""
+import os
+import bisect
+import numpy as np
+import streamlit as st
+import streamlit.components.v1 as components
+
+from modules.config import FRONTEND_DIR
+from modules.utils import fold_text
+
+MAX_SUGGESTIONS = 8
+_END = '\x7f'  # sorts after every folded character
+
+_autocomplete = components.declare_component("autocomplete", path=os.path.join(FRONTEND_DIR, "autocomplete"))
+
+
+class PrefixIndex:
+    """
+    Sorted-array prefix index over names.
+
+    Completions starting the name come first, then names with a later word
+    starting with the prefix; inside each group, higher weight (e.g. number
+    of bars stocking a game) first, then alphabetical.
+    """
+
+    def __init__(self, names, weights=None):
+        self.names = [str(n) for n in names]
+        folded = [fold_text(n) for n in self.names]
+        self._words = [f.split() for f in folded]
+        weights = np.zeros(len(self.names)) if weights is None else np.asarray(weights, dtype=float)
+        order = np.lexsort((np.array(folded, dtype=object).astype(str), -weights)) if self.names else []
+        self._rank = np.empty(len(self.names), dtype=np.int64)
+        self._rank[order] = np.arange(len(self.names))
+
+        entries = []
+        for i, f in enumerate(folded):
+            starts = [0] + [j + 1 for j, c in enumerate(f) if c == ' ']
+            entries.extend((f[s:], i, s == 0) for s in starts)
+        entries.sort()
+        self._keys = [e[0] for e in entries]
+        self._ids = np.array([e[1] for e in entries], dtype=np.int64)
+        self._full = np.array([e[2] for e in entries], dtype=bool)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _range(self, prefix):
+        return bisect.bisect_left(self._keys, prefix), bisect.bisect_left(self._keys, prefix + _END)
+
+    def complete(self, query, limit=MAX_SUGGESTIONS):
+        """Top completions for what the user typed so far."""
+        q = fold_text(query)
+        if not q:
+            return []
+        lo, hi = self._range(q)
+        ids = self._ids[lo:hi]
+        score = self._rank[ids] + np.where(self._full[lo:hi], 0, len(self.names))
+
+        words = q.split()
+        if len(words) > 1:
+            # Non-contiguous words ("aventuriers rail"): probe the longest
+            # word, keep names where every word starts one of their words
+            probe = max(words, key=len)
+            plo, phi = self._range(probe)
+            extra = [i for i in np.unique(self._ids[plo:phi])
+                     if all(any(w.startswith(x) for w in self._words[i]) for x in words)]
+            if extra:
+                extra = np.array(extra, dtype=np.int64)
+                ids = np.concatenate([ids, extra])
+                score = np.concatenate([score, self._rank[extra] + 2 * len(self.names)])
+
+        if len(ids) > limit * 4:
+            keep = np.argpartition(score, limit * 4)[:limit * 4]
+            ids, score = ids[keep], score[keep]
+        result = []
+        for i in ids[np.argsort(score, kind='stable')]:
+            if i not in result:
+                result.append(i)
+                if len(result) == limit:
+                    break
+        return [self.names[i] for i in result]
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def get_prefix_index(kind, _names, version, _weights=None):
+    """Shared PrefixIndex for one name list (kind), rebuilt when version changes."""
+    return PrefixIndex(_names, _weights)
+
+
+@st.fragment
+def _autocomplete_fragment(label, index, key, multi, placeholder, limit, on_change):
+    event = st.session_state.get(key) or {}
+    selected = st.session_state.setdefault(f'_{key}_selected', [])
+
+    if event.get('kind') == 'select' and event.get('nonce') != st.session_state.get(f'_{key}_nonce'):
+        st.session_state[f'_{key}_nonce'] = event.get('nonce')
+        known = set(index.names)
+        picked = [n for n in dict.fromkeys(event.get('selected') or []) if n in known]
+        if not multi:
+            picked = picked[-1:]
+        # A single-mode pick always counts: the same bar may be picked again
+        if picked != selected or (picked and not multi):
+            st.session_state[f'_{key}_selected'] = picked
+            if on_change is not None:
+                on_change(picked)
+            st.rerun()  # the page depends on the selection: full rerun
+
+    query = event.get('query', '') if event.get('kind') == 'query' else ''
+    _autocomplete(
+        label=label, placeholder=placeholder, multi=multi, query=query,
+        suggestions=index.complete(query, limit), selected=[] if not multi else selected,
+        key=key, default=None,
+    )
+
+
+def autocomplete(label, index, key, multi=True, placeholder="", limit=MAX_SUGGESTIONS, on_change=None):
+    """
+    Autocomplete input over a PrefixIndex. Keystrokes rerun only this widget
+    (st.fragment); picking a name reruns the app. Returns the selected names
+    (multi), or the last picked name in a one-element list (single: the box
+    clears after each pick, like a search field). on_change(selection) is
+    called when the selection changes.
+    """
+    _autocomplete_fragment(label, index, key, multi, placeholder, limit, on_change)
+    return list(st.session_state.get(f'_{key}_selected', []))
+
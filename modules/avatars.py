@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+Avatar assets: pre-sized thumbnails and a single sprite sheet built from ICONS_DIR.
+
+Run `python -m modules.avatars` to (re)build the assets ahead of deployment.
+"""
+import os
+import re
+import json
+import base64
+import ntpath
+import streamlit as st
+from PIL import Image
+
+from modules.config import ICONS_DIR, AVATAR_CACHE_DIR
+
+THUMB_SIZES = (64, 128)
+SPRITE_COLUMNS = 5
+WEBP_QUALITY = 85  # ~45 KB for the whole 64 px sheet vs ~55 KB per source PNG
+MANIFEST_NAME = 'manifest.json'
+
+
+def _natural_key(icon_id):
+    """Sort key so that icone_2 comes before icone_10."""
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', icon_id)]
+
+
+def _list_source_icons():
+    """Return {icon_id: path} for every PNG in ICONS_DIR."""
+    if not os.path.exists(ICONS_DIR):
+        return {}
+    icons = {}
+    for f in os.listdir(ICONS_DIR):
+        if f.lower().endswith('.png'):
+            icons[os.path.splitext(f)[0]] = os.path.join(ICONS_DIR, f)
+    return icons
+
+
+def _square(img, size):
+    """Center-crop an image to a square and resize it to size x size."""
+    w, h = img.size
+    side = min(w, h)
+    left, top = (w - side) // 2, (h - side) // 2
+    img = img.crop((left, top, left + side, top + side))
+    return img.resize((size, size), Image.LANCZOS)
+
+
+def _manifest_path():
+    return os.path.join(AVATAR_CACHE_DIR, MANIFEST_NAME)
+
+
+def _read_manifest():
+    try:
+        with open(_manifest_path(), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+
+def build_avatar_assets(force=False):
+    """
+    Build 64/128 px thumbnails and one sprite sheet per size into AVATAR_CACHE_DIR.
+
+    Assets are only rebuilt when ICONS_DIR changed since the last build.
+    Returns the manifest: icon ids in sprite order, grid columns and source mtime.
+    """
+    icons = _list_source_icons()
+    source_mtime = max((os.path.getmtime(p) for p in icons.values()), default=0)
+
+    manifest = _read_manifest()
+    if (not force and manifest
+            and manifest.get('source_mtime') == source_mtime
+            and sorted(manifest.get('ids', [])) == sorted(icons)):
+        return manifest
+
+    os.makedirs(AVATAR_CACHE_DIR, exist_ok=True)
+    ids = sorted(icons, key=_natural_key)
+    rows = max(1, -(-len(ids) // SPRITE_COLUMNS))
+
+    sprites = {
+        size: Image.new('RGBA', (SPRITE_COLUMNS * size, rows * size), (0, 0, 0, 0))
+        for size in THUMB_SIZES
+    }
+    for pos, icon_id in enumerate(ids):
+        with Image.open(icons[icon_id]) as src:
+            src = src.convert('RGBA')
+            for size in THUMB_SIZES:
+                thumb = _square(src, size)
+                thumb.save(os.path.join(AVATAR_CACHE_DIR, f"{icon_id}_{size}.webp"), quality=WEBP_QUALITY)
+                col, row = pos % SPRITE_COLUMNS, pos // SPRITE_COLUMNS
+                sprites[size].paste(thumb, (col * size, row * size))
+
+    for size, sheet in sprites.items():
+        sheet.save(os.path.join(AVATAR_CACHE_DIR, f"sprite_{size}.webp"), quality=WEBP_QUALITY)
+
+    manifest = {'ids': ids, 'columns': SPRITE_COLUMNS, 'rows': rows, 'source_mtime': source_mtime}
+    with open(_manifest_path(), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+@st.cache_resource
+def get_avatar_manifest():
+    """Build (if needed) and return the avatar manifest, once per process."""
+    manifest = build_avatar_assets()
+    manifest['positions'] = {icon_id: pos for pos, icon_id in enumerate(manifest['ids'])}
+    return manifest
+
+
+def resolve_icon_id(icon_field):
+    """
+    Resolve a user's stored `icon` value to a cached avatar id (e.g. 'icone_12').
+
+    Accepts bare file names, relative paths and the legacy absolute Windows paths
+    found in users.json / forum_comments.csv. Returns None for unknown icons.
+    """
+    if not isinstance(icon_field, str) or not icon_field.strip():
+        return None
+    # ntpath splits on both '\\' and '/', so it handles every stored flavour
+    icon_id = os.path.splitext(ntpath.basename(icon_field.strip()))[0]
+    if icon_id in get_avatar_manifest()['positions']:
+        return icon_id
+    return None
+
+
+def avatar_thumbnail_path(icon_field, size=64):
+    """Return the on-disk thumbnail for a user's icon, or None."""
+    icon_id = resolve_icon_id(icon_field)
+    if icon_id is None:
+        return None
+    path = os.path.join(AVATAR_CACHE_DIR, f"{icon_id}_{size}.webp")
+    return path if os.path.exists(path) else None
+
+
+@st.cache_resource
+def _sprite_as_base64(size):
+    with open(os.path.join(AVATAR_CACHE_DIR, f"sprite_{size}.webp"), 'rb') as f:
+        return base64.b64encode(f.read()).decode()
+
+
+def avatar_css(display_sizes=(50,), sprite_size=64):
+    """
+    Return a <style> block embedding the sprite sheet once, plus the
+    positioning classes for every avatar at the given display sizes.
+    """
+    manifest = get_avatar_manifest()
+    cols, rows = manifest['columns'], manifest['rows']
+    rules = [
+        f".avatar-s{sprite_size} {{background-image: url(data:image/webp;base64,{_sprite_as_base64(sprite_size)});"
+        f" background-repeat: no-repeat; display: inline-block; border-radius: 50%;}}"
+    ]
+    for d in display_sizes:
+        rules.append(
+            f".avatar-s{sprite_size}.avatar-d{d} {{width: {d}px; height: {d}px;"
+            f" background-size: {cols * d}px {rows * d}px;}}"
+        )
+        for icon_id, pos in manifest['positions'].items():
+            x, y = (pos % cols) * d, (pos // cols) * d
+            rules.append(f".avatar-s{sprite_size}.avatar-d{d}.avatar-{icon_id} {{background-position: -{x}px -{y}px;}}")
+    return "<style>" + "\n".join(rules) + "</style>"
+
+
+def avatar_html(icon_field, display_size=50, sprite_size=64, style=""):
+    """Return the HTML for one avatar; requires avatar_css() on the page."""
+    icon_id = resolve_icon_id(icon_field)
+    if icon_id is None:
+        return f"<span style='font-size:{display_size * 0.6:.0f}px;'>👤</span>"
+    return (f"<div class='avatar-s{sprite_size} avatar-d{display_size} avatar-{icon_id}'"
+            f" style='{style}'></div>")
+
+
+if __name__ == "__main__":
+    m = build_avatar_assets(force=True)
+    print(f"{len(m['ids'])} avatars -> {AVATAR_CACHE_DIR}")
+    for size in THUMB_SIZES:
+        sprite = os.path.join(AVATAR_CACHE_DIR, f"sprite_{size}.webp")
+        print(f"  sprite_{size}.webp: {os.path.getsize(sprite) / 1024:.1f} KB")
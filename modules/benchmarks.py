@@ -0,0 +1,901 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks and self-checks of the app's modules, on synthetic data and
+temporary files: `python -m modules.benchmarks <name> [options]`, names and
+options listed by --help.
+"""
+import os
+import time
+import argparse
+import tempfile
+
+
+def bench_forum_writer(args):
+    """Reaction click latency: synchronous CSV rewrite vs ForumWriter; crash recovery."""
+    import pandas as pd
+    from modules.forum_records import Post
+    from modules.forum_writer import ForumWriter
+
+    posts = {i: Post(id=i, username=f'user{i}', bar='Oya Café', game='Dixit', message='Qui est partant ?' * 4,
+                     timestamp='2026-01-01 19:00') for i in range(args.posts)}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'forum.csv')
+
+        def write_csv(dirty=None, reactions=None):
+            tmp_path = csv_path + '.tmp'
+            pd.DataFrame([p.to_row() for p in posts.values()]).to_csv(tmp_path, index=False, encoding='utf-8')
+            with open(tmp_path, 'rb') as f:
+                os.fsync(f.fileno())
+            os.replace(tmp_path, csv_path)
+
+        # Before: every click rewrites the CSV (git not included)
+        t0 = time.perf_counter()
+        for i in range(20):
+            posts[i].reactions["👍"] += 1
+            write_csv()
+        sync = (time.perf_counter() - t0) / 20 * 1000
+
+        writer = ForumWriter(os.path.join(tmp, 'journal'), write_csv)
+        writer.start()
+        t0 = time.perf_counter()
+        for i in range(args.clicks):
+            post = posts[i % 50]
+            post.reactions["👍"] += 1
+            writer.record('posts', post.id, post, reaction="👍")
+        queued = (time.perf_counter() - t0) / args.clicks * 1000
+        while writer.pending():
+            time.sleep(0.01)
+        print(f"{args.posts} posts: click latency {sync:.1f} ms (synchronous CSV rewrite) -> "
+              f"{queued:.3f} ms (write-behind); {args.clicks} clicks flushed in {writer.stats['flushes']} batch(es)")
+
+        # Crash before the flush: a new writer finds the changes in the journal
+        crashed = ForumWriter(os.path.join(tmp, 'crash'), lambda dirty, reactions: None)
+        for i in range(10):
+            crashed.record('posts', i, posts[i], reaction="❤️")
+        recovered = ForumWriter(os.path.join(tmp, 'crash'), write_csv).replay()
+        assert len(recovered) == 10, recovered
+        print(f"recovered after a crash: {len(recovered)} of 10 queued changes")
+
+
+def bench_git(args):
+    """GitSync against a local bare remote: batching, offline backoff, two instances merging."""
+    import json
+    import shutil
+    import subprocess
+    from modules.git_ops import GitSync, SYNC_FILES, COMMIT_MESSAGE
+    from modules.storage.files import read_records, write_records
+
+    def git(cwd, *args):
+        return subprocess.run(['git', *args], cwd=cwd, capture_output=True, text=True, check=True).stdout.strip()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        remote, work = os.path.join(tmp, 'remote.git'), os.path.join(tmp, 'work')
+        git(tmp, 'init', '-q', '--bare', remote)
+        git(tmp, 'clone', '-q', remote, work)
+        git(work, 'config', 'user.email', 'smoke@echec-map.com')
+        git(work, 'config', 'user.name', 'smoke')
+        git(work, 'commit', '-q', '--allow-empty', '-m', 'init')
+        git(work, 'push', '-q', '-u', 'origin', 'HEAD')
+
+        sync = GitSync(work, interval=0.5, backoff=(0.2, 1.0))
+
+        # 30 writes across the three files within the interval -> one commit, one push
+        t0 = time.monotonic()
+        for i in range(30):
+            with open(os.path.join(work, SYNC_FILES[i % 3]), 'a', encoding='utf-8') as f:
+                f.write(f"{i}\n")
+            sync.request()
+        request_ms = (time.monotonic() - t0) / 30 * 1000
+        while sync.status()['queued'] or sync.status()['unpushed']:
+            time.sleep(0.05)
+        remote_log = git(remote, 'log', '--format=%s').splitlines()
+        assert remote_log == [COMMIT_MESSAGE, 'init'], remote_log
+        assert git(remote, 'show', '--name-only', '--format=', 'HEAD').split() == sorted(SYNC_FILES)
+        status = sync.status()
+        print(f"30 writes -> {status['commits']} commit, {status['pushes']} push "
+              f"({status['last_push_latency'] * 1000:.0f} ms); request() {request_ms:.3f} ms")
+
+        # Remote unreachable: commits wait, pushes back off, then catch up
+        shutil.move(remote, remote + '.away')
+        for round_ in range(2):
+            with open(os.path.join(work, 'users.json'), 'a', encoding='utf-8') as f:
+                f.write(f"offline {round_}\n")
+            sync.request()
+            time.sleep(0.8)
+        status = sync.status()
+        assert status['push_failures'] >= 2 and status['unpushed'] == 2, status
+        print(f"remote down: {status['push_failures']} failed pushes, {status['unpushed']} commits waiting, "
+              f"next retry in {status['retry_in']:.1f} s")
+        shutil.move(remote + '.away', remote)
+        deadline = time.monotonic() + 5
+        while sync.status()['unpushed'] and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert not sync.status()['unpushed'], sync.status()
+        assert len(git(remote, 'log', '--format=%s').splitlines()) == 4
+        print(f"remote back: pushed, remote has {len(git(remote, 'log', '--format=%s').splitlines())} commits")
+        sync.close()
+
+    # Two instances on one remote: concurrent writes to the same files merge by record
+    def wait_idle(*syncs):
+        deadline = time.monotonic() + 10
+        while any(s.status()['queued'] or s.status()['unpushed'] for s in syncs):
+            assert time.monotonic() < deadline, [s.status() for s in syncs]
+            time.sleep(0.05)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        remote, seed = os.path.join(tmp, 'remote.git'), os.path.join(tmp, 'seed')
+        git(tmp, 'init', '-q', '--bare', remote)
+        git(tmp, 'clone', '-q', remote, seed)
+        post = {'id': 'p1', 'username': 'alice', 'message': 'Dixit ce soir ?', 'reactions': json.dumps({'👍': 1}),
+                'comments': '[]'}
+        write_records(os.path.join(seed, 'forum_comments.csv'), [post], 'csv')
+        write_records(os.path.join(seed, 'game_requests.csv'), [{'id': 'r1', 'game_name': 'Dixit', 'status': 'pending'}], 'csv')
+        write_records(os.path.join(seed, 'users.json'), [{'username': 'alice', 'role': 'user'}], 'json')
+        git(seed, '-c', 'user.name=seed', '-c', 'user.email=seed@echec-map.com', 'add', '.')
+        git(seed, '-c', 'user.name=seed', '-c', 'user.email=seed@echec-map.com', 'commit', '-q', '-m', 'seed')
+        git(seed, 'push', '-q', '-u', 'origin', 'HEAD')
+
+        instances = {}
+        for name, react, comment, user in (('a', '👍', None, 'bob'), ('b', '❤️', 'Partant !', 'carol')):
+            work = os.path.join(tmp, name)
+            git(tmp, 'clone', '-q', remote, work)
+            pulled = []
+            sync = GitSync(work, interval=0.2, backoff=(0.2, 1.0), pull_interval=0.5)
+            sync.on_pull(pulled.append)
+            instances[name] = (work, sync, pulled)
+            # Each instance: a new post, a reaction and maybe a comment on p1, a new user
+            path = os.path.join(work, 'forum_comments.csv')
+            rows = read_records(path, 'csv')
+            rows[0]['reactions'] = json.dumps(dict(json.loads(rows[0]['reactions']), **{react: 1}), ensure_ascii=False)
+            if comment:
+                rows[0]['comments'] = json.dumps([{'id': 'c1', 'author': name, 'text': comment}], ensure_ascii=False)
+            write_records(path, [dict(post, id=f'{name}1', username=name, reactions='', comments='[]')] + rows, 'csv')
+            users_path = os.path.join(work, 'users.json')
+            write_records(users_path, read_records(users_path, 'json') + [{'username': user, 'role': 'user'}], 'json')
+        # Meanwhile the code changes on the remote: the instances must not check it out
+        with open(os.path.join(seed, 'app.py'), 'w', encoding='utf-8') as f:
+            f.write("print('v2')\n")
+        git(seed, '-c', 'user.name=seed', '-c', 'user.email=seed@echec-map.com', 'add', 'app.py')
+        git(seed, '-c', 'user.name=seed', '-c', 'user.email=seed@echec-map.com', 'commit', '-q', '-m', 'code v2')
+        git(seed, 'push', '-q')
+        deployed = git(seed, 'rev-parse', 'HEAD~1')
+        for work, sync, _ in instances.values():
+            sync.request()
+        wait_idle(*(sync for _, sync, _ in instances.values()))
+        time.sleep(1.2)  # a scheduled pull each
+        wait_idle(*(sync for _, sync, _ in instances.values()))
+
+        files = {name: {f: read_records(os.path.join(work, f), 'csv' if f.endswith('.csv') else 'json')
+                        for f in ('forum_comments.csv', 'users.json')}
+                 for name, (work, _, _) in instances.items()}
+        assert files['a'] == files['b'], files
+        posts = {r['id']: r for r in files['a']['forum_comments.csv']}
+        assert sorted(posts) == ['a1', 'b1', 'p1'], posts
+        assert json.loads(posts['p1']['reactions']) == {'👍': 1, '❤️': 1}, posts['p1']
+        assert [c['text'] for c in json.loads(posts['p1']['comments'])] == ['Partant !']
+        assert sorted(u['username'] for u in files['a']['users.json']) == ['alice', 'bob', 'carol']
+        assert not git(remote, 'rev-list', '--merges', 'HEAD'), "history should stay linear"
+        assert git(remote, 'show', 'HEAD:app.py') == "print('v2')"
+        for work, _, _ in instances.values():
+            assert git(work, 'rev-parse', 'HEAD') == deployed and not os.path.exists(os.path.join(work, 'app.py'))
+            assert {line.split()[-1] for line in git(work, 'status', '--porcelain').splitlines()} <= set(SYNC_FILES)
+        assert any(pulled for _, _, pulled in instances.values()), "no pull listener was called"
+        stats = {name: sync.status() for name, (_, sync, _) in instances.items()}
+        print(f"two instances: {len(git(remote, 'log', '--format=%s').splitlines())} commits on the remote, "
+              f"linear; files identical after {sum(s['pulls'] for s in stats.values())} pulls, "
+              f"{sum(s['push_failures'] for s in stats.values())} failed pushes")
+        for _, sync, _ in instances.values():
+            sync.close()
+
+
+def bench_users(args):
+    """Lookup by username: users.json read + scan vs UserRepository; outside edits and add()."""
+    from modules.storage import USERS, Collection, FileStorage
+    from modules.user_repository import UserRepository
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = FileStorage({USERS: Collection(os.path.join(tmp, 'users.json'), 'username')})
+        storage.replace_all(USERS, [{'username': f'user{i}', 'password': f'{i:064x}', 'icon': '', 'role': 'user'}
+                                    for i in range(args.users)])
+        names = [f'user{(i * 7919) % args.users}' for i in range(args.lookups)]
+
+        def scan(name):
+            """What login did before: parse the whole file, then a linear scan."""
+            fresh = FileStorage(storage.collections)
+            return next((u for u in fresh.query(USERS) if u['username'] == name), None)
+
+        t0 = time.perf_counter()
+        for name in names[:50]:
+            scan(name)
+        before = (time.perf_counter() - t0) / 50 * 1000
+        repo = UserRepository(storage)
+        t0 = time.perf_counter()
+        for name in names:
+            assert repo.get(name)['username'] == name
+        after = (time.perf_counter() - t0) / len(names) * 1000
+
+        # An outside edit (another process, a git pull) is picked up on the next poll
+        FileStorage(storage.collections).put(USERS, 'newcomer', {'username': 'newcomer', 'role': 'user'})
+        repo._next_poll = 0.0
+        assert repo.get('newcomer') is not None
+        assert repo.add({'username': 'solo', 'role': 'user'}) and not repo.add({'username': 'solo', 'role': 'user'})
+        print(f"{args.users:,} users: lookup {before:.2f} ms (read + scan) -> {after * 1000:.1f} µs (index)")
+
+
+def bench_sessions(args):
+    """Session restore: users.json scan vs user index, HMAC check vs LRU hit; refused tokens."""
+    import json
+    import secrets
+    from modules.config import SESSION_TTL
+    from modules.session_tokens import SessionTokens, _b64encode
+    from modules.storage import USERS, Collection, FileStorage
+    from modules.user_repository import UserRepository
+
+    tokens = SessionTokens(secrets.token_bytes(32))
+    token = tokens.issue('kalma_j')
+    n = 20_000
+
+    t0 = time.perf_counter()
+    for _ in range(n):
+        tokens._decode(token)
+    cold = (time.perf_counter() - t0) / n * 1e6
+    tokens.validate(token)
+    t0 = time.perf_counter()
+    for _ in range(n):
+        assert tokens.validate(token)[0] == 'kalma_j'
+    warm = (time.perf_counter() - t0) / n * 1e6
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = FileStorage({USERS: Collection(os.path.join(tmp, 'users.json'), 'username')})
+        storage.replace_all(USERS, [{'username': f'user{i}', 'role': 'user'} for i in range(2_000)])
+        t0 = time.perf_counter()
+        for _ in range(20):
+            next(u for u in FileStorage(storage.collections).query(USERS) if u['username'] == 'user1999')
+        scan = (time.perf_counter() - t0) / 20 * 1e6
+        repo = UserRepository(storage)
+        t0 = time.perf_counter()
+        for _ in range(n):
+            repo.get('user1999')
+        indexed = (time.perf_counter() - t0) / n * 1e6
+
+    # Forged, tampered, expired and revoked tokens are all refused
+    payload, signature = token.split('.')
+    forged = _b64encode(json.dumps({'u': 'admin', 'iat': 0, 'exp': 2**40, 'jti': 'x'}).encode())
+    assert tokens.validate(f"{forged}.{signature}") is None
+    assert tokens.validate(f"{payload}.{signature[:-2]}AA") is None
+    assert tokens.validate('kalma_j') is None
+    assert all(tokens.validate(bad) is None for bad in ('é.abc', f"{payload}.{signature}é", 'a.b.c', 'a', '.'))
+    assert tokens.validate(token, now=time.time() + SESSION_TTL + 1) is None
+    other = tokens.issue('jeduapf', now=time.time() - 5)
+    tokens.revoke_user('jeduapf')
+    assert tokens.validate(other) is None and tokens.validate(tokens.issue('jeduapf'))
+    print(f"session restore: {scan:.0f} µs (users.json read + scan, 2,000 users), {indexed:.1f} µs (user index); "
+          f"token {cold:.1f} µs (HMAC check), {warm:.2f} µs (LRU hit)")
+
+
+def bench_forum_log(args):
+    """Event log: append rate, replay and tail of a second reader, compaction."""
+    import random
+    from modules.forum_log import ForumLog, SNAPSHOT_NAME
+
+    rng = random.Random(0)
+
+    def synthetic(n, first_id):
+        """A realistic mix: 5% posts, 20% comments, 70% reactions, 5% reports/deletes."""
+        events, posts, next_id = [], [], first_id
+        for _ in range(n):
+            r = rng.random()
+            if r < 0.05 or not posts:
+                events.append({'op': 'post', 'id': next_id, 'post': {
+                    'username': 'bench', 'user_icon': '', 'bar': 'Oya Café', 'game': 'Dixit',
+                    'when': 'Demain 19h', 'message': 'Qui est partant ?', 'timestamp': '2026-01-01 20:00'}})
+                posts.append(next_id)
+                next_id += 1
+            elif r < 0.25:
+                events.append({'op': 'comment', 'post': rng.choice(posts), 'id': next_id,
+                               'comment': {'author': 'bench', 'text': 'Moi !', 'timestamp': '2026-01-01 20:05'}})
+                next_id += 1
+            elif r < 0.95:
+                events.append({'op': 'react', 'post': rng.choice(posts), 'emoji': rng.choice("👍❤😂🎮"), 'n': 1})
+            elif r < 0.98:
+                events.append({'op': 'report', 'post': rng.choice(posts), 'reason': 'spam'})
+            else:
+                events.append({'op': 'delete', 'post': posts.pop(rng.randrange(len(posts)))})
+        return events
+
+    with tempfile.TemporaryDirectory() as tmp:
+        writer = ForumLog(os.path.join(tmp, 'log'), compact_interval=1e9)
+        events = synthetic(args.events, 1)
+
+        t0 = time.perf_counter()
+        for e in events[:20_000]:
+            writer.append(e)
+        single = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for i in range(20_000, len(events), 1_000):
+            writer.append_many(events[i:i + 1_000])
+        writer.sync()
+        batched = time.perf_counter() - t0
+        n_batched = len(events) - 20_000
+        size = os.fstat(writer._fd).st_size
+        print(f"write: {20_000 / single:,.0f} events/s one at a time ({writer.stats['fsyncs']} fsyncs), "
+              f"{n_batched / batched:,.0f} events/s in 1k batches; log {size / 1024 / 1024:.0f} MB")
+
+        # A second reader (as another process would) replays everything, then tails
+        t0 = time.perf_counter()
+        reader = ForumLog(os.path.join(tmp, 'log'), compact_interval=1e9)
+        replay = time.perf_counter() - t0
+        extra = synthetic(1_000, writer.view.next_id)
+        writer.append_many(extra)
+        t0 = time.perf_counter()
+        n = reader.refresh()
+        tail = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        reader.refresh()
+        noop = time.perf_counter() - t0
+        print(f"view: full replay of {args.events:,} events {replay:.1f} s; tail of {n} new events "
+              f"{tail * 1000:.1f} ms; refresh with nothing new {noop * 1e6:.0f} µs")
+
+        t0 = time.perf_counter()
+        writer.compact()
+        compact = time.perf_counter() - t0
+        snapshot = os.path.getsize(os.path.join(tmp, 'log', SNAPSHOT_NAME))
+        t0 = time.perf_counter()
+        fresh = ForumLog(os.path.join(tmp, 'log'), compact_interval=1e9)
+        reopen = time.perf_counter() - t0
+        reader.refresh()
+        assert fresh.view.state() == writer.view.state() == reader.view.state()
+        print(f"compaction: {compact:.1f} s -> snapshot {snapshot / 1024 / 1024:.1f} MB "
+              f"({len(writer.view.posts):,} posts); open from snapshot {reopen:.2f} s")
+        for log in (writer, reader, fresh):
+            log.close()
+
+
+def bench_inventory(args):
+    """Bar <-> game search on 5,000 synthetic bars: bitset matching vs pandas, party-fit."""
+    import numpy as np
+    import pandas as pd
+    from modules.inventory import BarInventory, MATCH_ANY, MATCH_ALL, PARTY_AGES, PARTY_MINUTES
+
+    # Synthetic inventories: 5,000 bars, each stocking 200 of 20,000 titles
+    rng = np.random.default_rng(0)
+    n_bars, n_games, per_bar = 5_000, 20_000, 200
+    titles = np.array([f"Jeu {i}" for i in range(n_games)], dtype=object)
+    games_data = pd.DataFrame({
+        'bar_name': np.repeat([f"Bar {i:04d}" for i in range(n_bars)], per_bar),
+        'game': np.concatenate([titles[rng.choice(n_games, per_bar, replace=False)] for _ in range(n_bars)]),
+    })
+    # The first 2,000 titles are catalogue games with random facets
+    catalogue = pd.DataFrame({
+        'id_jeu': np.arange(2_000), 'nom': titles[:2_000],
+        'nb_joueurs_min': rng.integers(1, 4, 2_000), 'nb_joueur_max': rng.integers(2, 10, 2_000),
+        'age_min': rng.choice(PARTY_AGES, 2_000), 'duree_min': rng.choice(PARTY_MINUTES, 2_000),
+    })
+    t0 = time.perf_counter()
+    inventory = BarInventory(games_data, catalogue=catalogue)
+    print(f"build: {n_bars} bars x {n_games} games in {time.perf_counter() - t0:.2f} s "
+          f"({inventory.game_bits.nbytes / 1024 / 1024:.1f} + {inventory.bar_bits.nbytes / 1024 / 1024:.1f} MB bitsets)")
+
+    for n_selected in (3, 30, 300):
+        selection = titles[rng.choice(n_games, n_selected, replace=False)].tolist()
+        for mode in (MATCH_ANY, MATCH_ALL, max(2, n_selected // 10)):
+            t0 = time.perf_counter()
+            for _ in range(20):
+                bars, counts = inventory.match_bars(selection, mode)
+            elapsed = (time.perf_counter() - t0) / 20 * 1000
+            t0 = time.perf_counter()
+            sub = games_data[games_data['game'].isin(selection)].groupby('bar_name').size()
+            baseline = (time.perf_counter() - t0) * 1000
+            print(f"{n_selected:3d} games, mode={mode!s:>3}: {elapsed:6.2f} ms, {len(bars)} bars "
+                  f"(pandas isin+groupby {baseline:.1f} ms)")
+
+    t0 = time.perf_counter()
+    inventory.party_fit(4, 8, 60)
+    print(f"party-fit table: {inventory._party_counts.nbytes / 1024 / 1024:.0f} MB in {time.perf_counter() - t0:.2f} s")
+    t0 = time.perf_counter()
+    for players in range(1, 9):
+        for age in PARTY_AGES:
+            bars, counts = inventory.party_fit(players, age, 75, limit=10)
+    per_query = (time.perf_counter() - t0) / (8 * len(PARTY_AGES)) * 1000
+    print(f"party-fit query over {n_bars} bars: {per_query:.2f} ms, best bar has {counts[0]} games")
+
+
+def bench_forum_db(args):
+    """Reaction cost on 5k posts: one SQLite UPSERT vs the CSV rewrite it replaces."""
+    import pandas as pd
+    from modules.forum_db import ForumDB
+    from modules.forum_records import Post, now_str
+
+    # Reaction cost: one UPSERT vs the CSV rewrite it replaces, on 5k posts
+    with tempfile.TemporaryDirectory() as tmp:
+        db = ForumDB(os.path.join(tmp, 'forum.db'))
+        post = Post(username='bench', bar='Oya Café', game='Dixit', when='Demain 19h',
+                    message='Qui est partant ?' * 4, timestamp=now_str())
+        ids = [db.insert_post(post) for _ in range(5_000)]
+        for i in ids:
+            db.add_comment(i, 'bench', 'Moi !')
+        t0 = time.perf_counter()
+        for i in ids[:500]:
+            db.add_reaction(i, "👍")
+        upsert = (time.perf_counter() - t0) / 500 * 1000
+        records = db.load_posts()
+        t0 = time.perf_counter()
+        for _ in range(5):
+            pd.DataFrame([p.to_row() for p in records]).to_csv(os.path.join(tmp, 'forum.csv'), index=False, encoding='utf-8')
+        rewrite = (time.perf_counter() - t0) / 5 * 1000
+        t0 = time.perf_counter()
+        db.load_posts()
+        load = (time.perf_counter() - t0) * 1000
+        print(f"5k posts: reaction upsert {upsert:.2f} ms, CSV rewrite {rewrite:.1f} ms, full load {load:.0f} ms")
+
+
+def bench_forum_records(args):
+    """Feed rendering per rerun: json.loads on every cell vs records decoded once."""
+    import json
+    import random
+    import pandas as pd
+    from modules.forum_records import Post
+
+    rng = random.Random(0)
+
+    # Rows as they come out of pd.read_csv: JSON, repr and legacy comment cells
+    def comments_cell(i):
+        comments = [{'author': f'user{j}', 'text': 'Partant !', 'timestamp': '2026-01-01 20:00'}
+                    for j in range(rng.randint(0, 6))]
+        return [json.dumps(comments, ensure_ascii=False), repr(comments),
+                '|||'.join(c['text'] for c in comments)][i % 3]
+
+    rows = [{'username': f'user{i}', 'user_icon': '', 'bar': 'Oya Café', 'game': 'Dixit',
+             'when': 'Demain 19h', 'message': 'Qui est partant ?', 'timestamp': '2026-01-01 19:00',
+             'reported': 'False', 'report_reason': float('nan'),
+             'reactions': json.dumps({e: rng.randint(1, 9) for e in rng.sample("👍❤😂🎮", 2)}, ensure_ascii=False),
+             'comments': comments_cell(i), 'id': f'{i:016x}'} for i in range(args.posts)]
+
+    def render_dicts(records):
+        """What the feed did per rerun before: json.loads on every cell."""
+        out = []
+        for post in records:
+            reactions = json.loads(post['reactions'])
+            summary = ' '.join(f"{e} {c}" for e, c in reactions.items())
+            try:
+                comments = json.loads(post['comments'])
+            except ValueError:
+                comments = []  # repr and legacy cells were silently dropped
+            out.append((post['username'], summary, [(c.get('author'), c.get('text')) for c in comments]))
+        return out
+
+    def render_records(posts):
+        return [(p.username, p.reaction_summary(), [(c.author, c.text) for c in p.comments]) for p in posts]
+
+    t0 = time.perf_counter()
+    posts = [Post.from_row(r) for r in rows]
+    decode = (time.perf_counter() - t0) * 1000
+    t0 = time.perf_counter()
+    for _ in range(args.reruns):
+        old = render_dicts(rows)
+    before = (time.perf_counter() - t0) / args.reruns * 1000
+    t0 = time.perf_counter()
+    for _ in range(args.reruns):
+        new = render_records(posts)
+    after = (time.perf_counter() - t0) / args.reruns * 1000
+    t0 = time.perf_counter()
+    pd.DataFrame([p.to_row() for p in posts])
+    encode = (time.perf_counter() - t0) * 1000
+
+    kept_old = sum(len(r[2]) for r in old)
+    kept_new = sum(len(r[2]) for r in new)
+    scale = 1_000 / args.posts
+    print(f"per 1,000 posts: decode once {decode * scale:.1f} ms, serialize {encode * scale:.1f} ms; "
+          f"per rerun {before * scale:.2f} ms (json.loads) -> {after * scale:.2f} ms (records)")
+    print(f"comments rendered: {kept_old} with json.loads vs {kept_new} with the record model")
+
+
+def bench_recommend(args):
+    """Similar-games table on a synthetic catalogue: vectors, top-k build, lookup."""
+    import numpy as np
+    import pandas as pd
+    from modules.config import COMPLETE_GAMES_CSV_PATH
+    from modules.recommend import SimilarGames, TOP_K, game_vectors, nearest_neighbours
+
+    catalogue = pd.read_csv(COMPLETE_GAMES_CSV_PATH, sep=';', encoding='utf-8')
+    # Synthetic catalogue: descriptions rebuilt from random catalogue sentences
+    rng = np.random.default_rng(0)
+    big = catalogue.iloc[rng.integers(0, len(catalogue), args.games)].reset_index(drop=True)
+    sentences = [s for d in catalogue['description'].dropna() for s in str(d).split('.') if s.strip()]
+    picks = rng.integers(0, len(sentences), (args.games, 3))
+    big['description'] = ['. '.join(sentences[i] for i in row) for row in picks]
+    big['id_jeu'] = np.arange(args.games)
+
+    t0 = time.perf_counter()
+    vectors = game_vectors(big)
+    t1 = time.perf_counter()
+    neighbours, scores = nearest_neighbours(vectors)
+    t2 = time.perf_counter()
+    table_bytes = neighbours.nbytes + scores.nbytes
+    print(f"{args.games} games: vectors {t1 - t0:.1f} s ({vectors.shape[1]} dims, "
+          f"{vectors.nbytes / 1024 / 1024:.0f} MB), top-{TOP_K} {t2 - t1:.1f} s, "
+          f"table {table_bytes / 1024 / 1024:.1f} MB")
+    table = SimilarGames(big['id_jeu'].to_numpy(), neighbours, scores)
+    t0 = time.perf_counter()
+    for i in rng.integers(0, args.games, 100_000):
+        table.similar(i, limit=5)
+    print(f"lookup: {(time.perf_counter() - t0) / 100_000 * 1e6:.1f} µs")
+
+
+def bench_game_library(args):
+    """Library page rerun: one markdown + button per card vs one card_grid element."""
+    import pandas as pd
+    from streamlit.testing.v1 import AppTest
+    from modules.config import COMPLETE_GAMES_CSV_PATH
+    from modules.game_library import PAGE_SIZES, _render_card_html
+
+    def _legacy_page(n):
+        """Previous layout: st.columns rows, one markdown + one button per card."""
+        import streamlit as st
+        import pandas as pd
+        from modules.config import COMPLETE_GAMES_CSV_PATH
+        from modules.game_library import _render_card_html
+        page = pd.read_csv(COMPLETE_GAMES_CSV_PATH, sep=';', encoding='utf-8').iloc[:n]
+        for i in range(0, len(page), 3):
+            cols = st.columns(3)
+            for col, (idx, game) in zip(cols, page.iloc[i:i + 3].iterrows()):
+                with col:
+                    st.markdown(_render_card_html(game, idx), unsafe_allow_html=True)
+                    st.button("🔍 Détails", key=f"btn_{idx}", use_container_width=True)
+
+    def _grid_page(n):
+        """Current layout: the whole page in one card_grid element."""
+        import pandas as pd
+        from modules.config import COMPLETE_GAMES_CSV_PATH
+        from modules.game_library import render_card_grid
+        df = pd.read_csv(COMPLETE_GAMES_CSV_PATH, sep=';', encoding='utf-8')
+        render_card_grid(df, df.iloc[:n], 0, key="bench_grid")
+
+    def _count(node):
+        children = getattr(node, 'children', {})
+        return 1 + sum(_count(c) for c in children.values())
+
+    catalogue = pd.read_csv(COMPLETE_GAMES_CSV_PATH, sep=';', encoding='utf-8')
+    for n in PAGE_SIZES:
+        cards = catalogue.iloc[:n].to_dict('records')
+        t0 = time.perf_counter()
+        for g in cards:
+            _render_card_html(g, g['id_jeu'], g['lien_photo'])
+        cold = (time.perf_counter() - t0) * 1000
+        memo = {}
+        for g in cards:
+            memo[(g['id_jeu'], 0, g['lien_photo'])] = _render_card_html(g, g['id_jeu'], g['lien_photo'])
+        t0 = time.perf_counter()
+        ''.join(memo[(g['id_jeu'], 0, g['lien_photo'])] for g in cards)
+        warm = (time.perf_counter() - t0) * 1000
+
+        timings = {}
+        for label, fn in (("legacy", _legacy_page), ("grid", _grid_page)):
+            at = AppTest.from_function(fn, args=(n,), default_timeout=60)
+            at.run()
+            t0 = time.perf_counter()
+            for _ in range(5):
+                at.run()
+            timings[label] = ((time.perf_counter() - t0) / 5 * 1000, _count(at._tree))
+        print(f"{n:3d} cards: html cold {cold:.2f} ms / memoized {warm:.3f} ms | "
+              f"rerun legacy {timings['legacy'][0]:.0f} ms ({timings['legacy'][1]} nodes) "
+              f"vs grid {timings['grid'][0]:.0f} ms ({timings['grid'][1]} nodes)")
+
+
+def bench_image_cache(args):
+    """Cover cache with the offline stub fetcher: prefetch, cached URL lookups, LRU bound."""
+    from modules.image_cache import CoverCache, stub_fetcher
+
+    urls = [f"https://covers.example/{i}.png" for i in range(args.covers)]
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = CoverCache(tmp, fetcher=stub_fetcher)
+        t0 = time.perf_counter()
+        fetched, cached, failed = cache.prefetch(urls, workers=args.workers)
+        cold = time.perf_counter() - t0
+        assert (fetched, cached, failed) == (len(urls), 0, 0), (fetched, cached, failed)
+        t0 = time.perf_counter()
+        for url in urls:
+            assert cache.url(url) is not None
+        hit = (time.perf_counter() - t0) / len(urls) * 1e6
+        assert CoverCache(tmp, fetcher=stub_fetcher).prefetch(urls) == (0, len(urls), 0)
+        size = cache.stats()['bytes']
+        print(f"{len(urls)} covers: prefetch {len(urls) / cold:,.0f} covers/s ({args.workers} workers, "
+              f"{size / len(urls) / 1024:.1f} KB each); cached URL {hit:.1f} µs")
+
+        # A cache bounded to half the covers keeps the most recently used ones
+        bounded = CoverCache(os.path.join(tmp, 'bounded'), max_bytes=size // 2, fetcher=stub_fetcher)
+        bounded.prefetch(urls, workers=1)
+        stats = bounded.stats()
+        assert stats['bytes'] <= size // 2 and bounded.url(urls[-1]) is not None, stats
+        print(f"bounded to {size // 2 / 1024:.0f} KB: {stats['files']} covers kept")
+
+
+def bench_search(args):
+    """Catalogue search: index build and query latency, on the catalogue and on 100k games."""
+    import numpy as np
+    import pandas as pd
+    from modules.config import COMPLETE_GAMES_CSV_PATH
+    from modules.search import SearchIndex
+
+    catalogue = pd.read_csv(COMPLETE_GAMES_CSV_PATH, sep=';', encoding='utf-8')
+    t0 = time.perf_counter()
+    index = SearchIndex(catalogue)
+    print(f"build: {len(catalogue)} games, {len(index._terms)} terms in {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+    queries = ['carcassonne', 'jeu coopératif', 'stratégie', 'enquete', 'dés', 'pirates tré', 'ca', 'famille enfants']
+
+    def bench(idx, label, repeat=50):
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            for q in queries:
+                idx.search(q, limit=48)
+        per_query = (time.perf_counter() - t0) / (repeat * len(queries)) * 1000
+        print(f"{label}: {per_query:.3f} ms/query")
+
+    bench(index, f"query @ {len(catalogue)} games")
+
+    # 100k synthetic games: the catalogue repeated with shuffled names
+    rng = np.random.default_rng(0)
+    big = pd.concat([catalogue] * (100_000 // len(catalogue) + 1), ignore_index=True).iloc[:100_000]
+    big['nom'] = big['nom'].sample(frac=1, random_state=0).to_numpy() + ' ' + rng.integers(0, 10_000, len(big)).astype(str)
+    t0 = time.perf_counter()
+    big_index = SearchIndex(big)
+    print(f"build: {len(big)} games in {time.perf_counter() - t0:.1f} s")
+    bench(big_index, "query @ 100k games", repeat=5)
+    for q in queries[:3]:
+        pos, _ = index.search(q, limit=3)
+        print(f"  {q!r}: {catalogue['nom'].iloc[pos].tolist()}")
+
+
+def bench_fuzzy(args):
+    """Typo-tolerant lookup on 100k synthetic names: top-5, best match, batched, exact, LRU."""
+    import random
+    import pandas as pd
+    from modules.config import COMPLETE_GAMES_CSV_PATH
+    from modules.fuzzy import FuzzyIndex, BATCH_SIZE
+
+    catalogue = pd.read_csv(COMPLETE_GAMES_CSV_PATH, sep=';', encoding='utf-8')['nom'].dropna().tolist()
+    rng = random.Random(0)
+
+    def typo(s):
+        i = rng.randrange(len(s))
+        return s[:i] + rng.choice('aeiourst') + s[i + 1:]
+
+    # 100k distinct titles made of 2-4 words drawn from the catalogue vocabulary
+    vocab = sorted({w for name in catalogue for w in name.split() if len(w) > 2})
+    names = list(dict.fromkeys(' '.join(rng.choices(vocab, k=rng.randint(2, 4))) for _ in range(110_000)))[:100_000]
+    t0 = time.perf_counter()
+    index = FuzzyIndex(names)
+    print(f"build: {len(names)} names in {time.perf_counter() - t0:.2f} s")
+
+    def bench(label, queries, fn):
+        t0 = time.perf_counter()
+        for q in queries:
+            fn(q)
+        print(f"{label}: {len(queries) / (time.perf_counter() - t0):,.0f} queries/s")
+
+    typos = [typo(rng.choice(names)) for _ in range(5_000)]
+    bench("typo, top-5 (uncached)", typos, lambda q: index._search([q], 5, 0.3))
+    bench("typo, best match (uncached)", typos, lambda q: index._search([q], 1, 0.5))
+    batches = [typos[i:i + BATCH_SIZE] for i in range(0, len(typos), BATCH_SIZE)]
+    t0 = time.perf_counter()
+    for batch in batches:
+        index._search(batch, 1, 0.5)
+    print(f"typo, best match, lookup_many (uncached): {len(typos) / (time.perf_counter() - t0):,.0f} queries/s")
+    bench("exact name, best match", [rng.choice(names).upper() for _ in range(100_000)],
+          lambda q: index.best(q))
+    hot = typos[:500]
+    for q in hot:
+        index.lookup(q)
+    bench("repeated queries (LRU)", hot * 200, lambda q: index.lookup(q))
+
+    small = FuzzyIndex(catalogue)
+    for q in ['Carcasone', 'dixxit', 'les aventuriers du rail europ', '7 wonder duel']:
+        print(f"  {q!r}: {small.lookup(q, k=3)}")
+
+
+def bench_autocomplete(args):
+    """Autocomplete per keystroke and payload size, on the catalogue and on 100k names."""
+    import json
+    import random
+    import pandas as pd
+    from modules.autocomplete import PrefixIndex
+    from modules.config import COMPLETE_GAMES_CSV_PATH
+
+    catalogue = pd.read_csv(COMPLETE_GAMES_CSV_PATH, sep=';', encoding='utf-8')['nom'].dropna().tolist()
+    rng = random.Random(0)
+    vocab = sorted({w for name in catalogue for w in name.split() if len(w) > 2})
+    names = list(dict.fromkeys(' '.join(rng.choices(vocab, k=rng.randint(1, 4))) for _ in range(110_000)))[:100_000]
+
+    for label, pool in (("catalogue", catalogue), ("100k names", names)):
+        t0 = time.perf_counter()
+        index = PrefixIndex(pool, weights=[rng.random() for _ in pool])
+        build = time.perf_counter() - t0
+        # Every keystroke of 2,000 names typed letter by letter (up to 8 letters)
+        typed = [n[:i] for n in rng.choices(pool, k=2_000) for i in range(1, min(len(n), 8) + 1)]
+        t0 = time.perf_counter()
+        for q in typed:
+            index.complete(q)
+        per_key = (time.perf_counter() - t0) / len(typed) * 1000
+        payload = max(len(json.dumps(index.complete(q), ensure_ascii=False)) for q in typed[:500])
+        options = len(json.dumps(sorted(pool), ensure_ascii=False))
+        print(f"{label}: build {build:.2f} s, {per_key:.3f} ms/keystroke, "
+              f"payload <= {payload} B (full option list {options / 1024:.0f} KB)")
+    demo = PrefixIndex(catalogue)
+    for q in ['carc', 'aventuriers rail', 'ÉCHEC', 'myste']:
+        print(f"  {q!r}: {demo.complete(q, 4)}")
+
+
+def bench_avatars(args):
+    """Avatar assets: sprite build and up-to-date check, sheet size vs source PNGs, avatar_html()."""
+    from modules.avatars import THUMB_SIZES, build_avatar_assets, avatar_html, _list_source_icons
+    from modules.config import AVATAR_CACHE_DIR
+
+    t0 = time.perf_counter()
+    manifest = build_avatar_assets(force=True)
+    build = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    assert build_avatar_assets()['ids'] == manifest['ids']
+    check = (time.perf_counter() - t0) * 1000
+    sources = sum(os.path.getsize(p) for p in _list_source_icons().values())
+    sheets = ', '.join(f"{size} px {os.path.getsize(os.path.join(AVATAR_CACHE_DIR, f'sprite_{size}.webp')) / 1024:.0f} KB"
+                       for size in THUMB_SIZES)
+    print(f"{len(manifest['ids'])} avatars: build {build:.2f} s, up-to-date check {check:.2f} ms; "
+          f"sprite sheets {sheets} vs {sources / 1024:.0f} KB of source PNGs")
+
+    icons = [f"icone_{i}.png" for i in range(1, len(manifest['ids']) + 1)] * 100
+    avatar_html(icons[0])
+    t0 = time.perf_counter()
+    for icon in icons:
+        avatar_html(icon)
+    print(f"avatar_html: {(time.perf_counter() - t0) / len(icons) * 1e6:.1f} µs per avatar")
+
+
+def bench_storage(args):
+    """The same workload on every storage backend; the Storage contract checked on each."""
+    from modules.forum_db import ForumDB
+    from modules.storage import Collection, VersionConflict, FileStorage, MemoryStorage, SQLiteStorage
+
+    n = args.records
+
+    def timed(fn, repeat=1):
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            result = fn()
+        return (time.perf_counter() - t0) / repeat * 1000, result
+
+    with tempfile.TemporaryDirectory() as tmp:
+        collections = {
+            'users': Collection(os.path.join(tmp, 'users.json'), 'username'),
+            'posts': Collection(os.path.join(tmp, 'posts.csv'), 'id'),
+        }
+        backends = {
+            'memory': lambda: MemoryStorage(collections),
+            'files': lambda: FileStorage(collections),
+            'sqlite': lambda: SQLiteStorage(os.path.join(tmp, 'storage.db'), collections),
+        }
+        users = [{'username': f'user{i}', 'password': f'{i:064x}', 'icon': '', 'role': 'user'} for i in range(n)]
+        posts = [{'id': f'{i:016x}', 'username': f'user{i % 50}', 'bar': f'bar{i % 12}', 'message': 'Qui est partant ?'}
+                 for i in range(n)]
+
+        print(f"{n:,} records per collection (ms)")
+        print(f"{'backend':8} {'replace_all':>11} {'get':>8} {'put':>8} {'query':>8} {'where':>8} {'version':>8}")
+        for name, make in backends.items():
+            storage = make()
+            bulk, _ = timed(lambda: (storage.replace_all('users', users), storage.replace_all('posts', posts)))
+            get, _ = timed(lambda: storage.get('users', f'user{n // 2}'), 200)
+            put, _ = timed(lambda: storage.put('users', 'user0', dict(users[0], role='admin')), 20)
+            query, everyone = timed(lambda: storage.query('users'), 10)
+            where, bar = timed(lambda: storage.query('posts', {'bar': 'bar3'}), 10)
+            version, _ = timed(lambda: storage.version('posts'), 200)
+            print(f"{name:8} {bulk:11.2f} {get:8.3f} {put:8.3f} {query:8.2f} {where:8.2f} {version:8.4f}")
+
+            # Same contract everywhere: order, filters, compare-and-set, versions
+            assert [u['username'] for u in everyone] == [u['username'] for u in users]
+            assert len(bar) == len(range(3, n, 12))
+            record, seen = storage.get('users', 'user1')
+            before = storage.version('users')
+            storage.put('users', 'user1', dict(record, role='admin'), expected=seen)
+            assert storage.version('users') != before
+            try:
+                storage.put('users', 'user1', record, expected=seen)
+                raise AssertionError("stale compare-and-set accepted")
+            except VersionConflict:
+                pass
+            key = storage.append('posts', {'bar': 'bar0', 'message': 'nouveau'})
+            assert storage.get('posts', key)[0]['message'] == 'nouveau'
+            # put() stores the key in the record, whatever the record said
+            storage.put('users', 'keyless', {'role': 'user'})
+            storage.put('users', 'renamed', {'username': 'user2', 'role': 'user'})
+            assert storage.get('users', 'keyless')[0] == {'username': 'keyless', 'role': 'user'}
+            assert storage.get('users', 'renamed')[0]['username'] == 'renamed'
+            assert storage.query('users', {'username': 'keyless'}) == [{'username': 'keyless', 'role': 'user'}]
+            assert storage.delete('posts', key) and storage.get('posts', key) is None
+            storage.close()
+
+        # A second process sees the first one's writes
+        reopened = SQLiteStorage(os.path.join(tmp, 'storage.db'), collections)
+        assert reopened.get('users', 'user1')[0]['role'] == 'admin'
+        assert FileStorage(collections).get('users', 'user1')[0]['role'] == 'admin'
+        reopened.close()
+
+        # Tables shared with the forum database, over its connection
+        forum_db = ForumDB(os.path.join(tmp, 'forum.db'))
+        shared = SQLiteStorage(forum_db.path, collections, forum_db.shared_connection())
+        shared.put('users', 'user1', {'role': 'user'})
+        shared.close()
+        assert forum_db.poll_token() == forum_db.poll_token() and shared.get('users', 'user1')[0]['role'] == 'user'
+        forum_db.close()
+        print("contract checks passed on every backend")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks and self-checks of the app's modules")
+    commands = parser.add_subparsers(dest='name', required=True)
+
+    command = commands.add_parser('forum_writer', help="forum write-behind (modules.forum_writer)")
+    command.add_argument('--posts', type=int, default=2_000)
+    command.add_argument('--clicks', type=int, default=200)
+    command.set_defaults(run=bench_forum_writer)
+
+    command = commands.add_parser('git', help="git sync smoke test on a local remote (modules.git_ops)")
+    command.set_defaults(run=bench_git)
+
+    command = commands.add_parser('users', help="user lookup (modules.user_repository)")
+    command.add_argument('--users', type=int, default=2_000)
+    command.add_argument('--lookups', type=int, default=500)
+    command.set_defaults(run=bench_users)
+
+    command = commands.add_parser('sessions', help="session tokens (modules.session_tokens)")
+    command.set_defaults(run=bench_sessions)
+
+    command = commands.add_parser('forum_log', help="forum event log (modules.forum_log)")
+    command.add_argument('--events', type=int, default=1_000_000)
+    command.set_defaults(run=bench_forum_log)
+
+    command = commands.add_parser('inventory', help="bar <-> game search (modules.inventory)")
+    command.set_defaults(run=bench_inventory)
+
+    command = commands.add_parser('forum_db', help="forum SQLite store (modules.forum_db)")
+    command.set_defaults(run=bench_forum_db)
+
+    command = commands.add_parser('forum_records', help="forum records (modules.forum_records)")
+    command.add_argument('--posts', type=int, default=1_000)
+    command.add_argument('--reruns', type=int, default=20)
+    command.set_defaults(run=bench_forum_records)
+
+    command = commands.add_parser('recommend', help="similar games table (modules.recommend)")
+    command.add_argument('--games', type=int, default=100_000)
+    command.set_defaults(run=bench_recommend)
+
+    command = commands.add_parser('game_library', help="library page rendering (modules.game_library)")
+    command.set_defaults(run=bench_game_library)
+
+    command = commands.add_parser('image_cache', help="cover image cache (modules.image_cache)")
+    command.add_argument('--covers', type=int, default=500)
+    command.add_argument('--workers', type=int, default=8)
+    command.set_defaults(run=bench_image_cache)
+
+    command = commands.add_parser('search', help="catalogue full-text search (modules.search)")
+    command.set_defaults(run=bench_search)
+
+    command = commands.add_parser('fuzzy', help="typo-tolerant name lookup (modules.fuzzy)")
+    command.set_defaults(run=bench_fuzzy)
+
+    command = commands.add_parser('autocomplete', help="game and bar name autocomplete (modules.autocomplete)")
+    command.set_defaults(run=bench_autocomplete)
+
+    command = commands.add_parser('avatars', help="avatar sprite sheets (modules.avatars)")
+    command.set_defaults(run=bench_avatars)
+
+    command = commands.add_parser('storage', help="storage backends (modules.storage)")
+    command.add_argument('--records', type=int, default=1_000)
+    command.set_defaults(run=bench_storage)
+
+    args = parser.parse_args(argv)
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,8 @@ import pandas as pd
 
 from modules.config import IMAGES_DIR
 from modules.utils import find_best_image_match, get_menu_pdf_path
-from modules.auth import verify_user, create_user, get_available_icons
+from modules.auth import verify_user, create_user, create_session_token, get_available_icons
+from modules.avatars import avatar_css, avatar_html
 
 
 def render_bar_detail_card(bar_data, bar_name, games_data, idx, key_prefix="detail", show_games=True):
@@ -136,7 +137,7 @@ def render_login_page():
                     if st.session_state.role == 'admin':
                         st.session_state.admin_logged_in = True
                         st.session_state.show_admin_panel = True
-                    st.query_params["session_user"] = user_data['username']
+                    st.query_params["session"] = create_session_token(user_data)
                     st.success("Connexion réussie ! A vous de jouer !")
                     st.rerun()
                 else:
@@ -148,16 +149,8 @@ def render_login_page():
         if 'temp_selected_icon' not in st.session_state:
             st.session_state.temp_selected_icon = None
 
-        # Display Avatars in a Grid (Clickable Images via HTML)
-        # Display Avatars in a Responsive Grid (Matrix)
-        # (re-import base64 just in case, though usually top-level is better, but local scope is fine)
-        import base64
-        
-        # Helper function
-        def get_img_as_base64_local(file_path):
-            with open(file_path, "rb") as f:
-                data = f.read()
-            return base64.b64encode(data).decode()
+        # Display Avatars in a Responsive Grid (one sprite sheet for all avatars)
+        st.markdown(avatar_css(display_sizes=(80,), sprite_size=128), unsafe_allow_html=True)
 
         html_images = []
         for icon_p in icons:
@@ -168,25 +161,17 @@ def render_login_page():
             border_style = "3px solid var(--color-success, #34C759)" if is_selected else "3px solid transparent"
             opacity = "1.0" if is_selected else "0.8"
             scale = "1.1" if is_selected else "1.0"
-            
-            try:
-                b64_str = get_img_as_base64_local(icon_p)
-                # Note: No indentation for HTML strings to avoid code-block formatting in st.markdown
-                img_block = f"""<div style="margin: 10px; text-align: center; transition: transform 0.2s;">
-<a href="?avatar_select={file_name}" target="_self" style="text-decoration: none;">
-<img src="data:image/png;base64,{b64_str}" 
-style="width: 80px; height: 80px; object-fit: cover; border-radius: 50%; 
-border: {border_style}; opacity: {opacity}; transform: scale({scale});
-box-shadow: 0 4px 6px rgba(0,0,0,0.1);"
-onmouseover="this.style.opacity='1.0'; this.style.transform='scale(1.1)';" 
-onmouseout="this.style.opacity='{opacity}'; this.style.transform='scale({scale})';"
-/>
-</a>
+
+            avatar_style = (f"border: {border_style}; opacity: {opacity}; transform: scale({scale}); "
+                            f"box-shadow: 0 4px 6px rgba(0,0,0,0.1);")
+            # Note: No indentation for HTML strings to avoid code-block formatting in st.markdown
+            img_block = f"""<div style="margin: 10px; text-align: center; transition: transform 0.2s;">
+<a href="?avatar_select={file_name}" target="_self" style="text-decoration: none;"
+onmouseover="this.firstChild.style.opacity='1.0'; this.firstChild.style.transform='scale(1.1)';" 
+onmouseout="this.firstChild.style.opacity='{opacity}'; this.firstChild.style.transform='scale({scale})';">{avatar_html(icon_p, display_size=80, sprite_size=128, style=avatar_style)}</a>
 {f"<div style='color: var(--color-success, green); font-weight:bold; font-size:1.2rem; margin-top:-10px;'>✅</div>" if is_selected else ""}
 </div>"""
-                html_images.append(img_block)
-            except:
-                pass
+            html_images.append(img_block)
 
         # Container with Flex/Grid behavior
         grid_html = f"""<div style="display: flex; flex-wrap: wrap; justify-content: center; gap: 10px; padding: 10px;">
@@ -221,7 +206,7 @@ onmouseout="this.style.opacity='{opacity}'; this.style.transform='scale({scale})
                         st.session_state.user_icon = user_data.get('icon', '')
                         st.session_state.show_login_form = False
                         st.session_state.temp_selected_icon = None
-                        st.query_params["session_user"] = user_data['username']
+                        st.query_params["session"] = create_session_token(user_data)
                         st.success("✅ Compte créé et connecté ! Bienvenue !")
                         time.sleep(1)
                         st.rerun()
@@ -18,8 +18,30 @@ INSULTS_PATH = os.path.join(BASE_DIR, 'liste_insultes.txt')
 MENUS_DIR = os.path.join(BASE_DIR, 'Menus_bars')
 CSV_GAMES_DIR = os.path.join(BASE_DIR, 'Scraping Liste Jeux')
 THEME_CSS_PATH = os.path.join(BASE_DIR, 'theme.css')
+FRONTEND_DIR = os.path.join(BASE_DIR, 'frontend')
 COMPLETE_GAMES_CSV_PATH = os.path.join(BASE_DIR, 'liste_jeux_complet.csv')
 
+# --- Data storage (users, forum, game requests): 'files', 'sqlite' or 'memory' (modules.storage) ---
+STORAGE_BACKEND = os.environ.get('ECHEC_MAP_STORAGE', 'files')
+
+# --- Forum storage: 'csv' (the STORAGE_BACKEND collections), 'sqlite' or 'log' ---
+FORUM_BACKEND = os.environ.get('ECHEC_MAP_FORUM_BACKEND', 'csv')
+FORUM_DB_PATH = os.path.join(BASE_DIR, 'forum.db')
+FORUM_LOG_DIR = os.path.join(BASE_DIR, 'forum_log')
+# Write-behind journal of forum changes not yet flushed to the storage above
+FORUM_JOURNAL_DIR = os.path.join(BASE_DIR, 'forum_journal')
+
+# --- Sessions: signed tokens in the URL (modules.session_tokens) ---
+SESSION_SECRET_PATH = os.path.join(BASE_DIR, '.session_key')
+SESSION_TTL = 30 * 24 * 3600     # seconds a login is remembered
+
+# --- Generated assets (rebuilt on demand, not versioned) ---
+CACHE_DIR = os.path.join(BASE_DIR, '.cache')
+AVATAR_CACHE_DIR = os.path.join(CACHE_DIR, 'avatars')
+# Served by Streamlit itself (server.enableStaticServing) under app/static/
+COVERS_DIR = os.path.join(BASE_DIR, 'static', 'covers')
+COVERS_STATIC_URL = '/app/static/covers'
+
 # --- Mapping: CSV filename -> Bar display name ---
 BAR_CSV_MAPPING = {
     'liste_jeux_aubonheurdesjeux.csv': 'Au Bonheur des Jeux',
@@ -7,8 +7,11 @@ import pandas as pd
 import geopandas as gpd
 import streamlit as st
 
-from modules.config import BASE_DIR, CSV_GAMES_DIR, BAR_CSV_MAPPING, FORUM_CSV_PATH, GAME_REQUESTS_CSV_PATH, COMPLETE_GAMES_CSV_PATH
+from modules.config import BASE_DIR, CSV_GAMES_DIR, BAR_CSV_MAPPING, COMPLETE_GAMES_CSV_PATH
 from modules.utils import detect_encoding
+from modules.forum_service import get_forum_store
+from modules.forum_records import Post, GameRequest
+from modules.storage import get_storage, FORUM_POSTS, GAME_REQUESTS
 
 
 @st.cache_data
@@ -65,25 +68,25 @@ def load_games_from_csv():
 
 
 def load_forum_comments():
-    """Load forum comments from CSV file."""
-    if os.path.exists(FORUM_CSV_PATH):
-        try:
-            df = pd.read_csv(FORUM_CSV_PATH, encoding='utf-8')
-            return df.to_dict('records')
-        except:
-            return []
-    return []
+    """Load forum posts (Post records) from the storage backend (or the FORUM_BACKEND store)."""
+    store = get_forum_store()
+    if store is not None:
+        return store.load_posts()
+    try:
+        return [Post.from_row(r) for r in get_storage().query(FORUM_POSTS)]
+    except Exception:
+        return []
 
 
 def load_game_requests():
-    """Load game requests from CSV file."""
-    if os.path.exists(GAME_REQUESTS_CSV_PATH):
-        try:
-            df = pd.read_csv(GAME_REQUESTS_CSV_PATH, encoding='utf-8')
-            return df.to_dict('records')
-        except:
-            return []
-    return []
+    """Load game requests (GameRequest records) from the storage backend (or the FORUM_BACKEND store)."""
+    store = get_forum_store()
+    if store is not None:
+        return store.load_requests()
+    try:
+        return [GameRequest.from_row(r) for r in get_storage().query(GAME_REQUESTS)]
+    except Exception:
+        return []
 
 
 @st.cache_data
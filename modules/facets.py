@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Facet bitmap index for the Bibliothèque filters.
+
+One NumPy bool array per facet value is built once per catalogue version.
+Filtering is then a few bitwise ANDs, and each pass also returns how many
+games every option would give with the other filters kept
+("Jeu coopératif (18)").
+"""
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+ALL = "Tous"
+
+# Player buckets: (lo, hi) overlap with [nb_joueurs_min, nb_joueur_max]
+PLAYER_BUCKETS = {"1": (1, 1), "2": (2, 2), "3-4": (3, 4), "5-6": (5, 6), "7+": (7, None)}
+# Age options are thresholds: "8+" keeps games playable from 8 years old
+AGE_OPTIONS = ["3+", "6+", "7+", "8+", "10+", "12+", "14+"]
+# Duration buckets in minutes: (lo, hi) overlap with [duree_min, duree_max]
+DURATION_BUCKETS = {"< 30 min": (0, 29), "30 – 60 min": (30, 60), "1 – 2 h": (61, 120), "2 h +": (121, None)}
+EXTENSION_OPTIONS = ["Jeu de base", "Extension"]
+
+FACETS = ('type', 'players', 'age', 'duration', 'extension')
+
+
+def _column(df, name):
+    if name in df.columns:
+        return pd.to_numeric(df[name], errors='coerce').to_numpy(dtype=float)
+    return np.full(len(df), np.nan)
+
+
+def _overlaps(vmin, vmax, lo, hi):
+    """Rows whose [vmin, vmax] range meets [lo, hi] (NaN never matches)."""
+    with np.errstate(invalid='ignore'):
+        mask = np.ones(len(vmin), dtype=bool)
+        if hi is not None:
+            mask &= vmin <= hi
+        if lo is not None:
+            mask &= vmax >= lo
+    return mask
+
+
+class FacetIndex:
+    """Precomputed bool bitmaps: bitmaps[facet][value] -> np.ndarray[bool]."""
+
+    def __init__(self, df):
+        self.n = len(df)
+        pmin, pmax = _column(df, 'nb_joueurs_min'), _column(df, 'nb_joueur_max')
+        age = _column(df, 'age_min')
+        dmin, dmax = _column(df, 'duree_min'), _column(df, 'duree_max')
+        dmin = np.where(np.isnan(dmin), dmax, dmin)
+        dmax = np.where(np.isnan(dmax), dmin, dmax)
+
+        types = df['type'] if 'type' in df.columns else pd.Series([None] * self.n)
+        type_codes, type_values = pd.factorize(types, sort=True)
+
+        if 'extension' in df.columns:
+            ext = df['extension'].fillna('').astype(str).str.strip().to_numpy() != ''
+        else:
+            ext = np.zeros(self.n, dtype=bool)
+
+        players = {}
+        for label, (lo, hi) in PLAYER_BUCKETS.items():
+            # A solo game only needs to start at 1 player
+            players[label] = _overlaps(pmin, pmax, None if lo == 1 else lo, hi)
+
+        with np.errstate(invalid='ignore'):
+            ages = {label: age <= int(label.rstrip('+')) for label in AGE_OPTIONS}
+
+        self.bitmaps = {
+            'type': {value: type_codes == code for code, value in enumerate(type_values)},
+            'players': players,
+            'age': ages,
+            'duration': {label: _overlaps(dmin, dmax, lo, hi) for label, (lo, hi) in DURATION_BUCKETS.items()},
+            'extension': {EXTENSION_OPTIONS[0]: ~ext, EXTENSION_OPTIONS[1]: ext},
+        }
+
+    def options(self, facet):
+        return list(self.bitmaps[facet])
+
+    def _facet_mask(self, facet, values):
+        """OR of the selected values of one facet, or None when unfiltered."""
+        values = [v for v in values if v in self.bitmaps[facet]]
+        if not values:
+            return None
+        mask = self.bitmaps[facet][values[0]].copy()
+        for v in values[1:]:
+            mask |= self.bitmaps[facet][v]
+        return mask
+
+    def query(self, selection, base=None):
+        """
+        Combine the selected filters.
+
+        selection maps facet -> list of selected values (OR inside a facet,
+        AND across facets); base is an optional extra bool mask (e.g. search
+        hits). Returns (mask, counts) where counts[facet][value] is the number
+        of games the value would match with every *other* facet applied.
+        """
+        base = np.ones(self.n, dtype=bool) if base is None else base
+        masks = {f: self._facet_mask(f, selection.get(f) or []) for f in FACETS}
+
+        result = base.copy()
+        for m in masks.values():
+            if m is not None:
+                result &= m
+
+        counts = {}
+        for facet in FACETS:
+            others = base.copy()
+            for f, m in masks.items():
+                if f != facet and m is not None:
+                    others &= m
+            counts[facet] = {v: int(np.count_nonzero(others & bm)) for v, bm in self.bitmaps[facet].items()}
+        return result, counts
+
+
+@st.cache_resource(show_spinner=False)
+def get_facet_index(_df, data_version):
+    """Facet index for the catalogue, rebuilt only when data_version changes."""
+    return FacetIndex(_df)
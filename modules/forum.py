@@ -1,115 +1,424 @@
 # -*- coding: utf-8 -*-
 """
 Forum operations: save, react, comment, delete, report posts; manage game requests.
+
+Posts, comments and requests are addressed by a stable 'id' (list positions
+shift on delete and differ between sessions). Every operation changes the
+shared ForumService record first (modules.forum_service), persists it, then
+pulls the change into the session like any other session's change. With
+FORUM_BACKEND 'sqlite' (modules.forum_db) or 'log' (modules.forum_log) the
+persist step writes only the row or event it changes; with 'csv' the change
+is queued and the collection saved through modules.storage (the CSV files,
+committed to git, by default) in the background (modules.forum_writer).
+Reactions are queued with every backend, so a burst of clicks becomes one
+write. Records are the typed Post / Comment / GameRequest of
+modules.forum_records, decoded once when loaded.
 """
-import json
-import pandas as pd
+import io
+import os
+import uuid
+import hashlib
+import functools
 import streamlit as st
 from datetime import datetime
 
-from modules.config import FORUM_CSV_PATH, GAME_REQUESTS_CSV_PATH
-from modules.git_ops import auto_commit_csv
+from modules.config import FORUM_JOURNAL_DIR, STORAGE_BACKEND
+from modules.git_ops import WORKTREE_LOCK, on_pull
+from modules.git_merge import merge_record
+from modules.storage import get_storage, COLLECTIONS, FORUM_POSTS, GAME_REQUESTS
+from modules.storage.files import read_records
+from modules.forum_records import Post, Comment, GameRequest, assign
+from modules.forum_writer import ForumWriter
+from modules.forum_service import ForumService, get_forum_store, POSTS, REQUESTS, FEED_PAGE_SIZE
+from modules.data import load_forum_comments, load_game_requests
 
+LIVE_REFRESH_SECONDS = 10    # auto-refresh fragment polling interval
 
-def save_forum_comment(comment):
-    """Save all forum posts to CSV and auto-commit."""
-    df = pd.DataFrame(st.session_state.forum_posts)
-    df.to_csv(FORUM_CSV_PATH, index=False, encoding='utf-8')
-    auto_commit_csv()
 
+# ============================================================
+# IDS AND INDEXES
+# ============================================================
 
-def save_game_request(request):
-    """Save all game requests to CSV and auto-commit."""
-    df = pd.DataFrame(st.session_state.game_requests)
-    df.to_csv(GAME_REQUESTS_CSV_PATH, index=False, encoding='utf-8')
-    auto_commit_csv()
+def new_id():
+    """Random id for a new post, comment or request (CSV backend)."""
+    return uuid.uuid4().hex[:16]
 
 
-def add_reaction(post_idx, emoji):
-    """Add a reaction to a post."""
-    if 'reactions' not in st.session_state.forum_posts[post_idx]:
-        st.session_state.forum_posts[post_idx]['reactions'] = {}
+def _has_id(record):
+    return record.id is not None and record.id != ''
 
-    reactions = st.session_state.forum_posts[post_idx]['reactions']
 
-    # Handle float/nan or string
-    if isinstance(reactions, float):
-        reactions = {}
-    elif isinstance(reactions, str):
-        try:
-            reactions = json.loads(reactions)
-        except:
-            reactions = {}
-    elif not isinstance(reactions, dict):
-        reactions = {}
+def _content_id(seen, *parts):
+    """
+    Id derived from a legacy record's content, so every session loading the
+    same CSV agrees on it before the file is rewritten with an id column.
+    """
+    key = hashlib.sha1('\x1f'.join(str(p) for p in parts).encode('utf-8')).hexdigest()[:16]
+    n = 1
+    while key in seen:
+        key = hashlib.sha1(f"{key}:{n}".encode('utf-8')).hexdigest()[:16]
+        n += 1
+    seen.add(key)
+    return key
 
-    reactions[emoji] = reactions.get(emoji, 0) + 1
-    st.session_state.forum_posts[post_idx]['reactions'] = json.dumps(reactions, ensure_ascii=False)
-    save_forum_comment(None)
 
+def ensure_post_ids(posts):
+    """Give every post and comment an id (in place)."""
+    seen = {p.id for p in posts if _has_id(p)}
+    for post in posts:
+        if not _has_id(post):
+            post.id = _content_id(seen, post.username, post.timestamp, post.message)
+        c_seen = {c.id for c in post.comments if _has_id(c)}
+        for c in post.comments:
+            if not _has_id(c):
+                c.id = _content_id(c_seen, post.id, c.author, c.timestamp, c.text)
+    return posts
+
+
+def ensure_request_ids(requests):
+    """Give every game request an id (in place)."""
+    seen = {r.id for r in requests if _has_id(r)}
+    for r in requests:
+        if not _has_id(r):
+            r.id = _content_id(seen, r.timestamp, r.username, r.bar_name, r.game_name)
+    return requests
+
+
+def _index(list_key, index_key):
+    """id -> record for a session list, rebuilt when the list was replaced."""
+    records = st.session_state.get(list_key, [])
+    index = st.session_state.get(index_key)
+    if index is None or len(index) != len(records):
+        index = {r.id: r for r in records}
+        st.session_state[index_key] = index
+    return index
+
+
+def get_post(post_id):
+    """The session's post with this id, or None (O(1))."""
+    return _index('forum_posts', 'forum_index').get(post_id)
+
+
+def get_request(req_id):
+    """The session's game request with this id, or None (O(1))."""
+    return _index('game_requests', 'request_index').get(req_id)
+
+
+# ============================================================
+# SHARED STATE
+# ============================================================
+
+@st.cache_resource(show_spinner=False)
+def get_forum_service():
+    """Process-wide ForumService loaded from the configured backend."""
+    return ForumService(lambda: ensure_post_ids(load_forum_comments()),
+                        lambda: ensure_request_ids(load_game_requests()))
+
+
+def _flush_forum(service, store, dirty, reactions):
+    """ForumWriter batch: summed reactions into the store, or the dirty collections saved to modules.storage."""
+    if store is not None:
+        for (post_id, emoji), n in reactions.items():
+            if service.get(POSTS, post_id) is None:
+                continue  # deleted since the clicks
+            try:
+                store.add_reaction(post_id, emoji, n)
+            except Exception as e:
+                print(f"Reaction not stored ({post_id}, {emoji}): {e}")
+        return
+    storage = get_storage()
+    # The snapshot and the write together: a git pull can't land in between
+    with WORKTREE_LOCK:
+        if POSTS in dirty:
+            storage.replace_all(FORUM_POSTS, [p.to_row() for p in service.records(POSTS)])
+        if REQUESTS in dirty:
+            storage.replace_all(GAME_REQUESTS, [r.to_row() for r in service.records(REQUESTS)])
+        service.mark_synced()
+
+
+def _set_reaction(post, emoji, count):
+    post.reactions[emoji] = count
+
+
+def _recover(writer, service, store):
+    """Apply the changes a crash left in the journal (the last state of each record wins)."""
+    last = {}
+    for kind, rec_id, row in writer.replay():
+        last[(kind, rec_id)] = row
+    for (kind, rec_id), row in last.items():
+        if store is not None:
+            # Stores only defer reactions: queue the clicks they are missing
+            current = service.get(POSTS, rec_id)
+            if row is None or current is None:
+                continue
+            for emoji, count in Post.from_row(row).reactions.items():
+                missing = count - current.reactions[emoji]
+                if missing > 0:
+                    service.update(POSTS, rec_id, functools.partial(_set_reaction, emoji=emoji, count=count))
+                    writer.record(POSTS, rec_id, service.get(POSTS, rec_id), reaction=emoji, n=missing)
+            continue
+        record = None if row is None else (Post if kind == POSTS else GameRequest).from_row(row)
+        if record is None:
+            service.delete(kind, rec_id)
+        elif not service.update(kind, rec_id, functools.partial(assign, source=record)):
+            service.insert(kind, record)
+        writer.record(kind, rec_id, record)
+    writer.flush()
+
+
+def _merge_pulled(service, previous):
+    """
+    GitSync pull listener: fold the rows another instance changed into the
+    shared records, merged with ours (modules.git_merge) so changes not yet
+    flushed survive. previous is {file: contents before the pull}.
+    """
+    for kind, name, cls in ((POSTS, FORUM_POSTS, Post), (REQUESTS, GAME_REQUESTS, GameRequest)):
+        path = COLLECTIONS[name].path
+        text = previous.get(os.path.basename(path))
+        if text is None:
+            continue
+        before = {r.id: r.to_row() for r in map(cls.from_row, read_records(io.StringIO(text), 'csv')) if _has_id(r)}
+        after = {r.id: r.to_row() for r in map(cls.from_row, get_storage().query(name)) if _has_id(r)}
+        for rec_id in before.keys() | after.keys():
+            base, theirs = before.get(rec_id), after.get(rec_id)
+            if base == theirs:
+                continue  # not changed by the pull
+            current = service.get(kind, rec_id)
+            merged = merge_record(base, None if current is None else current.to_row(), theirs)
+            if merged is None:
+                service.delete(kind, rec_id)
+            elif current is None:
+                service.insert(kind, cls.from_row(merged))
+            else:
+                service.update(kind, rec_id, functools.partial(assign, source=cls.from_row(merged)))
+    service.mark_synced()
+
+
+@st.cache_resource(show_spinner=False)
+def get_forum_writer():
+    """
+    Process-wide write-behind queue; replays the journal of a crashed run
+    first. With the CSV files, other instances' changes pulled by git are
+    merged in as they arrive.
+    """
+    service, store = get_forum_service(), get_forum_store()
+    writer = ForumWriter(FORUM_JOURNAL_DIR, functools.partial(_flush_forum, service, store))
+    _recover(writer, service, store)
+    writer.start()
+    if store is None and STORAGE_BACKEND == 'files':
+        on_pull(functools.partial(_merge_pulled, service))
+    return writer
+
+
+def _check_source(service):
+    """Pick up other writers' changes, unless ours are still queued (a reload would drop them)."""
+    if not get_forum_writer().pending():
+        service.check_source()
+
+
+def _apply_delta(list_key, index_key, changed, deleted, prepend):
+    records = st.session_state[list_key]
+    index = _index(list_key, index_key)
+    for record in changed:
+        mine = index.get(record.id)
+        if mine is not None:
+            # Update in place: references held elsewhere in the run stay valid
+            assign(mine, record)
+        else:
+            if prepend:
+                records.insert(0, record)
+            else:
+                records.append(record)
+            index[record.id] = record
+    if deleted:
+        gone = set(deleted)
+        for rec_id in gone:
+            index.pop(rec_id, None)
+        records[:] = [r for r in records if r.id not in gone]
+
+
+def sync_forum_session():
+    """
+    Bring this session's forum_posts / game_requests up to date with the
+    shared state. O(1) when nothing changed; otherwise only the changed
+    records are copied. Returns True if anything was pulled.
+    """
+    service = get_forum_service()
+    _check_source(service)
+    seen = st.session_state.get('forum_version')
+    version = service.version
+    if seen is not None and version <= seen:
+        return False
+    delta = service.changes_since(seen) if seen is not None else None
+    if delta is None:
+        st.session_state.forum_posts = service.records(POSTS)
+        st.session_state.game_requests = service.records(REQUESTS)
+        st.session_state.pop('forum_index', None)
+        st.session_state.pop('request_index', None)
+    else:
+        _apply_delta('forum_posts', 'forum_index', *delta[POSTS], prepend=True)
+        _apply_delta('game_requests', 'request_index', *delta[REQUESTS], prepend=False)
+    st.session_state.forum_version = version
+    return True
+
+
+def forum_page(cursor=None, limit=FEED_PAGE_SIZE):
+    """
+    (posts, next cursor) for one feed page, newest first: the ids come from
+    the shared feed index, the records from this session's id index.
+    """
+    ids, next_cursor = get_forum_service().page(cursor, limit)
+    posts = [p for p in (get_post(i) for i in ids) if p is not None]
+    return posts, next_cursor
 
-def add_comment_to_post(post_idx, author, text):
-    """Add a comment to a post."""
-    comment = {
-        'author': author,
-        'text': text,
-        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M")
-    }
 
-    if 'comments' not in st.session_state.forum_posts[post_idx]:
-        st.session_state.forum_posts[post_idx]['comments'] = []
+def forum_cursors_to(post_id):
+    """Feed page cursors down to the page holding this post (None if it is gone)."""
+    return get_forum_service().cursors_to(post_id)
 
-    comments = st.session_state.forum_posts[post_idx]['comments']
-    if isinstance(comments, str):
-        try:
-            comments = json.loads(comments)
-        except:
-            comments = []
 
-    comments.append(comment)
-    st.session_state.forum_posts[post_idx]['comments'] = json.dumps(comments, ensure_ascii=False)
-    save_forum_comment(None)
+def forum_bar_activity():
+    """{bar: (active, reported, recent)} from the shared per-bar index."""
+    return get_forum_service().bar_activity()
 
 
-def delete_comment(post_idx, comment_idx):
+def forum_bar_posts(bar):
+    """This session's posts about one bar, newest first."""
+    return [p for p in (get_post(i) for i in get_forum_service().bar_posts(bar)) if p is not None]
+
+
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+def live_forum_updates():
+    """Poll the shared version and rerun the app when another session changed the forum."""
+    service = get_forum_service()
+    _check_source(service)
+    if service.version > st.session_state.get('forum_version', 0):
+        st.rerun()
+    st.caption(f"🟢 En direct · actualisé toutes les {LIVE_REFRESH_SECONDS} s")
+
+
+# ============================================================
+# SAVE
+# ============================================================
+
+def _queue(kind, rec_id, reaction=None):
+    """Hand the shared record's new state (None once deleted) to the write-behind queue."""
+    get_forum_writer().record(kind, rec_id, get_forum_service().get(kind, rec_id), reaction=reaction)
+
+
+def _persist(kind, rec_id, store_op):
+    """Store backends write the row / event now; CSV changes are queued."""
+    store = get_forum_store()
+    if store is not None:
+        store_op(store)
+    else:
+        _queue(kind, rec_id)
+
+
+def create_forum_post(post):
+    """Publish a new post (gets its id here)."""
+    store = get_forum_store()
+    post.id = store.insert_post(post) if store is not None else new_id()
+    get_forum_service().insert(POSTS, post)
+    if store is None:
+        _queue(POSTS, post.id)
+    sync_forum_session()
+    return post.id
+
+
+def create_game_request(request):
+    """Submit a new game request (gets its id here)."""
+    store = get_forum_store()
+    request.id = store.insert_request(request) if store is not None else new_id()
+    get_forum_service().insert(REQUESTS, request)
+    if store is None:
+        _queue(REQUESTS, request.id)
+    sync_forum_session()
+    return request.id
+
+
+# ============================================================
+# POSTS
+# ============================================================
+
+def _update_post(post_id, fn, store_op):
+    """Apply fn to the shared post, persist the change, pull it into the session."""
+    if get_forum_service().update(POSTS, post_id, fn):
+        _persist(POSTS, post_id, store_op)
+        sync_forum_session()
+
+
+def add_reaction(post_id, emoji):
+    """Add a reaction to a post (queued with every backend: clicks are summed per flush)."""
+    def react(post):
+        post.reactions[emoji] += 1
+
+    if get_forum_service().update(POSTS, post_id, react):
+        _queue(POSTS, post_id, reaction=emoji)
+        sync_forum_session()
+
+
+def add_comment_to_post(post_id, author, text):
+    """Add a comment to a post."""
+    comment = Comment(author=author, text=text, timestamp=datetime.now().strftime("%Y-%m-%d %H:%M"))
+    store = get_forum_store()
+    if get_forum_service().get(POSTS, post_id) is None:
+        return
+    comment.id = store.add_comment(post_id, author, text, comment.timestamp) if store is not None else new_id()
+    _update_post(post_id, lambda post: post.comments.append(comment), lambda store: None)
+
+
+def delete_comment(post_id, comment_id):
     """Delete a comment from a post."""
-    comments = st.session_state.forum_posts[post_idx].get('comments', [])
-    if isinstance(comments, str):
-        try:
-            comments = json.loads(comments)
-        except:
-            comments = []
+    def remove(post):
+        post.comments = [c for c in post.comments if c.id != comment_id]
 
-    if 0 <= comment_idx < len(comments):
-        comments.pop(comment_idx)
-        st.session_state.forum_posts[post_idx]['comments'] = json.dumps(comments, ensure_ascii=False)
-        save_forum_comment(None)
+    _update_post(post_id, remove, lambda store: store.delete_comment(post_id, comment_id))
 
 
-def delete_forum_post(post_idx):
+def delete_forum_post(post_id):
     """Delete a forum post."""
-    if 0 <= post_idx < len(st.session_state.forum_posts):
-        st.session_state.forum_posts.pop(post_idx)
-        save_forum_comment(None)
+    if get_forum_service().delete(POSTS, post_id):
+        _persist(POSTS, post_id, lambda store: store.delete_post(post_id))
+        sync_forum_session()
 
 
-def report_forum_post(post_idx, reason):
+def report_forum_post(post_id, reason):
     """Report a forum post."""
-    if 0 <= post_idx < len(st.session_state.forum_posts):
-        st.session_state.forum_posts[post_idx]['reported'] = True
-        st.session_state.forum_posts[post_idx]['report_reason'] = reason
-        save_forum_comment(None)
+    def report(post):
+        post.reported = True
+        post.report_reason = reason
+
+    _update_post(post_id, report, lambda store: store.report_post(post_id, reason))
+
+
+def dismiss_report(post_id):
+    """Clear the report flag of a post (admin "ignore")."""
+    def dismiss(post):
+        post.reported = False
+        post.report_reason = ''
+
+    _update_post(post_id, dismiss, lambda store: store.resolve_reports(post_id))
+
+
+# ============================================================
+# GAME REQUESTS
+# ============================================================
+
+def _set_request_status(req_id, status):
+    def set_status(request):
+        request.status = status
+
+    if get_forum_service().update(REQUESTS, req_id, set_status):
+        _persist(REQUESTS, req_id, lambda store: store.set_request_status(req_id, status))
+        sync_forum_session()
 
 
-def approve_game_request(req_idx):
+def approve_game_request(req_id):
     """Approve a game request."""
-    if 0 <= req_idx < len(st.session_state.game_requests):
-        st.session_state.game_requests[req_idx]['status'] = 'approved'
-        save_game_request(None)
+    _set_request_status(req_id, 'approved')
 
 
-def reject_game_request(req_idx):
+def reject_game_request(req_id):
     """Reject a game request."""
-    if 0 <= req_idx < len(st.session_state.game_requests):
-        st.session_state.game_requests[req_idx]['status'] = 'rejected'
-        save_game_request(None)
+    _set_request_status(req_id, 'rejected')
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+SQLite storage for the forum and game requests (ECHEC_MAP_FORUM_BACKEND=sqlite,
+WAL mode): posts, comments, reactions, reports and requests have their own
+tables, so a reaction is one UPSERT, and rows come back as the same Post /
+GameRequest records as the CSV loader. The first open imports the CSV files;
+`python -m modules.forum_db [--db forum.db] [--force]` runs the import by hand.
+"""
+import os
+import sqlite3
+import threading
+from collections import Counter
+
+import pandas as pd
+import streamlit as st
+
+from modules.config import FORUM_DB_PATH, FORUM_CSV_PATH, GAME_REQUESTS_CSV_PATH
+from modules.forum_records import (Post, Comment, GameRequest, POST_FIELDS, REQUEST_FIELDS,
+                                   now_str, text_cell)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS posts (
+    id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL,
+    user_icon TEXT NOT NULL DEFAULT '',
+    bar TEXT NOT NULL DEFAULT '',
+    game TEXT NOT NULL DEFAULT '',
+    "when" TEXT NOT NULL DEFAULT '',
+    message TEXT NOT NULL DEFAULT '',
+    timestamp TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS posts_bar ON posts (bar, id);
+CREATE INDEX IF NOT EXISTS posts_author ON posts (username);
+
+CREATE TABLE IF NOT EXISTS comments (
+    id INTEGER PRIMARY KEY,
+    post_id INTEGER NOT NULL REFERENCES posts (id) ON DELETE CASCADE,
+    author TEXT NOT NULL,
+    text TEXT NOT NULL DEFAULT '',
+    timestamp TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS comments_post ON comments (post_id, id);
+CREATE INDEX IF NOT EXISTS comments_author ON comments (author);
+
+CREATE TABLE IF NOT EXISTS reactions (
+    post_id INTEGER NOT NULL REFERENCES posts (id) ON DELETE CASCADE,
+    emoji TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (post_id, emoji)
+);
+
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER PRIMARY KEY,
+    post_id INTEGER NOT NULL REFERENCES posts (id) ON DELETE CASCADE,
+    reason TEXT NOT NULL DEFAULT '',
+    reported_at TEXT NOT NULL DEFAULT '',
+    resolved_at TEXT
+);
+CREATE INDEX IF NOT EXISTS reports_open ON reports (post_id) WHERE resolved_at IS NULL;
+
+CREATE TABLE IF NOT EXISTS requests (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL DEFAULT '',
+    username TEXT NOT NULL DEFAULT '',
+    bar_name TEXT NOT NULL DEFAULT '',
+    game_name TEXT NOT NULL DEFAULT '',
+    action_type TEXT NOT NULL DEFAULT '',
+    description TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL DEFAULT 'pending'
+);
+CREATE INDEX IF NOT EXISTS requests_status ON requests (status, id);
+CREATE INDEX IF NOT EXISTS requests_bar ON requests (bar_name);
+CREATE INDEX IF NOT EXISTS requests_author ON requests (username);
+"""
+
+
+class ForumDB:
+    """
+    One shared connection (check_same_thread=False) serialized by a lock:
+    Streamlit sessions run in threads of a single process, and SQLite only
+    allows one writer at a time anyway. WAL lets readers in other processes
+    (the migrator, a shell) run alongside the app.
+    """
+
+    def __init__(self, path=FORUM_DB_PATH):
+        self.path = path
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def shared_connection(self):
+        """(connection, lock) for other tables of the same database (modules.storage)."""
+        return self._conn, self._lock
+
+    def _write(self, sql, params=()):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cur = self._conn.execute(sql, params)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return cur
+
+    # --- Reads ---
+
+    def load_posts(self):
+        """All posts, newest first, as Post records."""
+        with self._lock:
+            posts = self._conn.execute(
+                'SELECT p.*, r.reason AS report_reason FROM posts p '
+                'LEFT JOIN reports r ON r.id = (SELECT MAX(id) FROM reports '
+                '  WHERE post_id = p.id AND resolved_at IS NULL) '
+                'ORDER BY p.id DESC').fetchall()
+            comments = self._conn.execute(
+                'SELECT id, post_id, author, text, timestamp FROM comments ORDER BY post_id, id').fetchall()
+            reactions = self._conn.execute(
+                'SELECT post_id, emoji, count FROM reactions ORDER BY rowid').fetchall()
+
+        by_post = {}
+        for c in comments:
+            by_post.setdefault(c['post_id'], []).append(
+                Comment(id=c['id'], author=c['author'], text=c['text'], timestamp=c['timestamp']))
+        counts = {}
+        for r in reactions:
+            counts.setdefault(r['post_id'], Counter())[r['emoji']] = r['count']
+
+        return [Post(id=p['id'], **{f: p[f] for f in POST_FIELDS},
+                     reported=p['report_reason'] is not None,
+                     report_reason=p['report_reason'] or '',
+                     reactions=counts.get(p['id'], Counter()),
+                     comments=by_post.get(p['id'], []))
+                for p in posts]
+
+    def load_requests(self, status=None):
+        """Game requests in submission order, optionally for one status."""
+        sql = 'SELECT * FROM requests'
+        params = ()
+        if status is not None:
+            sql += ' WHERE status = ?'
+            params = (status,)
+        with self._lock:
+            rows = self._conn.execute(sql + ' ORDER BY id', params).fetchall()
+        return [GameRequest(**dict(r)) for r in rows]
+
+    def poll_token(self):
+        """Changes when another connection commits (PRAGMA data_version)."""
+        with self._lock:
+            return self._conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def posts_for_bar(self, bar):
+        """Ids of the posts about one bar, newest first (uses posts_bar)."""
+        with self._lock:
+            rows = self._conn.execute('SELECT id FROM posts WHERE bar = ? ORDER BY id DESC', (bar,)).fetchall()
+        return [r['id'] for r in rows]
+
+    # --- Single-row writes ---
+
+    def insert_post(self, post):
+        cur = self._write(
+            'INSERT INTO posts (username, user_icon, bar, game, "when", message, timestamp) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)', [getattr(post, f) for f in POST_FIELDS])
+        return cur.lastrowid
+
+    def delete_post(self, post_id):
+        self._write('DELETE FROM posts WHERE id = ?', (post_id,))
+
+    def add_reaction(self, post_id, emoji, n=1):
+        self._write(
+            'INSERT INTO reactions (post_id, emoji, count) VALUES (?, ?, ?) '
+            'ON CONFLICT (post_id, emoji) DO UPDATE SET count = count + excluded.count',
+            (post_id, emoji, n))
+
+    def add_comment(self, post_id, author, text, timestamp=None):
+        cur = self._write(
+            'INSERT INTO comments (post_id, author, text, timestamp) VALUES (?, ?, ?, ?)',
+            (post_id, author, text, timestamp or now_str()))
+        return cur.lastrowid
+
+    def delete_comment(self, post_id, comment_id):
+        self._write('DELETE FROM comments WHERE id = ? AND post_id = ?', (comment_id, post_id))
+
+    def report_post(self, post_id, reason):
+        cur = self._write(
+            'INSERT INTO reports (post_id, reason, reported_at) VALUES (?, ?, ?)',
+            (post_id, text_cell(reason), now_str()))
+        return cur.lastrowid
+
+    def resolve_reports(self, post_id):
+        self._write('UPDATE reports SET resolved_at = ? WHERE post_id = ? AND resolved_at IS NULL',
+                    (now_str(), post_id))
+
+    def insert_request(self, request):
+        values = [getattr(request, f) for f in REQUEST_FIELDS]
+        cur = self._write(
+            'INSERT INTO requests (timestamp, username, bar_name, game_name, action_type, description, status) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)', values)
+        return cur.lastrowid
+
+    def set_request_status(self, request_id, status):
+        self._write('UPDATE requests SET status = ? WHERE id = ?', (status, request_id))
+
+    # --- Migration ---
+
+    def migrated(self):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'csv_migrated'").fetchone()
+        return row is not None
+
+    def migrate_csv(self, forum_csv=FORUM_CSV_PATH, requests_csv=GAME_REQUESTS_CSV_PATH, force=False):
+        """
+        Import the CSV files in one transaction. Runs once: later calls are
+        no-ops unless force=True, which replaces the current contents.
+        Returns (posts, comments, requests) imported.
+        """
+        if self.migrated() and not force:
+            return (0, 0, 0)
+        posts = [Post.from_row(r) for r in pd.read_csv(forum_csv, encoding='utf-8').to_dict('records')] \
+            if os.path.exists(forum_csv) else []
+        requests = [GameRequest.from_row(r) for r in pd.read_csv(requests_csv, encoding='utf-8').to_dict('records')] \
+            if os.path.exists(requests_csv) else []
+
+        n_comments = 0
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for table in ('reports', 'reactions', 'comments', 'posts', 'requests'):
+                    conn.execute(f'DELETE FROM {table}')
+                # The CSV lists newest first: insert oldest first so ids grow with time
+                for post in reversed(posts):
+                    post_id = conn.execute(
+                        'INSERT INTO posts (username, user_icon, bar, game, "when", message, timestamp) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?)', [getattr(post, f) for f in POST_FIELDS]).lastrowid
+                    conn.executemany(
+                        'INSERT INTO reactions (post_id, emoji, count) VALUES (?, ?, ?)',
+                        [(post_id, e, c) for e, c in post.reactions.items()])
+                    conn.executemany(
+                        'INSERT INTO comments (post_id, author, text, timestamp) VALUES (?, ?, ?, ?)',
+                        [(post_id, c.author, c.text, c.timestamp) for c in post.comments])
+                    n_comments += len(post.comments)
+                    if post.reported:
+                        conn.execute('INSERT INTO reports (post_id, reason, reported_at) VALUES (?, ?, ?)',
+                                     (post_id, post.report_reason, post.timestamp))
+                conn.executemany(
+                    'INSERT INTO requests (timestamp, username, bar_name, game_name, action_type, description, status) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    [[getattr(r, f) for f in REQUEST_FIELDS] for r in requests])
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('csv_migrated', ?)", (now_str(),))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return (len(posts), n_comments, len(requests))
+
+
+@st.cache_resource(show_spinner=False)
+def get_forum_db(path=FORUM_DB_PATH):
+    """Process-wide ForumDB; imports the CSV files on first open."""
+    db = ForumDB(path)
+    db.migrate_csv()
+    return db
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Import the forum CSV files into SQLite")
+    parser.add_argument('--db', default=FORUM_DB_PATH)
+    parser.add_argument('--force', action='store_true', help="re-import even if already migrated")
+    args = parser.parse_args()
+
+    db = ForumDB(args.db)
+    if db.migrated() and not args.force:
+        print(f"{args.db} already migrated (use --force to re-import)")
+    else:
+        n_posts, n_comments, n_requests = db.migrate_csv(force=True)
+        print(f"{args.db}: {n_posts} posts, {n_comments} comments, {n_requests} requests imported")
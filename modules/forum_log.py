@@ -0,0 +1,361 @@
+# -*- coding: utf-8 -*-
+"""
+Event-sourced forum store (ECHEC_MAP_FORUM_BACKEND=log): every mutation is one
+JSON line appended to a shared log under an exclusive flock, fsynced in
+batches (FSYNC_BATCH, FSYNC_INTERVAL); readers keep a ForumView refreshed
+from their last offset, and a background compactor folds the log into a
+snapshot once it passes COMPACT_MIN_EVENTS. The first open imports the CSV
+files.
+"""
+import os
+import json
+import time
+import fcntl
+import threading
+from collections import Counter
+
+import pandas as pd
+import streamlit as st
+
+from modules.config import FORUM_LOG_DIR, FORUM_CSV_PATH, GAME_REQUESTS_CSV_PATH
+from modules.forum_records import (Post, Comment, GameRequest, POST_FIELDS, REQUEST_FIELDS,
+                                   now_str, text_cell)
+
+FSYNC_BATCH = 256          # events appended before an fsync is forced
+FSYNC_INTERVAL = 0.05      # seconds a written event may stay un-synced
+COMPACT_INTERVAL = 60.0    # seconds between compactor checks
+COMPACT_MIN_EVENTS = 10_000
+
+SNAPSHOT_NAME = 'snapshot.json'
+
+
+class ForumView:
+    """
+    Materialized forum state: posts and requests by id, in creation order.
+    apply() folds one event in; events for unknown ids are ignored, so a
+    reaction racing a delete is harmless.
+    """
+
+    def __init__(self, state=None):
+        state = state or {}
+        self.posts = {int(k): v for k, v in state.get('posts', {}).items()}
+        self.requests = {int(k): v for k, v in state.get('requests', {}).items()}
+        self.next_id = state.get('next_id', 1)
+
+    def state(self):
+        return {'posts': self.posts, 'requests': self.requests, 'next_id': self.next_id}
+
+    def apply(self, event):
+        op = event['op']
+        if 'id' in event:
+            self.next_id = max(self.next_id, event['id'] + 1)
+        if op == 'post':
+            post = dict(event['post'])
+            post.update(reactions={}, comments=[], report_reason=None)
+            self.posts[event['id']] = post
+        elif op == 'request':
+            self.requests[event['id']] = dict(event['request'])
+        elif op == 'request_status':
+            if event['id'] in self.requests:
+                self.requests[event['id']]['status'] = event['status']
+        else:
+            post = self.posts.get(event['post'])
+            if post is None:
+                return
+            if op == 'react':
+                post['reactions'][event['emoji']] = post['reactions'].get(event['emoji'], 0) + event.get('n', 1)
+            elif op == 'comment':
+                post['comments'].append(dict(event['comment'], id=event['id']))
+            elif op == 'delete_comment':
+                post['comments'] = [c for c in post['comments'] if c['id'] != event['id']]
+            elif op == 'delete':
+                del self.posts[event['post']]
+            elif op == 'report':
+                post['report_reason'] = event['reason']
+            elif op == 'dismiss':
+                post['report_reason'] = None
+
+    def post_records(self):
+        """Posts newest first, as Post records."""
+        records = []
+        for post_id in reversed(self.posts):
+            p = self.posts[post_id]
+            records.append(Post(
+                id=post_id, **{f: p[f] for f in POST_FIELDS},
+                reported=p['report_reason'] is not None,
+                report_reason=p['report_reason'] or '',
+                reactions=Counter(p['reactions']),
+                comments=[Comment(**c) for c in p['comments']]))
+        return records
+
+    def request_records(self):
+        return [GameRequest(id=i, **r) for i, r in self.requests.items()]
+
+
+class ForumLog:
+    """Writer and shared reader of one log directory (see module docstring)."""
+
+    def __init__(self, directory=FORUM_LOG_DIR, compact_interval=COMPACT_INTERVAL, compact_min_events=COMPACT_MIN_EVENTS):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()
+        self._lock_fd = os.open(os.path.join(directory, 'lock'), os.O_RDWR | os.O_CREAT, 0o644)
+        self._fd = None
+        self._pending = 0          # events written since the last fsync
+        self._last_sync = time.monotonic()
+        self.compact_min_events = compact_min_events
+        self.stats = {'appends': 0, 'fsyncs': 0, 'compactions': 0}
+        self.external_events = 0   # events applied from other writers
+        self._closed = threading.Event()
+        with self._locked():
+            self._load_snapshot()
+            self._tail()
+        threading.Thread(target=self._background, args=(compact_interval,), daemon=True).start()
+
+    # --- Files ---
+
+    def _log_path(self, generation):
+        return os.path.join(self.directory, f'events.{generation}.jsonl')
+
+    def _locked(self):
+        """Thread lock + exclusive flock on the directory, as a context manager."""
+        log = self
+
+        class _Guard:
+            def __enter__(self):
+                log._lock.acquire()
+                fcntl.flock(log._lock_fd, fcntl.LOCK_EX)
+
+            def __exit__(self, *exc):
+                fcntl.flock(log._lock_fd, fcntl.LOCK_UN)
+                log._lock.release()
+        return _Guard()
+
+    def _load_snapshot(self):
+        try:
+            with open(os.path.join(self.directory, SNAPSHOT_NAME), encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            snapshot = {'generation': 0, 'state': None}
+        self.generation = snapshot['generation']
+        self.view = ForumView(snapshot['state'])
+        self.offset = 0
+        self.events_in_log = 0
+        self._partial = b''
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = os.open(self._log_path(self.generation), os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def _tail(self):
+        """Apply the events appended since self.offset (by anyone)."""
+        if not os.path.exists(self._log_path(self.generation)):
+            # Another process compacted: its snapshot holds everything we missed
+            self._load_snapshot()
+        size = os.fstat(self._fd).st_size
+        if size <= self.offset:
+            return 0
+        data = self._partial + os.pread(self._fd, size - self.offset, self.offset)
+        self.offset = size
+        lines = data.split(b'\n')
+        self._partial = lines.pop()  # incomplete last line (writer mid-append)
+        for line in lines:
+            if line:
+                self.view.apply(json.loads(line))
+        self.events_in_log += len(lines)
+        self.external_events += len(lines)
+        return len(lines)
+
+    # --- Reads ---
+
+    def refresh(self):
+        """Bring the view up to date; returns the number of new events."""
+        with self._lock:
+            return self._tail()
+
+    def poll_token(self):
+        """Changes when another writer appended (our own appends don't count)."""
+        with self._lock:
+            self._tail()
+            return (self.generation, self.external_events)
+
+    def load_posts(self):
+        with self._lock:
+            self._tail()
+            return self.view.post_records()
+
+    def load_requests(self, status=None):
+        with self._lock:
+            self._tail()
+            records = self.view.request_records()
+        return records if status is None else [r for r in records if r.status == status]
+
+    # --- Writes ---
+
+    def append(self, event, new_id=False):
+        """
+        Append one event (assigning event['id'] when new_id) and return it.
+        The view is caught up first, so ids never collide across processes.
+        """
+        with self._locked():
+            self._tail()
+            if new_id:
+                event['id'] = self.view.next_id
+            self._write([event])
+            return event
+
+    def append_many(self, events):
+        """Append events in one write (ids must already be set)."""
+        with self._locked():
+            self._tail()
+            self._write(events)
+
+    def _write(self, events):
+        data = b''.join(json.dumps(e, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+                        for e in events)
+        os.write(self._fd, data)
+        # Our own events are applied directly; the offset moves past them
+        for e in events:
+            self.view.apply(e)
+        self.offset += len(data)
+        self.events_in_log += len(events)
+        self.stats['appends'] += len(events)
+        self._pending += len(events)
+        if self._pending >= FSYNC_BATCH or time.monotonic() - self._last_sync >= FSYNC_INTERVAL:
+            self._fsync()
+
+    def _fsync(self):
+        if self._pending:
+            os.fsync(self._fd)
+            self._pending = 0
+            self.stats['fsyncs'] += 1
+        self._last_sync = time.monotonic()
+
+    def sync(self):
+        """Make every appended event durable now."""
+        with self._lock:
+            self._fsync()
+
+    # Same method names as modules.forum_db.ForumDB
+
+    def insert_post(self, post):
+        return self.append({'op': 'post', 'post': {f: getattr(post, f) for f in POST_FIELDS}}, new_id=True)['id']
+
+    def delete_post(self, post_id):
+        self.append({'op': 'delete', 'post': post_id})
+
+    def add_reaction(self, post_id, emoji, n=1):
+        self.append({'op': 'react', 'post': post_id, 'emoji': emoji, 'n': n})
+
+    def add_comment(self, post_id, author, text, timestamp=None):
+        comment = {'author': author, 'text': text, 'timestamp': timestamp or now_str()}
+        return self.append({'op': 'comment', 'post': post_id, 'comment': comment}, new_id=True)['id']
+
+    def delete_comment(self, post_id, comment_id):
+        self.append({'op': 'delete_comment', 'post': post_id, 'id': comment_id})
+
+    def report_post(self, post_id, reason):
+        self.append({'op': 'report', 'post': post_id, 'reason': text_cell(reason)})
+
+    def resolve_reports(self, post_id):
+        self.append({'op': 'dismiss', 'post': post_id})
+
+    def insert_request(self, request):
+        values = {f: getattr(request, f) for f in REQUEST_FIELDS}
+        return self.append({'op': 'request', 'request': values}, new_id=True)['id']
+
+    def set_request_status(self, request_id, status):
+        self.append({'op': 'request_status', 'id': request_id, 'status': status})
+
+    # --- Compaction ---
+
+    def compact(self):
+        """Fold the current log into a snapshot and start an empty one."""
+        with self._locked():
+            self._tail()
+            self._fsync()
+            old = self._log_path(self.generation)
+            generation = self.generation + 1
+            open(self._log_path(generation), 'ab').close()
+            path = os.path.join(self.directory, SNAPSHOT_NAME)
+            tmp = f'{path}.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'generation': generation, 'state': self.view.state()}, f,
+                          ensure_ascii=False, separators=(',', ':'))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+            os.remove(old)
+            os.close(self._fd)
+            self._fd = os.open(self._log_path(generation), os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+            self.generation = generation
+            self.offset = 0
+            self.events_in_log = 0
+            self._partial = b''
+            self.stats['compactions'] += 1
+
+    def _background(self, compact_interval):
+        """Flush late fsyncs every FSYNC_INTERVAL; compact every compact_interval."""
+        next_compact = time.monotonic() + compact_interval
+        while not self._closed.wait(FSYNC_INTERVAL):
+            try:
+                if self._pending and time.monotonic() - self._last_sync >= FSYNC_INTERVAL:
+                    self.sync()
+                if time.monotonic() >= next_compact:
+                    next_compact = time.monotonic() + compact_interval
+                    if self.events_in_log >= self.compact_min_events:
+                        self.compact()
+            except OSError as e:
+                print(f"Forum log maintenance failed: {e}")
+
+    def close(self):
+        self._closed.set()
+        with self._lock:
+            self._fsync()
+            os.close(self._fd)
+            os.close(self._lock_fd)
+
+    # --- Migration ---
+
+    def is_empty(self):
+        with self._lock:
+            return self.generation == 0 and self.offset == 0 and not self.view.posts and not self.view.requests
+
+    def import_csv(self, forum_csv=FORUM_CSV_PATH, requests_csv=GAME_REQUESTS_CSV_PATH):
+        """Replay the CSV files as events (oldest post first)."""
+        posts = [Post.from_row(r) for r in pd.read_csv(forum_csv, encoding='utf-8').to_dict('records')] \
+            if os.path.exists(forum_csv) else []
+        requests = [GameRequest.from_row(r) for r in pd.read_csv(requests_csv, encoding='utf-8').to_dict('records')] \
+            if os.path.exists(requests_csv) else []
+        with self._locked():
+            self._tail()
+            next_id = self.view.next_id
+            events = []
+            for post in reversed(posts):
+                post_id = next_id
+                next_id += 1
+                events.append({'op': 'post', 'id': post_id, 'post': {f: getattr(post, f) for f in POST_FIELDS}})
+                for emoji, n in post.reactions.items():
+                    events.append({'op': 'react', 'post': post_id, 'emoji': emoji, 'n': n})
+                for c in post.comments:
+                    events.append({'op': 'comment', 'post': post_id, 'id': next_id, 'comment': {
+                        'author': c.author, 'text': c.text, 'timestamp': c.timestamp}})
+                    next_id += 1
+                if post.reported:
+                    events.append({'op': 'report', 'post': post_id, 'reason': post.report_reason})
+            for r in requests:
+                events.append({'op': 'request', 'id': next_id,
+                               'request': {f: getattr(r, f) for f in REQUEST_FIELDS}})
+                next_id += 1
+            self._write(events)
+            self._fsync()
+        return len(events)
+
+
+@st.cache_resource(show_spinner=False)
+def get_forum_log(directory=FORUM_LOG_DIR):
+    """Process-wide ForumLog; imports the CSV files into a brand new log."""
+    log = ForumLog(directory)
+    if log.is_empty():
+        log.import_csv()
+    return log
+
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+Typed forum records (Post, Comment, GameRequest): storage rows are decoded
+once when loaded (from_row), reactions into a Counter and comments into a list
+of Comment whatever their stored format (JSON, Python repr or the legacy
+'|||' text), and serialized back by to_row() only when a file is written.
+"""
+import ast
+import json
+from collections import Counter
+from datetime import datetime
+from dataclasses import dataclass, field, fields
+
+POST_FIELDS = ['username', 'user_icon', 'bar', 'game', 'when', 'message', 'timestamp']
+REQUEST_FIELDS = ['timestamp', 'username', 'bar_name', 'game_name', 'action_type', 'description', 'status']
+
+
+def now_str():
+    """Current time as the forum stores it ('YYYY-MM-DD HH:MM')."""
+    return datetime.now().strftime("%Y-%m-%d %H:%M")
+
+
+def text_cell(value):
+    """CSV cell -> str ('' for NaN/None)."""
+    if value is None or (isinstance(value, float) and value != value):
+        return ''
+    return str(value)
+
+
+def _is_true(value):
+    return value is True or str(value).strip().lower() in ('true', '1')
+
+
+def _id(value):
+    """Stored id, or None for a missing cell (NaN)."""
+    if value is None or value == '' or (isinstance(value, float) and value != value):
+        return None
+    return value
+
+
+def parse_reactions(value):
+    """Reactions cell (JSON dict string, dict or NaN) -> Counter {emoji: count}."""
+    if isinstance(value, str) and value.strip():
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return Counter()
+    if not isinstance(value, dict):
+        return Counter()
+    counts = Counter()
+    for emoji, n in value.items():
+        try:
+            counts[str(emoji)] = int(n)
+        except (TypeError, ValueError):
+            continue
+    return counts
+
+
+def parse_comments(value):
+    """
+    Comments cell -> list of {'author', 'text', 'timestamp'} dicts. Accepts a
+    list, a JSON list, a Python repr list (older saves) and the legacy
+    '|||'-separated text.
+    """
+    if isinstance(value, list):
+        return value
+    if not isinstance(value, str) or not value.strip():
+        return []
+    for parse in (json.loads, ast.literal_eval):
+        try:
+            parsed = parse(value)
+            if isinstance(parsed, list):
+                return [c for c in parsed if isinstance(c, dict)]
+        except (ValueError, SyntaxError):
+            continue
+    if '|||' in value:
+        return [{'author': 'Anonyme', 'text': c, 'timestamp': ''} for c in value.split('|||') if c]
+    return []
+
+
+def assign(target, source):
+    """Copy every field of source into target (same record type), in place."""
+    for f in fields(target):
+        setattr(target, f.name, getattr(source, f.name))
+
+
+@dataclass(slots=True)
+class Comment:
+    id: object = None
+    author: str = 'Anonyme'
+    text: str = ''
+    timestamp: str = ''
+
+    @classmethod
+    def from_any(cls, value):
+        if isinstance(value, Comment):
+            return value
+        return cls(id=_id(value.get('id')), author=text_cell(value.get('author')) or 'Anonyme',
+                   text=text_cell(value.get('text')), timestamp=text_cell(value.get('timestamp')))
+
+    def to_dict(self):
+        return {'author': self.author, 'text': self.text, 'timestamp': self.timestamp, 'id': self.id}
+
+
+@dataclass(slots=True)
+class Post:
+    id: object = None
+    username: str = ''
+    user_icon: str = ''
+    bar: str = ''
+    game: str = ''
+    when: str = ''
+    message: str = ''
+    timestamp: str = ''
+    reported: bool = False
+    report_reason: str = ''
+    reactions: Counter = field(default_factory=Counter)
+    comments: list = field(default_factory=list)
+
+    @classmethod
+    def from_row(cls, row):
+        """Decode one stored row (CSV record or dict), whatever its vintage."""
+        return cls(
+            id=_id(row.get('id')),
+            **{f: text_cell(row.get(f)) for f in POST_FIELDS},
+            reported=_is_true(row.get('reported')),
+            report_reason=text_cell(row.get('report_reason')),
+            reactions=parse_reactions(row.get('reactions')),
+            comments=[Comment.from_any(c) for c in parse_comments(row.get('comments'))],
+        )
+
+    def to_row(self):
+        """CSV row: reactions and comments as JSON strings."""
+        row = {f: getattr(self, f) for f in POST_FIELDS}
+        row.update(
+            reported=self.reported,
+            report_reason=self.report_reason,
+            reactions=json.dumps(dict(self.reactions), ensure_ascii=False) if self.reactions else '',
+            comments=json.dumps([c.to_dict() for c in self.comments], ensure_ascii=False),
+            id=self.id,
+        )
+        return row
+
+    def reaction_summary(self):
+        """'👍 2 ❤️ 1' (insertion order), '' without reactions."""
+        return ' '.join(f"{emoji} {count}" for emoji, count in self.reactions.items())
+
+
+@dataclass(slots=True)
+class GameRequest:
+    id: object = None
+    timestamp: str = ''
+    username: str = ''
+    bar_name: str = ''
+    game_name: str = ''
+    action_type: str = ''
+    description: str = ''
+    status: str = 'pending'
+
+    @classmethod
+    def from_row(cls, row):
+        values = {f: text_cell(row.get(f)) for f in REQUEST_FIELDS}
+        values['status'] = values['status'] or 'pending'
+        return cls(id=_id(row.get('id')), **values)
+
+    def to_row(self):
+        row = {f: getattr(self, f) for f in REQUEST_FIELDS}
+        row['id'] = self.id
+        return row
+
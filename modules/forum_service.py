@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""
+Shared forum state, one copy of the posts and game requests per process:
+ForumService changes the records under a lock and stamps each change with a
+version, so a session pulls only what changed since its last version
+(changes_since()); check_source() picks up outside writes. It also keeps the
+post sequence numbers that page the feed (page()) and the per-bar activity
+behind the map badges and notifications (bar_activity(), bar_posts()).
+"""
+import copy
+import time
+import bisect
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from modules.config import FORUM_BACKEND
+from modules.forum_db import get_forum_db
+from modules.forum_log import get_forum_log
+from modules.storage import get_storage, FORUM_POSTS, GAME_REQUESTS
+
+POSTS = 'posts'
+REQUESTS = 'requests'
+MAX_CHANGES = 2_000          # change log length; older sessions get a full copy
+FEED_PAGE_SIZE = 10
+SOURCE_POLL_INTERVAL = 2.0   # seconds between checks of the backing storage
+RECENT_DAYS = 7              # window of the per-bar "recent" count
+
+
+def get_forum_store():
+    """The ForumDB / ForumLog behind FORUM_BACKEND, or None for modules.storage."""
+    if FORUM_BACKEND == 'sqlite':
+        return get_forum_db()
+    if FORUM_BACKEND == 'log':
+        return get_forum_log()
+    return None
+
+
+def source_stamp():
+    """Changes when another writer touched the forum storage (not on our own writes for stores)."""
+    store = get_forum_store()
+    if store is not None:
+        return store.poll_token()
+    storage = get_storage()
+    return (storage.version(FORUM_POSTS), storage.version(GAME_REQUESTS))
+
+
+@dataclass(slots=True)
+class BarIndex:
+    """One bar's posts: sorted sequence numbers and timestamps, reported count."""
+    seqs: list = field(default_factory=list)
+    times: list = field(default_factory=list)
+    reported: int = 0
+
+
+class ForumService:
+    """
+    Posts (newest first) and requests (oldest first) by id, a version
+    counter and the log of (version, kind, id) changes. Records are
+    modules.forum_records dataclasses; those handed out are deep copies, so
+    sessions never share mutable state with the service.
+    """
+
+    def __init__(self, load_posts, load_requests, stamp=source_stamp):
+        self._load = {POSTS: load_posts, REQUESTS: load_requests}
+        self._stamp = stamp
+        self._lock = threading.RLock()
+        self._records = {POSTS: {}, REQUESTS: {}}
+        # Feed index: post id -> sequence number, sorted live sequence numbers
+        self._seq = {}
+        self._order = []
+        self._by_seq = {}
+        self._next_seq = 1
+        self._bars = {}            # bar name -> BarIndex
+        self._changes = deque()
+        self._floor = 0            # versions <= _floor are no longer in _changes
+        self.version = 0
+        self._source = None
+        self._next_poll = 0.0
+        self.reload()
+
+    # --- Reads ---
+
+    def records(self, kind):
+        """Deep copies in display order: posts newest first, requests oldest first."""
+        with self._lock:
+            values = list(self._records[kind].values())
+        if kind == POSTS:
+            values.reverse()
+        return copy.deepcopy(values)
+
+    def get(self, kind, rec_id):
+        with self._lock:
+            record = self._records[kind].get(rec_id)
+            return copy.deepcopy(record) if record is not None else None
+
+    def page(self, cursor=None, limit=FEED_PAGE_SIZE):
+        """
+        (post ids, next cursor): up to limit posts older than cursor, newest
+        first. cursor None is the newest page; next cursor is None on the
+        last page.
+        """
+        with self._lock:
+            hi = len(self._order) if cursor is None else bisect.bisect_left(self._order, cursor)
+            lo = max(0, hi - limit)
+            seqs = self._order[lo:hi][::-1]
+            return [self._by_seq[s] for s in seqs], (seqs[-1] if lo > 0 and seqs else None)
+
+    def cursors_to(self, post_id, limit=FEED_PAGE_SIZE):
+        """
+        Cursors of the pages from the newest one down to the page holding
+        this post ([None] for the first page), or None if the post is gone.
+        """
+        with self._lock:
+            seq = self._seq.get(post_id)
+            if seq is None:
+                return None
+            n = len(self._order)
+            page = (n - 1 - bisect.bisect_left(self._order, seq)) // limit
+            return [None] + [self._order[n - k * limit] for k in range(1, page + 1)]
+
+    def bar_activity(self, recent_days=RECENT_DAYS, now=None):
+        """
+        {bar: (active, reported, recent)} for every bar with posts; recent
+        counts the posts of the last recent_days days (one bisect per bar).
+        """
+        now = datetime.now() if now is None else now
+        cutoff = (now - timedelta(days=recent_days)).strftime("%Y-%m-%d %H:%M")
+        with self._lock:
+            return {bar: (len(entry.seqs), entry.reported,
+                          len(entry.times) - bisect.bisect_left(entry.times, cutoff))
+                    for bar, entry in self._bars.items()}
+
+    def bar_posts(self, bar):
+        """Ids of the posts about one bar, newest first."""
+        with self._lock:
+            entry = self._bars.get(bar)
+            return [] if entry is None else [self._by_seq[s] for s in reversed(entry.seqs)]
+
+    def changes_since(self, seen):
+        """
+        {kind: ([changed records], [deleted ids])} since version seen, or None
+        when seen is older than the change log (pull everything instead).
+        """
+        with self._lock:
+            if seen < self._floor:
+                return None
+            touched = {POSTS: {}, REQUESTS: {}}
+            # Newest changes are at the right end: walk back to seen
+            for version, kind, rec_id in reversed(self._changes):
+                if version <= seen:
+                    break
+                touched[kind][rec_id] = None
+            delta = {}
+            for kind, ids in touched.items():
+                # Oldest first, so new posts are prepended in creation order
+                changed, deleted = [], []
+                for rec_id in reversed(list(ids)):
+                    record = self._records[kind].get(rec_id)
+                    if record is None:
+                        deleted.append(rec_id)
+                    else:
+                        changed.append(copy.deepcopy(record))
+                delta[kind] = (changed, deleted)
+            return delta
+
+    # --- Writes ---
+
+    def _changed(self, kind, rec_id):
+        self.version += 1
+        self._changes.append((self.version, kind, rec_id))
+        while len(self._changes) > MAX_CHANGES:
+            self._floor = self._changes.popleft()[0]
+
+    def _index_post(self, post_id):
+        seq = self._next_seq
+        self._next_seq += 1
+        self._seq[post_id] = seq
+        self._by_seq[seq] = post_id
+        self._order.append(seq)  # sequence numbers only grow: stays sorted
+
+    def _unindex_post(self, post_id):
+        seq = self._seq.pop(post_id)
+        del self._by_seq[seq]
+        del self._order[bisect.bisect_left(self._order, seq)]
+
+    def _index_bar(self, post):
+        entry = self._bars.get(post.bar)
+        if entry is None:
+            entry = self._bars[post.bar] = BarIndex()
+        bisect.insort(entry.seqs, self._seq[post.id])
+        bisect.insort(entry.times, post.timestamp)
+        entry.reported += bool(post.reported)
+
+    def _unindex_bar(self, post):
+        entry = self._bars[post.bar]
+        del entry.seqs[bisect.bisect_left(entry.seqs, self._seq[post.id])]
+        del entry.times[bisect.bisect_left(entry.times, post.timestamp)]
+        entry.reported -= bool(post.reported)
+        if not entry.seqs:
+            del self._bars[post.bar]
+
+    def insert(self, kind, record):
+        with self._lock:
+            record = self._records[kind][record.id] = copy.deepcopy(record)
+            if kind == POSTS:
+                self._index_post(record.id)
+                self._index_bar(record)
+            self._changed(kind, record.id)
+            return self.version
+
+    def update(self, kind, rec_id, fn):
+        """Apply fn(record) to the shared record under the lock; False if it is gone."""
+        with self._lock:
+            record = self._records[kind].get(rec_id)
+            if record is None:
+                return False
+            if kind == POSTS:
+                # fn may change the bar, timestamp or report flag: re-file the post
+                self._unindex_bar(record)
+                fn(record)
+                self._index_bar(record)
+            else:
+                fn(record)
+            self._changed(kind, rec_id)
+            return True
+
+    def delete(self, kind, rec_id):
+        with self._lock:
+            record = self._records[kind].pop(rec_id, None)
+            if record is None:
+                return False
+            if kind == POSTS:
+                self._unindex_bar(record)
+                self._unindex_post(rec_id)
+            self._changed(kind, rec_id)
+            return True
+
+    # --- Backing storage ---
+
+    def mark_synced(self):
+        """Our own write changed the source: don't reload it."""
+        with self._lock:
+            self._source = self._stamp()
+
+    def reload(self):
+        """Reload from the storage and record what differs as changes."""
+        with self._lock:
+            self._source = self._stamp()
+            for kind, load in self._load.items():
+                loaded = load()
+                if kind == POSTS:
+                    loaded = loaded[::-1]
+                fresh = {r.id: r for r in loaded}
+                current = self._records[kind]
+                for rec_id in [i for i in current if i not in fresh]:
+                    del current[rec_id]
+                    self._changed(kind, rec_id)
+                for rec_id, record in fresh.items():
+                    if current.get(rec_id) != record:
+                        current[rec_id] = record
+                        self._changed(kind, rec_id)
+                # Keep the storage order (a rewrite may have reordered rows)
+                self._records[kind] = {rec_id: current[rec_id] for rec_id in fresh}
+            self._seq, self._order, self._by_seq, self._bars = {}, [], {}, {}
+            for post_id, post in self._records[POSTS].items():
+                self._index_post(post_id)
+                self._index_bar(post)
+
+    def check_source(self, now=None):
+        """Reload if another writer changed the storage; rate-limited."""
+        now = time.monotonic() if now is None else now
+        if now < self._next_poll:
+            return False
+        self._next_poll = now + SOURCE_POLL_INTERVAL
+        with self._lock:
+            if self._stamp() == self._source:
+                return False
+            self.reload()
+            return True
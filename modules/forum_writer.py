@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Write-behind persistence for forum changes: ForumWriter.record() appends the
+record's new state (or a tombstone) to a journal and returns at once, and a
+background thread flushes the changes gathered over FLUSH_DELAY as one batch
+(one CSV rewrite and git commit, or one add_reaction(n) per post and emoji),
+retrying a failed batch after RETRY_DELAY; replay() reads back the journals
+that a crash left unflushed.
+"""
+import os
+import json
+import glob
+import time
+import atexit
+import threading
+from collections import Counter
+
+FLUSH_DELAY = 0.25     # seconds changes are coalesced before a flush
+RETRY_DELAY = 5.0      # seconds before a failed flush is retried
+
+JOURNAL_NAME = 'journal.jsonl'
+
+
+def _rotation_number(path):
+    return int(os.path.basename(path).split('.')[1])
+
+
+class ForumWriter:
+    """
+    Journal and coalescing queue in front of flush(dirty_kinds, reactions),
+    reactions being a Counter {(post_id, emoji): clicks}.
+    """
+
+    def __init__(self, directory, flush, delay=FLUSH_DELAY):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.delay = delay
+        self._flush_batch = flush
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._dirty = set()
+        self._reactions = Counter()
+        self._flushing = False
+        self._closed = False
+        self.stats = {'changes': 0, 'flushes': 0, 'errors': 0}
+        self._journal_path = os.path.join(directory, JOURNAL_NAME)
+        # Journals of earlier runs wait, with the current one, for the next good flush
+        self._rotated = sorted(glob.glob(os.path.join(directory, 'journal.*.jsonl')), key=_rotation_number)
+        self._next_rotation = max((_rotation_number(p) for p in self._rotated), default=0) + 1
+        self._journal = open(self._journal_path, 'a', encoding='utf-8')
+        if os.path.getsize(self._journal_path):
+            self._rotate().close()
+
+    # --- Queue ---
+
+    def record(self, kind, rec_id, record, reaction=None, n=1):
+        """
+        Queue one change. record is the new state (anything with to_row(), or
+        None once deleted); reaction the emoji clicked n times, if any.
+        """
+        line = json.dumps({'kind': kind, 'id': rec_id, 'record': None if record is None else record.to_row()},
+                          ensure_ascii=False)
+        with self._cond:
+            self._journal.write(line + '\n')
+            self._journal.flush()
+            self._dirty.add(kind)
+            if reaction is not None:
+                self._reactions[(rec_id, reaction)] += n
+            self.stats['changes'] += 1
+            self._cond.notify()
+
+    def pending(self):
+        """True while changes are queued or being flushed."""
+        with self._cond:
+            return bool(self._dirty) or self._flushing
+
+    def replay(self):
+        """(kind, id, row or None) of every change in the journals not flushed yet, oldest first."""
+        entries = []
+        for path in self._rotated:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line of a crash
+                    entries.append((entry['kind'], entry['id'], entry['record']))
+        return entries
+
+    # --- Flush ---
+
+    def _rotate(self):
+        """Move the journal aside (caller holds the lock); returns the old handle."""
+        old = self._journal
+        path = os.path.join(self.directory, f'journal.{self._next_rotation}.jsonl')
+        self._next_rotation += 1
+        os.replace(self._journal_path, path)
+        self._rotated.append(path)
+        self._journal = open(self._journal_path, 'a', encoding='utf-8')
+        return old
+
+    def flush(self):
+        """Write the queued changes now. False if there was nothing to write or the flush failed."""
+        with self._flush_lock:
+            with self._cond:
+                if not self._dirty:
+                    # Nothing queued: journals left over are already persisted
+                    for path in self._rotated:
+                        os.remove(path)
+                    self._rotated = []
+                    return False
+                dirty, reactions = self._dirty, self._reactions
+                self._dirty, self._reactions = set(), Counter()
+                old = self._rotate()
+                rotated = list(self._rotated)
+                self._flushing = True
+            os.fsync(old.fileno())
+            old.close()
+            try:
+                self._flush_batch(dirty, reactions)
+            except Exception as e:
+                print(f"Forum flush failed: {e}")
+                with self._cond:
+                    self._dirty |= dirty
+                    self._reactions.update(reactions)
+                    self._flushing = False
+                    self.stats['errors'] += 1
+                return False
+            for path in rotated:
+                os.remove(path)
+            with self._cond:
+                self._rotated = [p for p in self._rotated if p not in rotated]
+                self._flushing = False
+                self.stats['flushes'] += 1
+            return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._dirty and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+            time.sleep(self.delay)  # let a burst of clicks land in one batch
+            if not self.flush() and self.pending():
+                time.sleep(RETRY_DELAY)
+
+    def start(self):
+        """Start the flusher thread; close() runs at interpreter exit."""
+        threading.Thread(target=self._run, daemon=True).start()
+        atexit.register(self.close)
+
+    def close(self):
+        """Stop the flusher and write what is still queued."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self.flush()
+
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+Typo-tolerant name lookup: character-trigram index with Dice scoring.
+
+Shared by the library search, the bar-inventory <-> catalogue join and the
+image/menu file matching.
+"""
+from itertools import chain
+from collections import OrderedDict
+import numpy as np
+import streamlit as st
+
+from modules.utils import fold_text
+
+QUERY_CACHE_SIZE = 4096
+BATCH_SIZE = 256        # queries ranked together by lookup_many()
+FIRST_BAR = 0.85        # score bar of the first pass for k=1 (see FuzzyIndex)
+DENSE_BAR = 0.5         # below this bar, count every posting of the query instead of pruning
+PROBE_EXTRA = 2         # trigrams probed beyond the prefix bound, so that candidates need more hits
+SIZE_CLASSES = 64       # postings are split by name size up to this many trigrams
+_EPS = 1e-9
+
+
+def _padded_trigrams(folded):
+    """trigrams() of an already folded string."""
+    if not folded:
+        return set()
+    padded = f"  {folded} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def trigrams(text):
+    """Set of character trigrams of a folded string, padded at word edges."""
+    return _padded_trigrams(fold_text(text))
+
+
+class FuzzyIndex:
+    """
+    Trigram inverted index over a list of names.
+
+    Ranks by Dice coefficient 2|A∩B| / (|A| + |B|), exactly, without counting
+    every name that shares a trigram with the query. Names are numbered by
+    trigram count and each posting list is split by that count, so a score
+    bar t limits which slices can hold a match: a name of b trigrams needs
+    need = t(n + b) / 2 of the query's n, hence one of its nk - need + 1
+    rarest known trigrams (prefix filtering; PROBE_EXTRA more are read and
+    PROBE_EXTRA + 1 hits required). The few candidates are then scored
+    against their own trigram lists. The bar starts at FIRST_BAR and drops to
+    the k-th best score seen, or min_score, until k names clear it; below
+    DENSE_BAR pruning reads most postings anyway, so they are all counted.
+    Exact (folded) names and repeated queries are answered from dicts, and
+    lookup_many() ranks the others in batches.
+    """
+
+    def __init__(self, names):
+        self.names = [str(n) for n in names]
+        gram_ids = {}
+        name_grams = []
+        self._exact = {}
+        for i, name in enumerate(self.names):
+            folded = fold_text(name)
+            self._exact.setdefault(folded, i)
+            name_grams.append([gram_ids.setdefault(g, len(gram_ids)) for g in _padded_trigrams(folded)])
+        sizes = np.array([len(g) for g in name_grams], dtype=np.int64)
+
+        # Internal ids: names by size, so that a size range is an id range
+        self._positions = np.argsort(sizes, kind='stable')
+        self._sizes = sizes[self._positions]
+        self._name_offsets = np.zeros(len(self.names) + 1, dtype=np.int64)
+        np.cumsum(self._sizes, out=self._name_offsets[1:])
+        self._name_grams = np.fromiter(chain.from_iterable(name_grams[i] for i in self._positions),
+                                       dtype=np.int32, count=int(self._name_offsets[-1]))
+
+        # Postings by (trigram, size class), as CSR over slots trigram * stride + class
+        self._stride = SIZE_CLASSES + 2
+        owners = np.repeat(np.arange(len(self.names), dtype=np.int32), self._sizes)
+        slots = self._name_grams.astype(np.int64) * self._stride + np.minimum(np.repeat(self._sizes, self._sizes),
+                                                                             SIZE_CLASSES)
+        self._postings = owners[np.argsort(slots, kind='stable')]
+        self._slots = np.zeros(len(gram_ids) * self._stride + 1, dtype=np.int64)
+        np.cumsum(np.bincount(slots, minlength=len(gram_ids) * self._stride), out=self._slots[1:])
+        self._frequency = np.diff(self._slots[::self._stride]).tolist()
+        self._gram_ids = gram_ids
+        self._cache = OrderedDict()
+
+    def __len__(self):
+        return len(self.names)
+
+    def lookup(self, query, k=5, min_score=0.3):
+        """Top-k (name, score, position) candidates for query, best first."""
+        key = (query, k, min_score)
+        hit = self._cache.get(key)
+        if hit is not None:
+            self._cache.move_to_end(key)
+            return hit
+        result = self._search([query], k, min_score)[0]
+        self._remember(key, result)
+        return result
+
+    def lookup_many(self, queries, k=5, min_score=0.3):
+        """lookup() of each query; the uncached ones are ranked together, in batches."""
+        results, missing = [], {}
+        for query in queries:
+            key = (query, k, min_score)
+            hit = self._cache.get(key)
+            if hit is not None:
+                self._cache.move_to_end(key)
+            else:
+                missing.setdefault(query, []).append(len(results))
+            results.append(hit)
+
+        for query, matches in zip(missing, self._search(list(missing), k, min_score)):
+            for i in missing[query]:
+                results[i] = matches
+            self._remember((query, k, min_score), matches)
+        return results
+
+    def _remember(self, key, result):
+        self._cache[key] = result
+        if len(self._cache) > QUERY_CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+    def best(self, query, min_score=0.5):
+        """Best matching name, or None when nothing scores at least min_score."""
+        matches = self.lookup(query, k=1, min_score=min_score)
+        return matches[0][0] if matches else None
+
+    # --- Search ---
+
+    def _search(self, queries, k, min_score):
+        """Uncached top-k of each query."""
+        results, plan = [], []
+        for query in queries:
+            folded = fold_text(query)
+            exact = self._exact.get(folded)
+            if exact is not None and k == 1:
+                results.append([(self.names[exact], 1.0, exact)])
+                continue
+            grams = _padded_trigrams(folded)
+            ids = sorted((self._gram_ids[g] for g in grams if g in self._gram_ids), key=self._frequency.__getitem__)
+            if ids and k > 0:
+                plan.append((len(results), ids, len(grams)))
+            results.append([])
+
+        for start in range(0, len(plan), BATCH_SIZE):
+            batch = plan[start:start + BATCH_SIZE]
+            ranked = self._rank([ids for _, ids, _ in batch], [n for _, _, n in batch], k, min_score)
+            for (i, _, _), matches in zip(batch, ranked):
+                results[i] = matches
+        return results
+
+    def _rank(self, gram_lists, n_grams, k, min_score):
+        """Top-k for a batch of queries, given their known trigram ids (rarest first) and trigram counts."""
+        n_queries, n_ids = len(gram_lists), len(self._gram_ids)
+        known = np.array([len(ids) for ids in gram_lists], dtype=np.int64)
+        n = np.array(n_grams, dtype=np.int64)
+        query = np.repeat(np.arange(n_queries), known)
+        gram = np.fromiter(chain.from_iterable(gram_lists), dtype=np.int64, count=len(query))
+        rank = np.arange(len(query)) - np.repeat(np.cumsum(known) - known, known)
+        in_query = np.zeros(n_queries * n_ids, dtype=bool)
+        in_query[query * n_ids + gram] = True
+
+        bar = np.full(n_queries, max(min_score, FIRST_BAR) if k == 1 else min_score)
+        pending = np.ones(n_queries, dtype=bool)
+        found = []
+        while pending.any():
+            dense = np.flatnonzero(pending & (bar < DENSE_BAR))
+            if len(dense):
+                found.extend(self._count_all(gram_lists[i], n_grams[i], i, min_score) for i in dense.tolist())
+                pending[dense] = False
+                if not pending.any():
+                    break
+            cq, cn = self._candidates(query, gram, rank, pending, bar, n, known)
+            scores = 2.0 * self._shared(cq, cn, in_query) / (n[cq] + self._sizes[cn])
+            keep = scores >= min_score
+            cq, cn, scores = cq[keep], cn[keep], scores[keep]
+
+            # Done when k names clear the bar (nothing missed can beat them) or the bar is min_score
+            done = pending & ((bar <= min_score) | (np.bincount(cq[scores >= bar[cq]], minlength=n_queries) >= k))
+            final = done[cq] & (scores >= bar[cq])
+            found.append((cq[final], cn[final], scores[final]))
+            pending &= ~done
+            if pending.any():
+                order = np.lexsort((-scores, cq))
+                cq, scores = cq[order], scores[order]
+                counts = np.bincount(cq, minlength=n_queries)
+                has_k = pending & (counts >= k)
+                bar[pending] = min_score
+                bar[has_k] = np.maximum(scores[(np.cumsum(counts) - counts)[has_k] + k - 1], min_score)
+
+        cq, cn, scores = (np.concatenate(parts) for parts in zip(*found))
+        positions = self._positions[cn]
+        order = np.lexsort((positions, -scores, cq))
+        cq, scores, positions = cq[order], scores[order], positions[order]
+        counts = np.bincount(cq, minlength=n_queries)
+        top = np.arange(len(cq)) - np.repeat(np.cumsum(counts) - counts, counts) < k
+        ranked = [[] for _ in range(n_queries)]
+        for q, s, p in zip(cq[top].tolist(), scores[top].tolist(), positions[top].tolist()):
+            ranked[q].append((self.names[p], s, p))
+        return ranked
+
+    def _candidates(self, query, gram, rank, pending, bar, n, known):
+        """(query, internal id) pairs of the pending queries that may score at least their bar."""
+        t = np.maximum(bar, _EPS)
+        # A name of b trigrams can reach t only if need(b) = t(n + b) / 2 <= min(b, known)
+        low = np.maximum(np.ceil(t * n / (2 - t) - _EPS), 1)
+        high = np.floor(2 * known / t - n + _EPS)
+        extra = np.minimum(PROBE_EXTRA, np.maximum(np.ceil(t * (n + low) / 2 - _EPS), 1) - 1).astype(np.int64)
+
+        sel = pending[query]
+        q, g, j = query[sel], gram[sel], rank[sel]
+        # The j-th rarest trigram is read for the sizes with need(b) <= known - j + extra
+        top = np.minimum(np.floor(2 * (known[q] - j + extra[q]) / t[q] - n[q] + _EPS), high[q])
+        base = g * self._stride
+        start = self._slots[base + np.minimum(low[q], SIZE_CLASSES).astype(np.int64)]
+        stop = self._slots[base + np.clip(top, 0, SIZE_CLASSES).astype(np.int64) + 1]
+        lengths = np.where(top >= low[q], stop - start, 0)
+
+        ends = np.cumsum(lengths)
+        if not len(ends) or not ends[-1]:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        idx = np.arange(ends[-1]) + np.repeat(start - ends + lengths, lengths)
+        names = self._postings[idx]
+        owner = np.repeat(q, lengths)
+        # One small sort per query rather than one of all (query, id) pairs
+        new_owner = owner[1:] != owner[:-1]
+        cuts = (np.flatnonzero(new_owner) + 1).tolist()
+        for a, b in zip([0] + cuts, cuts + [len(names)]):
+            names[a:b].sort()
+        first = np.flatnonzero(np.concatenate(([True], (names[1:] != names[:-1]) | new_owner)))
+        hits = np.diff(np.append(first, len(names)))
+        cq, cn = owner[first], names[first]
+        keep = hits > extra[cq]
+        return cq[keep], cn[keep].astype(np.int64)
+
+    def _count_all(self, ids, n, i, min_score):
+        """(query, internal id, score) of every name scoring min_score, from all the query's postings."""
+        step = self._stride
+        postings = [self._postings[self._slots[g * step]:self._slots[g * step + step]] for g in ids]
+        counts = np.bincount(np.concatenate(postings), minlength=len(self.names))
+        cn = np.flatnonzero(counts >= (n + self._sizes) * (min_score / 2) - _EPS)
+        cn = cn[counts[cn] > 0]
+        scores = 2.0 * counts[cn] / (n + self._sizes[cn])
+        cn = cn[scores >= min_score]
+        return np.full(len(cn), i), cn, scores[scores >= min_score]
+
+    def _shared(self, cq, cn, in_query):
+        """Number of trigrams each candidate name shares with its query."""
+        sizes = self._sizes[cn]
+        ends = np.cumsum(sizes)
+        if not len(ends):
+            return ends
+        idx = np.arange(ends[-1]) + np.repeat(self._name_offsets[cn] - ends + sizes, sizes)
+        hits = np.cumsum(in_query[np.repeat(cq * len(self._gram_ids), sizes) + self._name_grams[idx]])
+        return hits[ends - 1] - np.concatenate(([0], hits[ends[:-1] - 1]))
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def get_fuzzy_index(kind, _names, version):
+    """Shared FuzzyIndex for one name list (kind), rebuilt when version changes."""
+    return FuzzyIndex(_names)
+
@@ -1,11 +1,28 @@
 # -*- coding: utf-8 -*-
 """
-Board Game Library — card grid with filters and popup detail dialogs.
+Board Game Library: card grid with filters and popup detail dialogs. A page
+of cards goes to the browser as one custom component (frontend/card_grid) with
+the card HTML memoized per game, catalogue version and cover; the "défilement
+continu" mode (frontend/virtual_list) renders only the visible rows and pulls
+windows of cards from an st.fragment.
 """
+import os
+import hashlib
 import math
+import numpy as np
 import streamlit as st
+import streamlit.components.v1 as components
 import pandas as pd
 
+from modules.config import COMPLETE_GAMES_CSV_PATH, THEME_CSS_PATH, FRONTEND_DIR
+from modules.image_cache import cover_src, get_cover_cache, PLACEHOLDER_COVER_URL
+from modules.search import get_search_index
+from modules.fuzzy import get_fuzzy_index
+from modules.facets import get_facet_index, ALL
+from modules.recommend import get_similar_games
+from modules.inventory import get_bar_inventory
+from modules.utils import file_version
+
 
 def _format_players(row):
     """Format player count string from min/max."""
@@ -53,22 +70,47 @@ def _truncate(text, length=100):
     return text[:length].rsplit(' ', 1)[0] + "…"
 
 
-def _render_card_html(game, idx):
+def _catalogue_name_index(df_games):
+    """Shared trigram index over catalogue names (positions match df_games rows)."""
+    names = df_games['nom'].fillna('').astype(str).tolist()
+    return get_fuzzy_index('catalogue', names, file_version(COMPLETE_GAMES_CSV_PATH))
+
+
+def match_catalogue_game(df_games, game_name, min_score=0.8):
+    """Catalogue row for a (possibly misspelled) game name, or None."""
+    if df_games is None or df_games.empty or not game_name:
+        return None
+    matches = _catalogue_name_index(df_games).lookup(game_name, k=1, min_score=min_score)
+    return df_games.iloc[matches[0][2]] if matches else None
+
+
+PAGE_SIZES = [12, 48, 96]
+CARD_CACHE_MAX_ENTRIES = 5000
+# Virtualized list: cards per window, row height (px) and visible height (px)
+WINDOW_SIZE = 48
+VIRTUAL_ROW_HEIGHT = 380
+VIRTUAL_LIST_HEIGHT = 760
+
+_card_grid = components.declare_component("card_grid", path=os.path.join(FRONTEND_DIR, "card_grid"))
+_virtual_list = components.declare_component("virtual_list", path=os.path.join(FRONTEND_DIR, "virtual_list"))
+
+
+def _render_card_html(game, idx, img_url=None):
     """Generate HTML for a single game card."""
     name = str(game.get('nom', 'Sans nom'))
-    img_url = game.get('lien_photo', '')
-    if pd.isna(img_url) or not img_url:
-        img_url = 'https://placehold.co/300x200/204a52/ffffff?text=No+Image'
+    if img_url is None:
+        img_url = game.get('lien_photo', '')
+        img_url = cover_src(img_url if not pd.isna(img_url) else '')
     game_type = str(game.get('type', '')) if not pd.isna(game.get('type', '')) else ''
     desc = _truncate(game.get('description', ''), 110)
 
     badge_html = f'<span class="game-card-badge">{game_type}</span>' if game_type else ''
 
     return f'''
-    <div class="game-card" id="game-card-{idx}">
+    <div class="game-card" id="game-card-{idx}" data-game-id="{game.get('id_jeu', idx)}">
         <div class="game-card-img-wrapper">
             <img class="game-card-img" src="{img_url}" alt="{name}" loading="lazy"
-                 onerror="this.src='https://placehold.co/300x200/204a52/ffffff?text=No+Image'">
+                 onerror="this.src='{PLACEHOLDER_COVER_URL}'">
         </div>
         <div class="game-card-body">
             {badge_html}
@@ -79,6 +121,106 @@ def _render_card_html(game, idx):
     '''
 
 
+@st.cache_resource
+def _card_html_memo():
+    """Process-wide card HTML memo (survives the module reload done on every run)."""
+    return {}
+
+
+def _cached_card_html(game, data_version):
+    """Card HTML for a catalogue row, rendered once per (id_jeu, data version, cover URL)."""
+    photo = game.get('lien_photo', '')
+    img_url = cover_src(photo if not pd.isna(photo) else '')
+    key = (game.get('id_jeu'), data_version, img_url)
+    memo = _card_html_memo()
+    html = memo.get(key)
+    if html is None:
+        if len(memo) >= CARD_CACHE_MAX_ENTRIES:
+            memo.clear()
+        html = memo[key] = _render_card_html(game, key[0], img_url)
+    return html
+
+
+@st.cache_resource(show_spinner=False)
+def _theme_css(version):
+    """theme.css content, re-read only when the file changes."""
+    if not os.path.exists(THEME_CSS_PATH):
+        return ""
+    with open(THEME_CSS_PATH, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+@st.cache_resource(show_spinner=False)
+def _id_positions(_df_games, data_version):
+    """id_jeu -> row position in the catalogue."""
+    return {str(v): pos for pos, v in enumerate(_df_games['id_jeu'].tolist())}
+
+
+def render_card_grid(df_games, page_games, data_version, key):
+    """
+    Render a page of cards as a single element; clicking a card opens its
+    detail dialog. The component returns {id, nonce} and a nonce is handled
+    only once, so reruns do not reopen the dialog.
+    """
+    html = ''.join(_cached_card_html(g, data_version) for g in page_games.to_dict('records'))
+    clicked = _card_grid(html=html, css=_theme_css(file_version(THEME_CSS_PATH)), key=key, default=None)
+    if not clicked or clicked.get('nonce') == st.session_state.get(f'_{key}_nonce'):
+        return
+    st.session_state[f'_{key}_nonce'] = clicked.get('nonce')
+    pos = _id_positions(df_games, data_version).get(str(clicked.get('id')))
+    if pos is not None:
+        st.session_state['_dialog_game_data'] = df_games.iloc[pos].to_dict()
+        _show_game_dialog()
+
+
+def _card_window(df_games, positions, offset, data_version):
+    """Card HTML for positions[offset:offset + WINDOW_SIZE]."""
+    rows = df_games.iloc[positions[offset:offset + WINDOW_SIZE]].to_dict('records')
+    return [_cached_card_html(g, data_version) for g in rows]
+
+
+@st.fragment
+def render_virtual_list(df_games, positions, data_version, key="lib_virtual"):
+    """
+    Infinite scroll over the filtered results. The component asks for a window
+    offset; this fragment answers with that window and the next one
+    (prefetch). Only the windows of the current request are sent, the browser
+    keeps the ones it already has.
+    """
+    list_key = f"{data_version}-{hashlib.sha1(np.asarray(positions).tobytes()).hexdigest()[:16]}"
+    event = st.session_state.get(key) or {}
+    if event.get('key') != list_key:
+        event = {}
+
+    # Keep answering with the last window when the event is a click
+    same_list = st.session_state.get(f'_{key}_list') == list_key
+    offset = st.session_state.get(f'_{key}_offset', 0) if same_list else 0
+    if event.get('type') == 'window':
+        offset = int(event.get('offset', 0))
+    st.session_state[f'_{key}_list'] = list_key
+    offset = max(0, min(offset - offset % WINDOW_SIZE, len(positions) - 1))
+    st.session_state[f'_{key}_offset'] = offset
+
+    windows = [[o, _card_window(df_games, positions, o, data_version)]
+               for o in (offset, offset + WINDOW_SIZE) if o < len(positions)]
+    _virtual_list(
+        list_key=list_key, total=len(positions), windows=windows,
+        window_size=WINDOW_SIZE, row_height=VIRTUAL_ROW_HEIGHT, height=VIRTUAL_LIST_HEIGHT,
+        css=_theme_css(file_version(THEME_CSS_PATH)), key=key, default=None,
+    )
+
+    if event.get('type') == 'open' and event.get('nonce') != st.session_state.get(f'_{key}_nonce'):
+        st.session_state[f'_{key}_nonce'] = event.get('nonce')
+        pos = _id_positions(df_games, data_version).get(str(event.get('id')))
+        if pos is not None:
+            st.session_state['_dialog_game_data'] = df_games.iloc[pos].to_dict()
+            _show_game_dialog()
+
+
+def _select_dialog_game(game):
+    st.session_state['_dialog_game_data'] = game
+
+
 @st.dialog("📖 Détails du Jeu", width="large")
 def _show_game_dialog():
     """Render game details inside a Streamlit dialog (popup modal with blurred backdrop)."""
@@ -90,7 +232,9 @@ def _show_game_dialog():
     name = str(game.get('nom', 'Sans nom'))
     img_url = game.get('lien_photo', '')
     if pd.isna(img_url) or not img_url:
-        img_url = 'https://placehold.co/300x200/204a52/ffffff?text=No+Image'
+        img_url = PLACEHOLDER_COVER_URL
+    else:
+        img_url = get_cover_cache().path(img_url) or img_url
     game_type = str(game.get('type', '')) if not pd.isna(game.get('type', '')) else 'Non spécifié'
     desc = str(game.get('description', '')) if not pd.isna(game.get('description', '')) else 'Aucune description disponible.'
     players = _format_players(game)
@@ -123,19 +267,38 @@ def _show_game_dialog():
     st.markdown("**📖 Description**")
     st.markdown(desc)
 
-    # Bars where this game is available
-    games_data = st.session_state.get('games_data')
-    if games_data is not None and not games_data.empty:
-        # Try exact match first, then fuzzy
-        matching = games_data[games_data['game'].str.lower() == name.lower()]
-        if matching.empty:
-            matching = games_data[games_data['game'].str.lower().str.contains(name.lower(), na=False)]
-        bar_names = sorted(matching['bar_name'].unique().tolist())
-        if bar_names:
+    # Content-based neighbours, precomputed per catalogue version
+    catalogue = st.session_state.get('complete_games_data')
+    if catalogue is not None and not catalogue.empty and 'id_jeu' in game:
+        similar = get_similar_games(catalogue, file_version(COMPLETE_GAMES_CSV_PATH)).similar(game['id_jeu'], limit=4)
+        if similar:
+            st.markdown("---")
+            st.markdown("**✨ Vous aimerez aussi…**")
+            sim_cols = st.columns(len(similar))
+            for col, (pos, _) in zip(sim_cols, similar):
+                other = catalogue.iloc[pos]
+                with col:
+                    photo = other.get('lien_photo', '')
+                    photo = PLACEHOLDER_COVER_URL if pd.isna(photo) or not photo else get_cover_cache().path(photo) or photo
+                    st.image(photo, use_container_width=True)
+                    # The click reruns the dialog only, which then shows the picked game
+                    st.button(str(other.get('nom', '')), key=f"similar_{game['id_jeu']}_{pos}",
+                              on_click=_select_dialog_game, args=(other.to_dict(),),
+                              use_container_width=True)
+
+    # Bars where this game is available (reverse index, nearest first when located)
+    inventory = get_bar_inventory()
+    if inventory is not None:
+        user_location = st.session_state.get('user_location')
+        bars = inventory.where_to_play(game.get('id_jeu'), name, user_location)
+        if bars:
             st.markdown("---")
             st.markdown("**📍 Où trouver ce jeu ?**")
-            for b in bar_names:
-                if st.button(f"🍷 {b}", key=f"bar_link_{name}_{b}", use_container_width=True):
+            if user_location is not None:
+                st.caption("Du plus proche au plus éloigné de votre adresse.")
+            for b, dist in bars:
+                label = f"🍷 {b}" if dist is None else f"🍷 {b} · {dist:.1f} km"
+                if st.button(label, key=f"bar_link_{name}_{b}", use_container_width=True):
                     st.session_state['_dialog_bar_name'] = b
                     st.session_state['_open_bar_dialog'] = True
                     st.rerun()
@@ -179,89 +342,123 @@ def render_game_library_tab(df_games):
     st.subheader("📚 Bibliothèque de Jeux")
     st.caption(f"{len(df_games)} jeux disponibles dans notre catalogue")
 
+    # ── Search + facet counts ────────────────────────────────
+    # Widget values from the previous run are already in session_state, so the
+    # facet counts can be computed before the widgets are drawn with them.
+    data_version = file_version(COMPLETE_GAMES_CSV_PATH)
+    facet_index = get_facet_index(df_games, data_version)
+
+    search_query = st.session_state.get('lib_search', '')
+    positions, search_mask, typo_fallback = None, None, False
+    if search_query.strip():
+        search_index = get_search_index(df_games, data_version)
+        positions, _ = search_index.search(search_query)
+        if len(positions) == 0:
+            # Probably a typo: fall back to the closest titles
+            positions = np.array([pos for _, _, pos in _catalogue_name_index(df_games).lookup(search_query, k=12)],
+                                 dtype=np.int32)
+            typo_fallback = len(positions) > 0
+        search_mask = np.zeros(len(df_games), dtype=bool)
+        search_mask[positions] = True
+
+    def _single(key):
+        value = st.session_state.get(key, ALL)
+        return [] if value == ALL else [value]
+
+    selection = {
+        'type': st.session_state.get('lib_type_filter', []),
+        'players': _single('lib_players_filter'),
+        'age': _single('lib_age_filter'),
+        'duration': _single('lib_duration_filter'),
+        'extension': _single('lib_extension_filter'),
+    }
+    mask, counts = facet_index.query(selection, base=search_mask)
+
+    def _label(facet):
+        return lambda v: v if v == ALL else f"{v} ({counts[facet].get(v, 0)})"
+
     # ── Filters (stack on mobile via 2+2 layout) ─────────────
     col_search, col_type = st.columns(2)
     col_players, col_age = st.columns(2)
-
-    all_game_names = sorted(df_games['nom'].dropna().unique().tolist())
+    col_duration, col_extension = st.columns(2)
 
     with col_search:
-        selected_games = st.multiselect(
+        st.text_input(
             "🔍 Rechercher un jeu",
-            options=all_game_names,
-            placeholder="Tapez ou sélectionnez des jeux…",
+            placeholder="Nom, type ou mot de la description…",
             key="lib_search"
         )
+        if typo_fallback:
+            st.caption("Aucun résultat exact — voici les titres les plus proches.")
 
     with col_type:
-        game_types = sorted(df_games['type'].dropna().unique().tolist()) if 'type' in df_games.columns else []
-        selected_types = st.multiselect(
+        st.multiselect(
             "🎯 Type de jeu",
-            game_types,
+            facet_index.options('type'),
+            format_func=_label('type'),
             placeholder="Tous les types",
             key="lib_type_filter"
         )
 
     with col_players:
-        player_options = ["Tous", "1", "2", "3-4", "5-6", "7+"]
-        selected_players = st.selectbox(
+        st.selectbox(
             "👥 Nombre de joueurs",
-            player_options,
+            [ALL] + facet_index.options('players'),
+            format_func=_label('players'),
             key="lib_players_filter"
         )
 
     with col_age:
-        age_options = ["Tous", "3+", "6+", "7+", "8+", "10+", "12+", "14+"]
-        selected_age = st.selectbox(
+        st.selectbox(
             "🎂 Âge minimum",
-            age_options,
+            [ALL] + facet_index.options('age'),
+            format_func=_label('age'),
             key="lib_age_filter"
         )
 
-    # ── Apply Filters ────────────────────────────────────────
-    filtered = df_games.copy()
-
-    if selected_games:
-        filtered = filtered[filtered['nom'].isin(selected_games)]
-
-    if selected_types:
-        filtered = filtered[filtered['type'].isin(selected_types)]
-
-    if selected_players != "Tous":
-        if selected_players == "1":
-            filtered = filtered[filtered['nb_joueurs_min'] <= 1]
-        elif selected_players == "2":
-            filtered = filtered[
-                (filtered['nb_joueurs_min'] <= 2) &
-                (filtered['nb_joueur_max'] >= 2)
-            ]
-        elif selected_players == "3-4":
-            filtered = filtered[
-                (filtered['nb_joueurs_min'] <= 4) &
-                (filtered['nb_joueur_max'] >= 3)
-            ]
-        elif selected_players == "5-6":
-            filtered = filtered[
-                (filtered['nb_joueurs_min'] <= 6) &
-                (filtered['nb_joueur_max'] >= 5)
-            ]
-        elif selected_players == "7+":
-            filtered = filtered[filtered['nb_joueur_max'] >= 7]
-
-    if selected_age != "Tous":
-        age_val = int(selected_age.replace('+', ''))
-        filtered = filtered[filtered['age_min'] <= age_val]
-
-    # ── Results Count ────────────────────────────────────────
-    st.markdown(f"**{len(filtered)}** jeu(x) trouvé(s)")
+    with col_duration:
+        st.selectbox(
+            "⏱️ Durée",
+            [ALL] + facet_index.options('duration'),
+            format_func=_label('duration'),
+            key="lib_duration_filter"
+        )
+
+    with col_extension:
+        st.selectbox(
+            "🧩 Extension",
+            [ALL] + facet_index.options('extension'),
+            format_func=_label('extension'),
+            key="lib_extension_filter"
+        )
+
+    # ── Apply Filters (row positions only, no frame copy) ────
+    if positions is not None:
+        positions = positions[mask[positions]]  # keep search ranking
+    else:
+        positions = np.flatnonzero(mask)
+    filtered = df_games.iloc[positions]
+
+    # ── Results Count + display mode ─────────────────────────
+    col_count, col_mode, col_size = st.columns([2, 1, 1])
+    with col_count:
+        st.markdown(f"**{len(filtered)}** jeu(x) trouvé(s)")
+    with col_mode:
+        infinite = st.toggle("Défilement continu", key="lib_infinite")
+    with col_size:
+        cards_per_page = st.selectbox("Cartes par page", PAGE_SIZES, key="lib_page_size", disabled=infinite)
 
     if filtered.empty:
         st.info("Aucun jeu ne correspond à vos critères. Essayez d'ajuster les filtres.")
         return
 
+    if infinite:
+        st.caption("Cliquez sur une carte pour voir les détails.")
+        render_virtual_list(df_games, positions, data_version)
+        return
+
     # ── Pagination ───────────────────────────────────────────
-    CARDS_PER_PAGE = 12
-    total_pages = max(1, math.ceil(len(filtered) / CARDS_PER_PAGE))
+    total_pages = max(1, math.ceil(len(filtered) / cards_per_page))
 
     if 'lib_page' not in st.session_state:
         st.session_state.lib_page = 0
@@ -271,31 +468,13 @@ def render_game_library_tab(df_games):
         st.session_state.lib_page = 0
 
     page = st.session_state.lib_page
-    start_idx = page * CARDS_PER_PAGE
-    end_idx = min(start_idx + CARDS_PER_PAGE, len(filtered))
+    start_idx = page * cards_per_page
+    end_idx = min(start_idx + cards_per_page, len(filtered))
     page_games = filtered.iloc[start_idx:end_idx]
 
-    # ── Open dialog popup if triggered ───────────────────────
-    if st.session_state.get('_open_game_dialog', False):
-        st.session_state['_open_game_dialog'] = False
-        _show_game_dialog()
-
-    # ── Card Grid (render in rows of 3) ──────────────────────
-    rows = [page_games.iloc[i:i+3] for i in range(0, len(page_games), 3)]
-
-    for row_games in rows:
-        cols = st.columns(3)
-        for col_idx, (df_idx, game) in enumerate(row_games.iterrows()):
-            with cols[col_idx]:
-                # Card HTML
-                card_html = _render_card_html(game, df_idx)
-                st.markdown(card_html, unsafe_allow_html=True)
-
-                # Detail button → opens popup dialog
-                if st.button("🔍 Détails", key=f"btn_{df_idx}", use_container_width=True):
-                    st.session_state['_dialog_game_data'] = game.to_dict()
-                    st.session_state['_open_game_dialog'] = True
-                    st.rerun()
+    # ── Card Grid (one element per page, click a card for details) ──
+    st.caption("Cliquez sur une carte pour voir les détails.")
+    render_card_grid(df_games, page_games, data_version, key="lib_grid")
 
     # ── Pagination Controls ──────────────────────────────────
     if total_pages > 1:
@@ -315,3 +494,4 @@ def render_game_library_tab(df_games):
             if st.button("➡️", disabled=(page >= total_pages - 1), key="lib_next", use_container_width=True):
                 st.session_state.lib_page = min(total_pages - 1, page + 1)
                 st.rerun()
+
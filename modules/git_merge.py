@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Three-way merge of the data files by record key.
+
+Two app instances sharing one remote both rewrite forum_comments.csv,
+game_requests.csv and users.json, so GitSync merges their versions row by
+row, keyed by 'id' (or 'username' for users), instead of by line:
+
+- a record added, changed or deleted on one side only takes that side;
+- a record changed on both sides is merged field by field: a field changed
+  on one side only takes that side. Reactions add both sides' clicks,
+  comments are the union of both sides by comment id (minus the ones
+  either side deleted). For any other field changed on both sides,
+  'theirs' wins: the pulled file, or the pulled rows when the forum folds
+  a pull into its live state;
+- a record deleted on one side and changed on the other is kept;
+- the order is ours, with theirs' new records slotted in where they were.
+"""
+import io
+import os
+import json
+
+from modules.forum_records import parse_reactions, parse_comments
+from modules.storage.files import file_format, read_records
+
+KEYS = {'users.json': 'username'}   # key field by file name; the others use 'id'
+
+
+def _merge_reactions(base, ours, theirs):
+    """Both sides' clicks: ours + theirs - base, per emoji."""
+    base, ours, theirs = parse_reactions(base), parse_reactions(ours), parse_reactions(theirs)
+    merged = {e: ours[e] + theirs[e] - base[e] for e in {**ours, **theirs}}
+    merged = {e: n for e, n in merged.items() if n > 0}
+    return json.dumps(merged, ensure_ascii=False) if merged else ''
+
+
+def _comment_key(comment):
+    return comment.get('id') or (comment.get('author'), comment.get('timestamp'), comment.get('text'))
+
+
+def _merge_comments(base, ours, theirs):
+    """Union of both sides' comments by id, without those either side deleted."""
+    base, ours, theirs = parse_comments(base), parse_comments(ours), parse_comments(theirs)
+    base_keys = {_comment_key(c) for c in base}
+    our_keys, their_keys = {_comment_key(c) for c in ours}, {_comment_key(c) for c in theirs}
+    deleted = (base_keys - our_keys) | (base_keys - their_keys)
+    merged = [c for c in ours if _comment_key(c) not in deleted]
+    merged += [c for c in theirs if _comment_key(c) not in our_keys and _comment_key(c) not in deleted]
+    return json.dumps(merged, ensure_ascii=False)
+
+
+FIELD_MERGES = {'reactions': _merge_reactions, 'comments': _merge_comments}
+
+
+def merge_record(base, ours, theirs):
+    """Three-way merge of one record (dicts, None when absent); None if it ends up deleted."""
+    if ours == theirs:
+        return ours
+    if ours is None or theirs is None:
+        # Added on one side, or deleted on one side: gone unless the other changed it since base
+        survivor = theirs if ours is None else ours
+        return None if survivor == base else survivor
+    if ours == base:
+        return theirs
+    if theirs == base:
+        return ours
+    base = base or {}
+    merged = {}
+    for field in {**ours, **theirs}:
+        o, t, b = ours.get(field), theirs.get(field), base.get(field)
+        if o == t or t == b:
+            merged[field] = o
+        elif o == b:
+            merged[field] = t
+        elif field in FIELD_MERGES:
+            merged[field] = FIELD_MERGES[field](b, o, t)
+        else:
+            merged[field] = t
+    return merged
+
+
+def _merge_order(our_keys, their_keys):
+    """Our keys in order, with theirs-only keys inserted before the next key both sides have."""
+    ours = set(our_keys)
+    before, pending = {}, []
+    for key in their_keys:
+        if key in ours:
+            if pending:
+                before[key], pending = pending, []
+        else:
+            pending.append(key)
+    order = []
+    for key in our_keys:
+        order.extend(before.get(key, ()))
+        order.append(key)
+    return order + pending
+
+
+def _keyed(rows, key):
+    """{key: row}; rows without a key are keyed by their content."""
+    return {row.get(key) or json.dumps(row, sort_keys=True, ensure_ascii=False): row for row in rows}
+
+
+def merge_rows(base, ours, theirs, key):
+    """Three-way merge of whole files' rows (see module docstring)."""
+    base, ours, theirs = _keyed(base, key), _keyed(ours, key), _keyed(theirs, key)
+    merged = []
+    for k in _merge_order(list(ours), list(theirs)):
+        row = merge_record(base.get(k), ours.get(k), theirs.get(k))
+        if row is not None:
+            merged.append(row)
+    return merged
+
+
+def merge_contents(base, ours, theirs, name):
+    """Merged rows of three versions of a data file (bytes, None when absent); name is its path."""
+    fmt = file_format(name)
+    key = KEYS.get(os.path.basename(name), 'id')
+    base, ours, theirs = (read_records(io.BytesIO(data), fmt) if data else [] for data in (base, ours, theirs))
+    return merge_rows(base, ours, theirs, key)
@@ -1,56 +1,365 @@
 # -*- coding: utf-8 -*-
 """
-Git operations: auto-commit CSV files and push changes.
+Git sync of the data files with other app instances sharing the remote:
+the GitSync worker gathers the writes of SYNC_INTERVAL (queue_commit()) into
+one commit of SYNC_FILES, built on the last remote commit synced with a
+private index, and pushes it to the upstream branch, backing off while the
+remote cannot be reached; every PULL_INTERVAL it merges the remote versions
+of the data files into the work tree by record key (modules.git_merge) and
+tells the on_pull() listeners. The checked-out branch, index and code stay
+as deployed.
 """
 import os
+import time
+import atexit
+import functools
 import subprocess
+import threading
 import streamlit as st
 
 from modules.config import BASE_DIR
+from modules.git_merge import merge_contents
+from modules.storage.files import file_format, write_records
 
+SYNC_FILES = ('forum_comments.csv', 'game_requests.csv', 'users.json')
+SYNC_INTERVAL = 5.0             # seconds writes are gathered into one commit
+PULL_INTERVAL = 30.0            # seconds between pulls of the other instances' commits
+PUSH_BACKOFF = (2.0, 300.0)     # first and longest delay between failed pushes
+PUSH_ATTEMPTS = 3               # merge + push rounds when other instances keep pushing first
+GIT_TIMEOUT = 60                # seconds before a git command is abandoned
+COMMIT_MESSAGE = 'Auto-update data files'
+BASE_REF = 'refs/echec-sync/base'   # last remote commit the data files were synced with
 
-def push_changes():
-    """Push changes to remote repository."""
-    try:
-        subprocess.run(['git', 'push'], cwd=BASE_DIR, capture_output=True)
-    except Exception as e:
-        print(f"Push failed: {e}")
+# Held while the data files are rewritten, by the app (FileStorage) or by the sync
+WORKTREE_LOCK = threading.RLock()
 
 
-def auto_commit_csv():
-    """Auto-commit CSV files (forum, game requests) and push."""
-    # Configure local git identity
-    try:
-        subprocess.run(['git', 'config', 'user.email', 'app@echec-map.com'], cwd=BASE_DIR, capture_output=True)
-        subprocess.run(['git', 'config', 'user.name', 'Echec Map Bot'], cwd=BASE_DIR, capture_output=True)
-    except:
-        pass
+class GitSync:
+    """Debounced commit + push worker for one repository (see module docstring)."""
 
-    if not os.path.exists(os.path.join(BASE_DIR, ".git")):
-        st.error("⚠️ Git n'est pas initialisé dans ce dossier.")
-        return
+    def __init__(self, repo_dir=BASE_DIR, files=SYNC_FILES, interval=SYNC_INTERVAL, backoff=PUSH_BACKOFF,
+                 pull_interval=PULL_INTERVAL):
+        self.repo_dir = repo_dir
+        self.files = files
+        self.interval = interval
+        self.backoff = backoff
+        self.pull_interval = pull_interval
+        self._cond = threading.Condition()
+        self._queued = 0             # writes not committed yet
+        self._committing = 0         # of which in the commit running now
+        self._due = None             # monotonic time of the next commit
+        self._unpushed = 0           # commits not pushed yet
+        self._base = None            # last remote commit synced (see _configure)
+        self._head = None            # newest local commit not pushed yet
+        self._next_push = 0.0
+        self._next_pull = time.monotonic() + pull_interval if pull_interval else None
+        self._delay = backoff[0]
+        self._closed = False
+        self._listeners = []
+        self.stats = {'commits': 0, 'pushes': 0, 'pulls': 0, 'commit_failures': 0, 'push_failures': 0,
+                      'pull_failures': 0, 'last_push_latency': None, 'last_push_at': None,
+                      'last_pull_at': None, 'last_error': None}
+        self._configured = False
+        threading.Thread(target=self._run, daemon=True).start()
+        atexit.register(self.close)
+
+    # --- API ---
+
+    def request(self):
+        """Note a write to one of the files; the commit follows within interval."""
+        with self._cond:
+            self._queued += 1
+            if self._due is None:
+                self._due = time.monotonic() + self.interval
+            self._cond.notify()
+            closed = self._closed
+        if closed:
+            # Shutting down (a late flush from another atexit hook): no worker left
+            self.flush()
+
+    def on_pull(self, listener):
+        """
+        Call listener({file: previous contents}) after a pull changed data
+        files, WORKTREE_LOCK held (no app write in between).
+        """
+        self._listeners.append(listener)
+
+    def status(self):
+        """Queue depth, unpushed commits, last push latency (s) and failure counts."""
+        with self._cond:
+            return dict(self.stats, queued=self._queued + self._committing, unpushed=self._unpushed,
+                        retry_in=max(0.0, self._next_push - time.monotonic()) if self._unpushed else 0.0)
+
+    def flush(self):
+        """Commit and push now, whatever the timers say (shutdown, tests)."""
+        with self._cond:
+            queued, unpushed = self._queued, self._unpushed
+        if queued:
+            self._commit()
+        if unpushed or queued:
+            self._push()
+
+    def pull(self):
+        """Fetch and merge the other instances' data files now; True if data files changed."""
+        try:
+            changed = self._pull()
+        except Exception as e:
+            with self._cond:
+                self.stats['pull_failures'] += 1
+                self.stats['last_error'] = f"pull: {e}"
+            print(f"Git pull failed: {e}")
+            return False
+        with self._cond:
+            self.stats['pulls'] += 1
+            self.stats['last_pull_at'] = time.time()
+        return changed
 
-    try:
-        result_add = subprocess.run(
-            ['git', 'add', 'forum_comments.csv', 'game_requests.csv'],
-            cwd=BASE_DIR, capture_output=True, text=True
-        )
-        if result_add.returncode != 0:
-            st.error(f"Git Add Error: {result_add.stderr}")
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self.flush()
+
+    # --- Worker (git runs outside the lock: request() never waits for it) ---
+
+    def _git(self, *args, env=None):
+        return subprocess.run(['git', *args], cwd=self.repo_dir, capture_output=True, text=True, timeout=GIT_TIMEOUT,
+                              env=env)
+
+    def _output(self, *args, env=None):
+        """stdout of a git command that must succeed."""
+        result = self._git(*args, env=env)
+        if result.returncode != 0:
+            raise RuntimeError(f"git {args[0]}: {(result.stderr or result.stdout).strip()}")
+        return result.stdout.strip()
+
+    def _blob(self, rev, path):
+        """Contents of path at rev (bytes), or None if it has no such file."""
+        result = subprocess.run(['git', 'cat-file', 'blob', f'{rev}:{path}'], cwd=self.repo_dir,
+                                capture_output=True, timeout=GIT_TIMEOUT)
+        return result.stdout if result.returncode == 0 else None
+
+    def _configure(self):
+        """Commit identity and the last synced commit (once)."""
+        if self._configured:
             return
+        self._git('config', 'user.email', 'app@echec-map.com')
+        self._git('config', 'user.name', 'Echec Map Bot')
+        result = self._git('rev-parse', '--verify', '--quiet', BASE_REF)
+        self._base = result.stdout.strip() if result.returncode == 0 else self._output('rev-parse', 'HEAD')
+        self._configured = True
+
+    def _upstream(self):
+        """(remote, branch ref) the checked-out branch tracks, or None."""
+        branch = self._git('symbolic-ref', '--quiet', '--short', 'HEAD').stdout.strip()
+        remote = self._git('config', f'branch.{branch}.remote').stdout.strip() if branch else ''
+        merge = self._git('config', f'branch.{branch}.merge').stdout.strip() if branch else ''
+        return (remote, merge) if remote and merge else None
+
+    def _set_base(self, commit):
+        self._base = commit
+        self._git('update-ref', BASE_REF, commit)
+
+    def _commit_files(self, parent):
+        """
+        Commit of the data files as they are in the work tree on top of
+        parent, through a private index; None if they match parent already.
+        Caller holds WORKTREE_LOCK.
+        """
+        index = os.path.join(self.repo_dir, self._output('rev-parse', '--git-path', 'echec-sync-index'))
+        env = dict(os.environ, GIT_INDEX_FILE=index)
+        self._output('read-tree', parent, env=env)
+        paths = [f for f in self.files if os.path.exists(os.path.join(self.repo_dir, f))]
+        if paths:
+            self._output('update-index', '--add', '--', *paths, env=env)
+        tree = self._output('write-tree', env=env)
+        if tree == self._output('rev-parse', f'{parent}^{{tree}}'):
+            return None
+        return self._output('commit-tree', tree, '-p', parent, '-m', COMMIT_MESSAGE)
+
+    def _commit(self):
+        """One commit of every changed file, on top of the unpushed ones."""
+        with self._cond:
+            self._committing, self._queued, self._due = self._queued, 0, None
+        try:
+            self._configure()
+            with WORKTREE_LOCK:
+                commit = self._commit_files(self._head or self._base)
+                if commit is not None:
+                    self._head = commit
+            if commit is not None:
+                with self._cond:
+                    self.stats['commits'] += 1
+                    self._unpushed += 1
+        except Exception as e:
+            with self._cond:
+                self.stats['commit_failures'] += 1
+                self.stats['last_error'] = f"commit: {e}"
+            print(f"Git commit failed: {e}")
+        finally:
+            with self._cond:
+                self._committing = 0
+
+    def _pull(self):
+        """
+        Fetch, merge the remote data files into the work tree and tell the
+        listeners which files changed. Unpushed commits are replaced by one
+        commit on top of the remote branch. Raises if git fails.
+        """
+        self._configure()
+        result = self._git('fetch', '--quiet')
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip())
+        if self._upstream() is None:
+            return False  # no upstream branch: nothing to pull
+        theirs = self._output('rev-parse', '@{u}')
+        with WORKTREE_LOCK:
+            if self._git('merge-base', '--is-ancestor', theirs, self._base).returncode == 0:
+                return False
+            previous = {}
+            for f in self.files:
+                base, remote = self._blob(self._base, f), self._blob(theirs, f)
+                if remote == base:
+                    continue
+                path = os.path.join(self.repo_dir, f)
+                try:
+                    with open(path, 'rb') as fh:
+                        ours = fh.read()
+                except FileNotFoundError:
+                    ours = None
+                if ours == base:
+                    with open(f"{path}.tmp", 'wb') as fh:
+                        fh.write(remote or b'')
+                    os.replace(f"{path}.tmp", path)
+                else:
+                    write_records(path, merge_contents(base, ours, remote, f), file_format(f))
+                previous[f] = (ours or b'').decode('utf-8')
+            self._set_base(theirs)
+            if self._head is not None:
+                self._head = self._commit_files(theirs)
+                with self._cond:
+                    self._unpushed = int(self._head is not None)
+            for listener in self._listeners if previous else ():
+                try:
+                    listener(previous)
+                except Exception as e:
+                    print(f"Git pull listener failed: {e}")
+        return bool(previous)
+
+    def _push(self):
+        """Merge the remote's changes and push the local commits; on failure back off exponentially."""
+        t0, pushed = time.monotonic(), False
+        try:
+            for _ in range(PUSH_ATTEMPTS):
+                self._pull()
+                upstream, head = self._upstream(), self._head
+                if upstream is None:
+                    ok, error = False, "no upstream branch"
+                    break
+                if head is None:
+                    ok, error = True, ''
+                    break  # the remote had our changes already
+                result = self._git('push', '--quiet', upstream[0], f'{head}:{upstream[1]}')
+                ok, error = result.returncode == 0, result.stderr.strip()
+                if ok:
+                    pushed = True
+                    with WORKTREE_LOCK:
+                        self._set_base(head)
+                        if self._head == head:
+                            self._head = None
+                        # Commits made during the push go out with the next one
+                        unpushed = 0 if self._head is None else \
+                            int(self._output('rev-list', '--count', f'{head}..{self._head}'))
+                    with self._cond:
+                        self._unpushed = unpushed
+                if ok or 'rejected' not in error:
+                    break  # pushed, or failed for another reason than a concurrent push
+        except Exception as e:
+            ok, error = False, str(e)
+        now = time.monotonic()
+        with self._cond:
+            if ok:
+                self._delay = self.backoff[0]
+                self._next_push = 0.0
+                if pushed:
+                    self.stats['pushes'] += 1
+                    self.stats['last_push_latency'] = now - t0
+                    self.stats['last_push_at'] = time.time()
+            else:
+                self._next_push = now + self._delay
+                self._delay = min(self._delay * 2, self.backoff[1])
+                self.stats['push_failures'] += 1
+                self.stats['last_error'] = f"push: {error}"
+        if not ok:
+            print(f"Git push failed (retry in {self._next_push - now:.1f} s): {error.splitlines()[0] if error else ''}")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        return
+                    now = time.monotonic()
+                    commit = self._due is not None and now >= self._due
+                    push = self._unpushed and now >= self._next_push
+                    pull = self._next_pull is not None and now >= self._next_pull
+                    if commit or push or pull:
+                        break
+                    deadlines = [t for t in (self._due, self._next_push if self._unpushed else None, self._next_pull)
+                                 if t is not None]
+                    self._cond.wait(max(0.0, min(deadlines) - now) if deadlines else None)
+            # Whatever is due runs in this pass, in order: a commit does not
+            # push a due pull back by a whole interval
+            if commit:
+                self._commit()
+                with self._cond:
+                    push = self._unpushed and time.monotonic() >= self._next_push
+            if push:
+                self._push()  # pulls first
+            elif pull:
+                self.pull()
+            if pull:
+                with self._cond:
+                    self._next_pull = time.monotonic() + self.pull_interval
+
+
+_sync = None
+_sync_lock = threading.Lock()
+
+
+def get_git_sync():
+    """Process-wide GitSync of the app repository (also used from background threads)."""
+    global _sync
+    with _sync_lock:
+        if _sync is None:
+            _sync = GitSync()
+        return _sync
+
+
+@functools.lru_cache(maxsize=None)
+def sync_enabled(repo_dir=BASE_DIR):
+    """True if repo_dir is a git checkout with a remote to sync with (checked once)."""
+    if not os.path.exists(os.path.join(repo_dir, ".git")):
+        return False
+    result = subprocess.run(['git', 'remote'], cwd=repo_dir, capture_output=True, text=True, timeout=GIT_TIMEOUT)
+    return result.returncode == 0 and bool(result.stdout.strip())
+
+
+def on_pull(listener):
+    """Register a GitSync.on_pull listener (and start the scheduled pulls); no-op without a remote."""
+    if sync_enabled():
+        get_git_sync().on_pull(listener)
+
+
+def queue_commit(notify=True):
+    """
+    Queue the data files (forum, game requests, users) for the next background
+    commit and push. notify=False (background threads) prints instead of st.error.
+    Without a remote there is nothing to sync with: the files are just saved.
+    """
+    if not os.path.exists(os.path.join(BASE_DIR, ".git")):
+        (st.error if notify else print)("⚠️ Git n'est pas initialisé dans ce dossier.")
+        return
+    if sync_enabled():
+        get_git_sync().request()
 
-        result_commit = subprocess.run(
-            ['git', 'commit', '-m', 'Auto-update CSV files'],
-            cwd=BASE_DIR, capture_output=True, text=True
-        )
-        if result_commit.returncode != 0:
-            if "nothing to commit" not in result_commit.stdout.lower():
-                st.error(f"Git Commit Error: {result_commit.stderr}")
-        else:
-            st.toast("✅", icon="💾")
-            push_changes()
-
-    except FileNotFoundError:
-        st.error("⚠️ Git n'est pas installé ou n'est pas dans le PATH.")
-    except Exception as e:
-        st.error(f"Auto-commit failed: {str(e)}")
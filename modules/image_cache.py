@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+Local cache for remote game cover images.
+
+Covers are fetched once through a pluggable fetcher, normalized to the card
+size and stored in a size-bounded LRU under static/covers, which Streamlit
+serves itself (server.enableStaticServing). A cover that failed to download
+shows the placeholder and is not tried again before its backoff ends.
+
+Prefetch the whole catalogue with:
+    python -m modules.image_cache prefetch [--stub] [--workers 8]
+"""
+import io
+import os
+import time
+import hashlib
+import threading
+import urllib.request
+import pandas as pd
+import streamlit as st
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+from modules.config import COVERS_DIR, COVERS_STATIC_URL, COMPLETE_GAMES_CSV_PATH
+
+COVER_SIZE = (300, 200)
+COVER_BACKGROUND = (241, 245, 249)  # --color-surface-alt, matches the card wrapper
+COVER_JPEG_QUALITY = 80
+COVER_CACHE_MAX_BYTES = 200 * 1024 * 1024
+FAILED_RETRY_AFTER = 10 * 60        # seconds before a failed cover is tried again,
+FAILED_RETRY_MAX = 24 * 60 * 60     # doubled on every new failure up to this
+PLACEHOLDER_COVER_URL = 'https://placehold.co/300x200/204a52/ffffff?text=No+Image'
+
+
+def urllib_fetcher(url, timeout=10):
+    """Default fetcher: download the raw image bytes over HTTP(S)."""
+    req = urllib.request.Request(url, headers={'User-Agent': 'echec_map_app'})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return resp.read()
+
+
+def stub_fetcher(url):
+    """Offline fetcher for tests/benchmarks: a flat image colored from the URL hash."""
+    digest = hashlib.sha1(url.encode('utf-8')).digest()
+    buf = io.BytesIO()
+    Image.new('RGB', (320, 320), tuple(digest[:3])).save(buf, 'PNG')
+    return buf.getvalue()
+
+
+def normalize_cover(data):
+    """Letterbox raw image bytes into a COVER_SIZE JPEG."""
+    with Image.open(io.BytesIO(data)) as img:
+        img = img.convert('RGBA')
+        img.thumbnail(COVER_SIZE, Image.LANCZOS)
+        canvas = Image.new('RGB', COVER_SIZE, COVER_BACKGROUND)
+        offset = ((COVER_SIZE[0] - img.width) // 2, (COVER_SIZE[1] - img.height) // 2)
+        canvas.paste(img, offset, img)
+    out = io.BytesIO()
+    canvas.save(out, 'JPEG', quality=COVER_JPEG_QUALITY, optimize=True)
+    return out.getvalue()
+
+
+class CoverCache:
+    """
+    Size-bounded disk LRU of normalized cover images.
+
+    Recency is kept in memory (OrderedDict) and mirrored on disk through the
+    file mtime, so a restarted process resumes with the same eviction order.
+    """
+
+    def __init__(self, cache_dir=COVERS_DIR, max_bytes=COVER_CACHE_MAX_BYTES, fetcher=urllib_fetcher):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.fetcher = fetcher
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # file name -> size, least recently used first
+        self._total = 0
+        self._pending = set()
+        self._failed = {}              # url -> (monotonic retry time, backoff seconds)
+        self._executor = None
+        os.makedirs(cache_dir, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        files = []
+        for f in os.listdir(self.cache_dir):
+            if f.endswith('.jpg'):
+                info = os.stat(os.path.join(self.cache_dir, f))
+                files.append((info.st_mtime, f, info.st_size))
+        for _, f, size in sorted(files):
+            self._entries[f] = size
+            self._total += size
+
+    @staticmethod
+    def key(url):
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()[:20] + '.jpg'
+
+    def path(self, url):
+        """Local path of a cached cover (touching it as most recently used), or None."""
+        name = self.key(url)
+        with self._lock:
+            if name not in self._entries:
+                return None
+            self._entries.move_to_end(name)
+        full = os.path.join(self.cache_dir, name)
+        try:
+            os.utime(full)
+        except OSError:
+            with self._lock:
+                self._total -= self._entries.pop(name, 0)
+            return None
+        return full
+
+    def url(self, url):
+        """Locally served URL of a cached cover, or None."""
+        if self.path(url) is None:
+            return None
+        return f"{COVERS_STATIC_URL}/{self.key(url)}"
+
+    def fetch(self, url):
+        """Fetch, normalize and store one cover. Returns its local path."""
+        cached = self.path(url)
+        if cached:
+            return cached
+        data = normalize_cover(self.fetcher(url))
+        name = self.key(url)
+        full = os.path.join(self.cache_dir, name)
+        tmp = f"{full}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, full)
+        with self._lock:
+            self._total += len(data) - self._entries.pop(name, 0)
+            self._entries[name] = len(data)
+            self._evict()
+        return full
+
+    def _evict(self):
+        """Drop least recently used covers until under max_bytes (lock held)."""
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            name, size = self._entries.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+
+    def failed(self, url):
+        """True while a failed cover waits for its retry time."""
+        with self._lock:
+            failure = self._failed.get(url)
+            return failure is not None and time.monotonic() < failure[0]
+
+    def _record_failure(self, url):
+        """Back off this URL: FAILED_RETRY_AFTER, doubled on each new failure (lock held)."""
+        previous = self._failed.get(url)
+        delay = FAILED_RETRY_AFTER if previous is None else min(previous[1] * 2, FAILED_RETRY_MAX)
+        self._failed[url] = (time.monotonic() + delay, delay)
+
+    def fetch_async(self, url):
+        """Schedule a background fetch (at most one in flight per URL, none while backing off)."""
+        with self._lock:
+            if url in self._pending:
+                return
+            failure = self._failed.get(url)
+            if failure is not None and time.monotonic() < failure[0]:
+                return
+            self._pending.add(url)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='covers')
+
+        def _run():
+            try:
+                self.fetch(url)
+            except Exception:
+                # Dead link or offline: the card shows the placeholder meanwhile
+                with self._lock:
+                    self._record_failure(url)
+            else:
+                with self._lock:
+                    self._failed.pop(url, None)
+            finally:
+                with self._lock:
+                    self._pending.discard(url)
+
+        self._executor.submit(_run)
+
+    def prefetch(self, urls, workers=8):
+        """Fetch every URL not yet cached. Returns (fetched, cached, failed) counts."""
+        todo = [u for u in dict.fromkeys(urls) if self.path(u) is None]
+        failed = 0
+
+        def _one(u):
+            try:
+                self.fetch(u)
+                return True
+            except Exception:
+                return False
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for ok in pool.map(_one, todo):
+                failed += not ok
+        return len(todo) - failed, len(set(urls)) - len(todo), failed
+
+    def stats(self):
+        with self._lock:
+            return {'files': len(self._entries), 'bytes': self._total, 'max_bytes': self.max_bytes,
+                    'failed': len(self._failed)}
+
+
+@st.cache_resource
+def get_cover_cache():
+    """Process-wide cover cache."""
+    return CoverCache()
+
+
+def cover_src(img_url):
+    """
+    URL to put in a card <img>: the local copy when cached, the placeholder
+    while a failed fetch backs off, otherwise the remote URL while the cover
+    is fetched in the background for next time.
+    """
+    if not isinstance(img_url, str) or not img_url:
+        return PLACEHOLDER_COVER_URL
+    cache = get_cover_cache()
+    local = cache.url(img_url)
+    if local:
+        return local
+    if cache.failed(img_url):
+        return PLACEHOLDER_COVER_URL
+    cache.fetch_async(img_url)
+    return img_url
+
+
+def _catalogue_photo_urls():
+    df = pd.read_csv(COMPLETE_GAMES_CSV_PATH, sep=';', encoding='utf-8', usecols=['lien_photo'])
+    return df['lien_photo'].dropna().astype(str).tolist()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Cover image cache")
+    parser.add_argument('command', choices=['prefetch', 'stats'])
+    parser.add_argument('--stub', action='store_true', help="use the offline stub fetcher")
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--cache-dir', default=COVERS_DIR)
+    args = parser.parse_args()
+
+    cache = CoverCache(args.cache_dir, fetcher=stub_fetcher if args.stub else urllib_fetcher)
+    if args.command == 'prefetch':
+        urls = _catalogue_photo_urls()
+        t0 = time.perf_counter()
+        fetched, cached, failed = cache.prefetch(urls, workers=args.workers)
+        print(f"{len(urls)} covers: {fetched} fetched, {cached} already cached, {failed} failed "
+              f"in {time.perf_counter() - t0:.1f}s")
+    s = cache.stats()
+    print(f"{s['files']} files, {s['bytes'] / 1024 / 1024:.1f} / {s['max_bytes'] / 1024 / 1024:.0f} MB")
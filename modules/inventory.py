@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+Bar <-> game inventory indexes: BarInventory maps every game of the bar
+inventories to a canonical key (catalogue id_jeu, else folded name) with the
+sorted bar ids stocking it, answers the Games tab search ("bars having any /
+all / at least k of these games") with packed membership bitsets, and the
+party-fit search from a precomputed table of per-bar counts of suitable
+catalogue games.
+"""
+import hashlib
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from modules.config import COMPLETE_GAMES_CSV_PATH
+from modules.fuzzy import get_fuzzy_index
+from modules.utils import fold_text, file_version, haversine_array
+
+# Same tolerance as the former per-dialog fuzzy scan of bar inventories
+CATALOGUE_MATCH_MIN_SCORE = 0.75
+
+MATCH_ANY = 'any'
+MATCH_ALL = 'all'
+
+# Party-fit buckets; queries snap down to the nearest bucket (never over-promise)
+PARTY_MAX_PLAYERS = 12
+PARTY_AGES = (3, 4, 5, 6, 7, 8, 10, 12, 14, 16, 18)
+PARTY_MINUTES = (15, 20, 30, 45, 60, 90, 120, 180, 240)
+
+_POPCOUNT8 = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def _popcount(bits):
+    """Per-byte popcount of a uint8 array (np.bitwise_count on NumPy >= 2)."""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(bits)
+    return _POPCOUNT8[bits]
+
+
+def id_key(game_id):
+    """Dict key for a catalogue id_jeu, whatever its dtype (334, 334.0, '334')."""
+    try:
+        return str(int(float(game_id)))
+    except (TypeError, ValueError):
+        return str(game_id)
+
+
+@st.cache_resource(show_spinner=False)
+def _canonical_ids(names, catalogue_version, _catalogue):
+    """Inventory game name -> catalogue id_jeu key (None when no close title)."""
+    titles = _catalogue['nom'].fillna('').astype(str).tolist()
+    index = get_fuzzy_index('catalogue', titles, catalogue_version)
+    ids = _catalogue['id_jeu'].tolist()
+    matches = index.lookup_many(names, k=1, min_score=CATALOGUE_MATCH_MIN_SCORE)
+    return {name: id_key(ids[match[0][2]]) if match else None for name, match in zip(names, matches)}
+
+
+class BarInventory:
+    """
+    Reverse index game -> bars.
+
+    Bar ids are positions in the alphabetically sorted bar_names, so a sorted
+    id array is also the alphabetical bar list. bar_lat / bar_lon hold the
+    coordinates by bar id (NaN when unknown). version identifies the title
+    list, for the caches built on top of it.
+    """
+
+    def __init__(self, games_data, gdf_bar=None, catalogue=None):
+        self.catalogue = catalogue
+        self._party_counts = None
+        known = gdf_bar['Nom'].tolist() if gdf_bar is not None else []
+        self.bar_names = sorted(set(known) | set(games_data['bar_name'].unique()))
+        self.bar_ids = {name: i for i, name in enumerate(self.bar_names)}
+        self.bar_lat = np.full(len(self.bar_names), np.nan)
+        self.bar_lon = np.full(len(self.bar_names), np.nan)
+        if gdf_bar is not None:
+            ids = gdf_bar['Nom'].map(self.bar_ids).to_numpy()
+            self.bar_lat[ids] = gdf_bar['lat'].to_numpy(dtype=float)
+            self.bar_lon[ids] = gdf_bar['lon'].to_numpy(dtype=float)
+
+        # Membership matrix over the inventory titles shown in the Games tab
+        codes, titles = pd.factorize(games_data['game'].astype(str), sort=True)
+        self.game_names = list(titles)
+        self.version = hashlib.sha1('\n'.join(self.game_names).encode('utf-8')).hexdigest()[:16]
+        self.game_rows = {name: i for i, name in enumerate(self.game_names)}
+        member = np.zeros((len(self.game_names), len(self.bar_names)), dtype=bool)
+        member[codes, games_data['bar_name'].map(self.bar_ids).to_numpy()] = True
+        self.game_bits = np.packbits(member, axis=1)    # [game, bar bytes]
+        self.bar_bits = np.packbits(member.T, axis=1)   # [bar, game bytes]
+        self.games_per_bar = member.sum(axis=0)
+        self.bars_per_game = member.sum(axis=1)
+
+        if catalogue is not None and not catalogue.empty and 'id_jeu' in catalogue.columns:
+            canonical = _canonical_ids(tuple(self.game_names), file_version(COMPLETE_GAMES_CSV_PATH), catalogue)
+        else:
+            canonical = {}
+        by_name, by_id = {}, {}
+        for row, name in enumerate(self.game_names):
+            by_name.setdefault(fold_text(name), []).append(row)
+            if canonical.get(name) is not None:
+                by_id.setdefault(canonical[name], []).append(row)
+        self.by_name = {k: np.flatnonzero(member[rows].any(axis=0)) for k, rows in by_name.items()}
+        self.by_id = {k: np.flatnonzero(member[rows].any(axis=0)) for k, rows in by_id.items()}
+
+    def bars_for(self, game_id=None, name=None):
+        """Sorted bar ids stocking a game, by catalogue id first, then by name."""
+        bars = self.by_id.get(id_key(game_id)) if game_id is not None else None
+        if bars is None and name:
+            bars = self.by_name.get(fold_text(name))
+        return bars if bars is not None else np.empty(0, dtype=np.int32)
+
+    def where_to_play(self, game_id=None, name=None, user_location=None):
+        """
+        [(bar name, distance in km or None)] for a game. Alphabetical, or
+        nearest first when user_location (lat, lon) is known.
+        """
+        bars = self.bars_for(game_id, name)
+        if user_location is None or len(bars) == 0:
+            return [(self.bar_names[b], None) for b in bars]
+        lat, lon = user_location
+        dist = haversine_array(lon, lat, self.bar_lon[bars], self.bar_lat[bars])
+        order = np.argsort(np.where(np.isnan(dist), np.inf, dist), kind='stable')
+        return [(self.bar_names[b], None if np.isnan(d) else float(d)) for b, d in zip(bars[order], dist[order])]
+
+    def _build_party_counts(self):
+        """
+        counts[bar, players - 1, age bucket, minutes bucket] = number of
+        catalogue games stocked by the bar that suit a group of that size,
+        whose youngest player has that age, and that end within that many
+        minutes even at their longest (duree_max, else duree_min).
+        """
+        shape = (len(self.bar_names), PARTY_MAX_PLAYERS, len(PARTY_AGES), len(PARTY_MINUTES))
+        cat = self.catalogue
+        if cat is None or cat.empty or not self.by_id:
+            return np.zeros(shape, dtype=np.int32)
+
+        def column(name):
+            return pd.to_numeric(cat[name], errors='coerce').to_numpy(dtype=float) if name in cat.columns \
+                else np.full(len(cat), np.nan)
+
+        keys = [id_key(v) for v in cat['id_jeu'].tolist()]
+        stocked = [i for i, k in enumerate(keys) if k in self.by_id]
+        pmin, pmax = column('nb_joueurs_min')[stocked], column('nb_joueur_max')[stocked]
+        pmax = np.where(np.isnan(pmax), pmin, pmax)  # fixed player count
+        age, minutes = column('age_min')[stocked], column('duree_max')[stocked]
+        minutes = np.where(np.isnan(minutes), column('duree_min')[stocked], minutes)  # fixed duration
+
+        # Suitability per (game, players, age, minutes); NaN never suits
+        with np.errstate(invalid='ignore'):
+            players = np.arange(1, PARTY_MAX_PLAYERS + 1)
+            fits_players = (pmin[:, None] <= players) & (players <= pmax[:, None])
+            fits_players[:, -1] |= pmax >= PARTY_MAX_PLAYERS  # last bucket means "12 or more"
+            fits_age = age[:, None] <= np.array(PARTY_AGES)
+            fits_time = minutes[:, None] <= np.array(PARTY_MINUTES)
+        suits = (fits_players[:, :, None, None] & fits_age[:, None, :, None] & fits_time[:, None, None, :])
+
+        # Bars x stocked games membership, then one matrix product for every bucket
+        member = np.zeros((len(self.bar_names), len(stocked)), dtype=np.float32)
+        for j, i in enumerate(stocked):
+            member[self.by_id[keys[i]], j] = 1.0
+        counts = member @ suits.reshape(len(stocked), -1).astype(np.float32)
+        return counts.reshape(shape).round().astype(np.int32)
+
+    def party_fit(self, players, age, minutes, limit=None):
+        """
+        Bars ranked by number of suitable games for a group: (bar ids, counts),
+        best first, bars without any suitable game left out.
+        """
+        if self._party_counts is None:
+            self._party_counts = self._build_party_counts()
+        p = min(max(int(players), 1), PARTY_MAX_PLAYERS) - 1
+        a = max(np.searchsorted(PARTY_AGES, age, side='right') - 1, 0)
+        m = max(np.searchsorted(PARTY_MINUTES, minutes, side='right') - 1, 0)
+        counts = self._party_counts[:, p, a, m]
+        bars = np.flatnonzero(counts)
+        order = np.argsort(-counts[bars], kind='stable')
+        if limit is not None:
+            order = order[:limit]
+        return bars[order], counts[bars[order]]
+
+    def match_bars(self, game_names, mode=MATCH_ANY):
+        """
+        Bars stocking the selected games, best match first.
+
+        mode is MATCH_ANY, MATCH_ALL or an int k (at least k of the games).
+        Returns (bar ids, match counts); ties stay alphabetical.
+        """
+        rows = sorted({self.game_rows[n] for n in game_names if n in self.game_rows})
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        if mode == MATCH_ALL:
+            need = len(rows)
+        elif mode == MATCH_ANY:
+            need = 1
+        else:
+            need = max(1, min(int(mode), len(rows)))
+
+        if need == len(rows):
+            # Intersection of the games' bar bitsets
+            bits = np.bitwise_and.reduce(self.game_bits[rows], axis=0)
+            bars = np.flatnonzero(np.unpackbits(bits, count=len(self.bar_names)))
+            return bars, np.full(len(bars), len(rows), dtype=np.int64)
+
+        selection = np.zeros(len(self.game_names), dtype=bool)
+        selection[rows] = True
+        selection = np.packbits(selection)
+        cols = np.unique(np.asarray(rows) // 8)  # only the bytes holding selected games
+        counts = _popcount(self.bar_bits[:, cols] & selection[cols]).sum(axis=1, dtype=np.int64)
+        bars = np.flatnonzero(counts >= need)
+        order = np.argsort(-counts[bars], kind='stable')
+        return bars[order], counts[bars[order]]
+
+    def games_at(self, bar_name, game_names):
+        """The given games stocked by a bar, in the given order."""
+        bar = self.bar_ids.get(bar_name)
+        if bar is None:
+            return []
+        stocked = np.unpackbits(self.bar_bits[bar], count=len(self.game_names))
+        return [n for n in game_names if n in self.game_rows and stocked[self.game_rows[n]]]
+
+
+def get_bar_inventory():
+    """
+    Session inventory index. games_data is per session (bars without a list
+    get random games), so the index is kept in session_state and rebuilt
+    whenever games_data is replaced.
+    """
+    games_data = st.session_state.get('games_data')
+    if games_data is None or games_data.empty:
+        return None
+    cached = st.session_state.get('_bar_inventory')
+    if cached is not None and cached[0] is games_data:
+        return cached[1]
+
+    from modules.data import load_data
+    try:
+        gdf_bar = load_data()
+    except Exception:
+        gdf_bar = None
+    inventory = BarInventory(games_data, gdf_bar, st.session_state.get('complete_games_data'))
+    st.session_state['_bar_inventory'] = (games_data, inventory)
+    return inventory
+
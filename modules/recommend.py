@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+Content-based "Vous aimerez aussi…" recommendations: every catalogue game is
+one float32 vector (TF-IDF of its description, its type, player range, age and
+duration), and the top-k cosine neighbours of every game are computed once per
+catalogue version into a compact table in .cache/, so the dialog only reads a
+row. `python -m modules.recommend` builds the table by hand.
+"""
+import os
+import zlib
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from modules.config import CACHE_DIR, COMPLETE_GAMES_CSV_PATH
+from modules.search import tokenize
+from modules.utils import file_version
+
+TOP_K = 10
+MAX_TERMS = 8192
+# Exact TF-IDF columns up to this many matrix cells (128 MB), hashed to TEXT_DIM above
+DENSE_TEXT_MAX_CELLS = 32_000_000
+TEXT_DIM = 256
+# Share of the cosine given to each block (text, type, numeric features)
+BLOCK_WEIGHTS = {'text': 0.6, 'type': 0.25, 'numeric': 0.15}
+# Numeric features and the range they are clipped to before scaling to [0, 1]
+NUMERIC_RANGES = {
+    'nb_joueurs_min': (1, 8), 'nb_joueur_max': (1, 12), 'age_min': (3, 18),
+    'duree_min': (5, 240), 'duree_max': (5, 240),
+}
+TABLE_PATH = os.path.join(CACHE_DIR, 'similar_games.npz')
+
+_BLOCK_ROWS = 512    # rows of the similarity matrix computed at once
+_GROUP_COLS = 256    # column group size for the top-k pre-selection
+
+
+def _l2_normalize(x):
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    np.maximum(norms, 1e-12, out=norms)
+    x /= norms
+    return x
+
+
+def text_vectors(texts, dim=TEXT_DIM, max_terms=MAX_TERMS, max_cells=DENSE_TEXT_MAX_CELLS):
+    """
+    TF-IDF (sublinear tf, smoothed idf) over the most frequent terms seen in
+    at least two texts. Kept exact (one column per term) while the dense
+    matrix stays under max_cells, otherwise feature-hashed with random signs
+    to dim columns. Rows are L2-normalized float32.
+    """
+    docs = [tokenize(t) if isinstance(t, str) else [] for t in texts]
+    df = {}
+    for tokens in docs:
+        for tok in set(tokens):
+            df[tok] = df.get(tok, 0) + 1
+    n = len(docs)
+    vocab = [t for t, c in df.items() if 2 <= c <= 0.5 * n]
+    vocab = sorted(vocab, key=lambda t: -df[t])[:max_terms]
+    term_ids = {t: i for i, t in enumerate(vocab)}
+    idf = np.array([np.log((1 + n) / (1 + df[t])) + 1 for t in vocab], dtype=np.float32)
+
+    rows, cols, vals = [], [], []
+    for r, tokens in enumerate(docs):
+        counts = {}
+        for tok in tokens:
+            tid = term_ids.get(tok)
+            if tid is not None:
+                counts[tid] = counts.get(tid, 0) + 1
+        for tid, c in counts.items():
+            rows.append(r)
+            cols.append(tid)
+            vals.append(1.0 + np.log(c))
+    rows = np.array(rows, dtype=np.int32)
+    cols = np.array(cols, dtype=np.int32)
+    vals = np.array(vals, dtype=np.float32) * idf[cols] if len(cols) else np.zeros(0, dtype=np.float32)
+
+    if n * len(vocab) <= max_cells:
+        out = np.zeros((n, max(len(vocab), 1)), dtype=np.float32)
+        out[rows, cols] = vals
+    else:
+        hashes = np.array([zlib.crc32(t.encode('utf-8')) for t in vocab], dtype=np.int64)
+        signs = np.where((hashes >> 16) & 1, 1.0, -1.0).astype(np.float32)
+        out = np.zeros((n, dim), dtype=np.float32)
+        np.add.at(out, (rows, hashes[cols] % dim), signs[cols] * vals)
+    return _l2_normalize(out)
+
+
+def _column(df, name):
+    if name in df.columns:
+        return pd.to_numeric(df[name], errors='coerce').to_numpy(dtype=np.float32)
+    return np.full(len(df), np.nan, dtype=np.float32)
+
+
+def numeric_features(df):
+    """Player range, age and duration scaled to [0, 1] (missing -> 0.5)."""
+    cols = []
+    for name, (lo, hi) in NUMERIC_RANGES.items():
+        v = _column(df, name)
+        if name.startswith('duree'):
+            v, lo, hi = np.log(v), np.log(lo), np.log(hi)
+        v = (np.clip(v, lo, hi) - lo) / (hi - lo)
+        cols.append(np.where(np.isnan(v), 0.5, v))
+    return np.stack(cols, axis=1).astype(np.float32)
+
+
+def game_vectors(df):
+    """One L2-normalized float32 row per game: [text | type one-hot | numeric]."""
+    texts = df['description'] if 'description' in df.columns else pd.Series([''] * len(df))
+    text = text_vectors(texts.tolist())
+    codes, _ = pd.factorize(df['type'] if 'type' in df.columns else pd.Series([None] * len(df)))
+    onehot = np.zeros((len(df), codes.max() + 2), dtype=np.float32)
+    onehot[np.arange(len(df)), codes] = 1.0  # code -1 (no type) lands in the last column
+    onehot[:, -1] = 0.0
+    numeric = _l2_normalize(numeric_features(df))
+    blocks = [np.sqrt(BLOCK_WEIGHTS['text']) * text,
+              np.sqrt(BLOCK_WEIGHTS['type']) * onehot,
+              np.sqrt(BLOCK_WEIGHTS['numeric']) * numeric]
+    return _l2_normalize(np.hstack(blocks).astype(np.float32))
+
+
+def _top_k_rows(sims, k):
+    """
+    Exact top-k column indices per row, best first.
+
+    The k best values of a row lie in the k column groups with the highest
+    maxima, so argpartition only runs over k * _GROUP_COLS candidates
+    instead of the whole row.
+    """
+    n_rows, n_cols = sims.shape
+    n_groups = n_cols // _GROUP_COLS
+    if n_groups <= k:
+        cand = np.broadcast_to(np.arange(n_cols), (n_rows, n_cols))
+    else:
+        full = n_groups * _GROUP_COLS
+        group_max = sims[:, :full].reshape(n_rows, n_groups, _GROUP_COLS).max(axis=2)
+        groups = np.argpartition(group_max, -k, axis=1)[:, -k:]
+        cand = (groups[:, :, None] * _GROUP_COLS + np.arange(_GROUP_COLS)).reshape(n_rows, -1)
+        # Columns past the last full group are always candidates
+        tail = np.broadcast_to(np.arange(full, n_cols), (n_rows, n_cols - full))
+        cand = np.hstack([cand, tail])
+    values = np.take_along_axis(sims, cand, axis=1)
+    top = np.argpartition(values, -k, axis=1)[:, -k:]
+    idx = np.take_along_axis(cand, top, axis=1)
+    order = np.argsort(-np.take_along_axis(sims, idx, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(idx, order, axis=1)
+
+
+def nearest_neighbours(vectors, k=TOP_K):
+    """(neighbours int32 [n, k], scores float16 [n, k]) by cosine, self excluded."""
+    n = len(vectors)
+    k = min(k, n - 1)
+    neighbours = np.empty((n, k), dtype=np.int32)
+    scores = np.empty((n, k), dtype=np.float16)
+    for lo in range(0, n, _BLOCK_ROWS):
+        sims = vectors[lo:lo + _BLOCK_ROWS] @ vectors.T
+        rows = np.arange(len(sims))
+        sims[rows, lo + rows] = -np.inf
+        idx = _top_k_rows(sims, k)
+        neighbours[lo:lo + len(sims)] = idx
+        scores[lo:lo + len(sims)] = np.take_along_axis(sims, idx, axis=1)
+    return neighbours, scores
+
+
+class SimilarGames:
+    """Precomputed neighbour table: similar(id_jeu) is a dict lookup + row read."""
+
+    def __init__(self, ids, neighbours, scores):
+        self.ids = np.asarray(ids)
+        self.neighbours = neighbours
+        self.scores = scores
+        self._pos = {str(v): i for i, v in enumerate(self.ids.tolist())}
+
+    @classmethod
+    def build(cls, df, k=TOP_K):
+        neighbours, scores = nearest_neighbours(game_vectors(df), k)
+        ids = df['id_jeu'].to_numpy() if 'id_jeu' in df.columns else np.arange(len(df))
+        return cls(ids, neighbours, scores)
+
+    def save(self, path, version):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp.npz"
+        np.savez(tmp, ids=self.ids, neighbours=self.neighbours, scores=self.scores, version=version)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, version):
+        """Table stored at path, or None when missing or built for another version."""
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if int(data['version']) != version:
+                    return None
+                return cls(data['ids'], data['neighbours'], data['scores'])
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def similar(self, game_id, limit=TOP_K):
+        """[(row position, score)] of the games closest to game_id, best first."""
+        pos = self._pos.get(str(game_id))
+        if pos is None:
+            return []
+        return list(zip(self.neighbours[pos, :limit].tolist(), self.scores[pos, :limit].astype(float).tolist()))
+
+
+@st.cache_resource(show_spinner=False)
+def get_similar_games(_df, data_version):
+    """Neighbour table for the catalogue: loaded from .cache/, rebuilt when stale."""
+    table = SimilarGames.load(TABLE_PATH, data_version)
+    if table is None or len(table.ids) != len(_df):
+        table = SimilarGames.build(_df)
+        table.save(TABLE_PATH, data_version)
+    return table
+
+
+if __name__ == "__main__":
+    import time
+
+    catalogue = pd.read_csv(COMPLETE_GAMES_CSV_PATH, sep=';', encoding='utf-8')
+    t0 = time.perf_counter()
+    table = SimilarGames.build(catalogue)
+    table.save(TABLE_PATH, file_version(COMPLETE_GAMES_CSV_PATH))
+    print(f"{len(catalogue)} games in {time.perf_counter() - t0:.2f} s -> {TABLE_PATH} "
+          f"({os.path.getsize(TABLE_PATH) / 1024:.0f} KB)")
+    for name in ['Carcassonne', 'Dixit', 'Pandemic']:
+        rows = catalogue.index[catalogue['nom'] == name]
+        if len(rows):
+            similar = table.similar(catalogue['id_jeu'].iloc[rows[0]], limit=5)
+            print(f"  {name}: {[catalogue['nom'].iloc[p] for p, _ in similar]}")
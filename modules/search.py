@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+Full-text search over the game catalogue: accent-folded inverted index with
+BM25 ranking and prefix matching on the last query word (search-as-you-type).
+"""
+import re
+import bisect
+from collections import defaultdict
+import numpy as np
+import streamlit as st
+
+from modules.utils import fold_text
+
+# Field weights for the BM25F-style combined term frequency
+FIELD_WEIGHTS = {'nom': 3.0, 'type': 1.5, 'description': 1.0}
+
+STOPWORDS = frozenset("""
+a au aux avec ce ces cette dans de des du elle en est et il ils je la le les leur
+leurs lui mais me meme ne nous on ou par pas plus pour qu que qui sa se ses son sur
+ta te tes ton tu un une vous y l d s n c j m t qu jeu jeux
+""".split())
+
+MIN_PREFIX_LEN = 2
+MAX_PREFIX_EXPANSIONS = 64
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def stem_fr(token):
+    """Very light French stemmer: folds plural endings (jeux -> jeu, cartes -> carte)."""
+    if len(token) > 3:
+        if token.endswith('aux'):
+            return token[:-3] + 'al'
+        if token[-1] in 'sx':
+            return token[:-1]
+    return token
+
+
+_stem_cache = {}
+
+
+def tokenize(text, stem=True):
+    """Accent-insensitive tokens of a text, stopwords removed."""
+    tokens = _TOKEN_RE.findall(fold_text(text))
+    if stem:
+        cache = _stem_cache
+        return [cache.get(t) or cache.setdefault(t, stem_fr(t)) for t in tokens if t not in STOPWORDS]
+    return [t for t in tokens if t not in STOPWORDS]
+
+
+class SearchIndex:
+    """
+    Inverted index over the rows of a catalogue DataFrame.
+
+    Postings are NumPy arrays (row positions, weighted term frequencies) so a
+    query is a handful of vectorised scatter-adds into one score array.
+    """
+
+    def __init__(self, df, fields=None, k1=1.2, b=0.75, stem=True):
+        self.fields = fields or {f: w for f, w in FIELD_WEIGHTS.items() if f in df.columns}
+        self.k1, self.b, self.stem = k1, b, stem
+        self.n_docs = len(df)
+
+        term_ids = {}
+        post_terms, post_docs, post_tf = [], [], []
+        doc_len = np.zeros(self.n_docs, dtype=np.float32)
+        columns = [(df[f].tolist(), w) for f, w in self.fields.items()]
+
+        for pos in range(self.n_docs):
+            tf = defaultdict(float)
+            for values, weight in columns:
+                value = values[pos]
+                if isinstance(value, str):
+                    for tok in tokenize(value, stem):
+                        tf[tok] += weight
+            for tok, freq in tf.items():
+                tid = term_ids.setdefault(tok, len(term_ids))
+                post_terms.append(tid)
+                post_docs.append(pos)
+                post_tf.append(freq)
+            doc_len[pos] = sum(tf.values())
+
+        # CSR layout: postings of term t are docs[offsets[t]:offsets[t + 1]]
+        post_terms = np.array(post_terms, dtype=np.int32)
+        order = np.argsort(post_terms, kind='stable')
+        self._docs = np.array(post_docs, dtype=np.int32)[order]
+        self._tf = np.array(post_tf, dtype=np.float32)[order]
+        self._offsets = np.zeros(len(term_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(post_terms, minlength=len(term_ids)), out=self._offsets[1:])
+        self._term_ids = term_ids
+        self._terms = sorted(term_ids)
+        self._norm = (self.k1 * (1 - self.b + self.b * doc_len / max(doc_len.mean(), 1e-9))).astype(np.float32)
+
+        # Exact (folded) titles jump to the top of their result list
+        self._titles = defaultdict(list)
+        if 'nom' in df.columns:
+            for pos, name in enumerate(df['nom'].tolist()):
+                if isinstance(name, str):
+                    self._titles[fold_text(name)].append(pos)
+
+    def _df(self, term):
+        tid = self._term_ids[term]
+        return int(self._offsets[tid + 1] - self._offsets[tid])
+
+    def _idf(self, df_t):
+        return np.log(1.0 + (self.n_docs - df_t + 0.5) / (df_t + 0.5))
+
+    def _term_scores(self, term):
+        tid = self._term_ids[term]
+        lo, hi = self._offsets[tid], self._offsets[tid + 1]
+        docs, tf = self._docs[lo:hi], self._tf[lo:hi]
+        scores = self._idf(hi - lo) * tf * (self.k1 + 1) / (tf + self._norm[docs])
+        return docs, scores
+
+    def expand_prefix(self, prefix):
+        """Indexed terms starting with prefix (most frequent first, capped)."""
+        lo = bisect.bisect_left(self._terms, prefix)
+        hi = bisect.bisect_left(self._terms, prefix + '\x7f')
+        terms = self._terms[lo:hi]
+        if len(terms) > MAX_PREFIX_EXPANSIONS:
+            terms = sorted(terms, key=lambda t: -self._df(t))[:MAX_PREFIX_EXPANSIONS]
+        return terms
+
+    def search(self, query, limit=None, prefix=True):
+        """
+        Rank rows for a free-text query.
+
+        Every query word must match (falling back to any word when nothing
+        matches them all); the last word also matches as a prefix.
+        Returns (row positions, scores), best first.
+        """
+        words = _TOKEN_RE.findall(fold_text(query))
+        words = [w for w in words if w not in STOPWORDS] or words
+        if not words or self.n_docs == 0:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+
+        total = np.zeros(self.n_docs, dtype=np.float32)
+        hits = np.zeros(self.n_docs, dtype=np.int16)
+        for i, word in enumerate(words):
+            group = np.zeros(self.n_docs, dtype=np.float32)
+            term = stem_fr(word) if self.stem else word
+            candidates = [term] if term in self._term_ids else []
+            if prefix and i == len(words) - 1 and len(word) >= MIN_PREFIX_LEN:
+                candidates = list(dict.fromkeys(candidates + self.expand_prefix(word)))
+            for t in candidates:
+                docs, scores = self._term_scores(t)
+                group[docs] = np.maximum(group[docs], scores)
+            total += group
+            hits += group > 0
+
+        exact = self._titles.get(fold_text(query))
+        if exact:
+            total[exact] += total.max() + 1.0
+
+        matched = np.flatnonzero(hits == len(words))
+        if matched.size == 0:
+            matched = np.flatnonzero(hits > 0)
+        scores = total[matched]
+        if limit is not None and limit < matched.size:
+            top = np.argpartition(-scores, limit)[:limit]
+            matched, scores = matched[top], scores[top]
+        order = np.argsort(-scores, kind='stable')
+        return matched[order].astype(np.int32), scores[order]
+
+
+@st.cache_resource(show_spinner=False)
+def get_search_index(_df, data_version):
+    """Search index for the catalogue, rebuilt only when data_version changes."""
+    return SearchIndex(_df)
+
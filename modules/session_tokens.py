@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Signed, expiring session tokens carried in the URL:
+base64url(JSON {u: username, iat, exp (ms), jti}) . base64url(HMAC-SHA256), keyed
+with ECHEC_MAP_SESSION_SECRET or else a random secret kept in
+SESSION_SECRET_PATH. validate() checks signature and expiry without the user
+store and remembers accepted tokens in an LRU; the token carries no role, and
+revoke_user() rejects a user's earlier tokens in this process (modules.auth
+also stamps the user record).
+"""
+import os
+import re
+import hmac
+import json
+import time
+import base64
+import hashlib
+import secrets
+import threading
+from collections import OrderedDict
+
+from modules.config import SESSION_SECRET_PATH, SESSION_TTL
+
+CACHE_SIZE = 1_024         # validated tokens remembered
+SECRET_ENV = 'ECHEC_MAP_SESSION_SECRET'
+TOKEN_SHAPE = re.compile(r'[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+')   # base64url payload . signature
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def to_millis(seconds):
+    """Epoch milliseconds, the unit of iat / exp and of revocation times."""
+    return int(seconds * 1000)
+
+
+def load_secret(path=SESSION_SECRET_PATH):
+    """The signing key: from the environment, else from path (created on first use)."""
+    secret = os.environ.get(SECRET_ENV)
+    if secret:
+        return secret.encode('utf-8')
+    try:
+        with open(path, 'rb') as f:
+            secret = f.read()
+        if secret:
+            return secret
+    except OSError:
+        pass
+    secret = secrets.token_bytes(32)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(secret)
+    return secret
+
+
+class SessionTokens:
+    """Issue, validate and revoke tokens signed with one secret (see module docstring)."""
+
+    def __init__(self, secret, ttl=SESSION_TTL, cache_size=CACHE_SIZE):
+        self._secret = secret
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()   # token -> claims
+        self._not_before = {}         # username -> issued-at floor
+        self.stats = {'issued': 0, 'hits': 0, 'misses': 0, 'rejected': 0}
+
+    def _sign(self, payload):
+        return _b64encode(hmac.new(self._secret, payload.encode('ascii'), hashlib.sha256).digest())
+
+    def issue(self, username, now=None):
+        """New token for this user, valid for ttl seconds."""
+        now = to_millis(time.time() if now is None else now)
+        with self._lock:
+            # Issued after a revocation in the same millisecond: still valid
+            now = max(now, self._not_before.get(username, 0))
+            self.stats['issued'] += 1
+        claims = {'u': username, 'iat': now, 'exp': now + to_millis(self.ttl), 'jti': secrets.token_hex(8)}
+        payload = _b64encode(json.dumps(claims, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        return f"{payload}.{self._sign(payload)}"
+
+    def _decode(self, token):
+        """Claims of a well-signed token, or None."""
+        if not TOKEN_SHAPE.fullmatch(token):
+            return None
+        payload, _, signature = token.partition('.')
+        if not hmac.compare_digest(signature, self._sign(payload)):
+            return None
+        try:
+            claims = json.loads(_b64decode(payload))
+        except ValueError:
+            return None
+        if not isinstance(claims, dict) or not {'u', 'iat', 'exp', 'jti'} <= claims.keys():
+            return None
+        return claims
+
+    def _allowed(self, claims, now):
+        return claims['exp'] > now and claims['iat'] >= self._not_before.get(claims['u'], 0)
+
+    def validate(self, token, now=None):
+        """(username, issued at in ms) if the token is genuine, unexpired and not revoked; else None."""
+        if not token or not isinstance(token, str):
+            return None
+        now = to_millis(time.time() if now is None else now)
+        with self._lock:
+            claims = self._cache.get(token)
+            if claims is not None:
+                if self._allowed(claims, now):
+                    self._cache.move_to_end(token)
+                    self.stats['hits'] += 1
+                    return claims['u'], claims['iat']
+                del self._cache[token]
+                self.stats['rejected'] += 1
+                return None
+        claims = self._decode(token)
+        with self._lock:
+            self.stats['misses'] += 1
+            if claims is None or not self._allowed(claims, now):
+                self.stats['rejected'] += 1
+                return None
+            self._cache[token] = claims
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return claims['u'], claims['iat']
+
+    def revoke_user(self, username, now=None):
+        """
+        Reject every token of this user issued until now (logout, password or
+        role change); returns that time in ms, for the user record.
+        """
+        now = to_millis(time.time() if now is None else now)
+        with self._lock:
+            # Past every token issued so far, even in this very millisecond
+            revoked = max(now, self._not_before.get(username, 0))
+            self._not_before[username] = revoked + 1
+            for token in [t for t, c in self._cache.items() if c['u'] == username]:
+                del self._cache[token]
+        return revoked
+
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Pluggable persistence for the app's data: users, forum posts, game requests.
+
+Callers go through the Storage interface (modules.storage.base): get / put
+(with optional compare-and-set) / append / delete / query / replace_all and
+a per-collection version() to poll for outside changes. STORAGE_BACKEND
+picks the implementation:
+- 'files' (default): the JSON / CSV files committed to git, rewritten
+  atomically; every write queues the background git commit.
+- 'sqlite': tables in the forum database (FORUM_DB_PATH), filled from the
+  files the first time it is opened. With FORUM_BACKEND 'sqlite' they go
+  through ForumDB's connection, so there is one database and one writer.
+- 'memory': nothing persists (tests, benchmarks), also filled from the files.
+
+With FORUM_BACKEND 'sqlite' or 'log', the forum store is authoritative for
+posts and requests: the forum_posts / game_requests collections then hold
+only the rows imported from the files and are not written. Users always
+live here.
+"""
+import threading
+
+from modules.config import (STORAGE_BACKEND, FORUM_BACKEND, FORUM_DB_PATH, USERS_JSON_PATH,
+                            FORUM_CSV_PATH, GAME_REQUESTS_CSV_PATH)
+from modules.storage.base import Storage, Collection, VersionConflict, new_key
+from modules.storage.files import FileStorage
+from modules.storage.memory import MemoryStorage
+from modules.storage.sqlite import SQLiteStorage
+
+USERS = 'users'
+FORUM_POSTS = 'forum_posts'
+GAME_REQUESTS = 'game_requests'
+
+COLLECTIONS = {
+    USERS: Collection(USERS_JSON_PATH, 'username'),
+    FORUM_POSTS: Collection(FORUM_CSV_PATH, 'id'),
+    GAME_REQUESTS: Collection(GAME_REQUESTS_CSV_PATH, 'id'),
+}
+
+BACKENDS = ('files', 'sqlite', 'memory')
+
+
+def _commit_files(collection):
+    from modules.git_ops import queue_commit
+    queue_commit(notify=False)
+
+
+def open_storage(backend=STORAGE_BACKEND, collections=COLLECTIONS):
+    """A new Storage of the given backend (see module docstring)."""
+    if backend == 'files':
+        from modules.git_ops import WORKTREE_LOCK
+        return FileStorage(collections, on_write=_commit_files, lock=WORKTREE_LOCK)
+    if backend == 'sqlite':
+        shared = None
+        if FORUM_BACKEND == 'sqlite':
+            from modules.forum_db import get_forum_db
+            shared = get_forum_db().shared_connection()
+        storage = SQLiteStorage(FORUM_DB_PATH, collections, shared)
+    elif backend == 'memory':
+        storage = MemoryStorage(collections)
+    else:
+        raise ValueError(f"Unknown storage backend {backend!r} (expected one of {', '.join(BACKENDS)})")
+    storage.import_from(FileStorage(collections))
+    return storage
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage():
+    """Process-wide Storage of STORAGE_BACKEND (also used from background threads)."""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            _storage = open_storage()
+        return _storage
+
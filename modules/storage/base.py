@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+The Storage interface shared by every backend.
+
+A storage holds named collections of JSON-like records (dicts of str,
+int, float, bool, None and nested lists / dicts). Each collection has a
+key field; records are addressed by its value and kept in insertion
+order. put() stores the key in the record's key field; records written
+without a key get one (new_key()).
+
+Versions are opaque tokens compared for equality:
+- version(collection) changes whenever the collection does, including
+  through another process or an outside edit when the backend can see
+  it. Readers poll it to know when to reload.
+- every record has its own version, returned by get() and put();
+  put(..., expected=version) is a compare-and-set that raises
+  VersionConflict when the record changed since it was read.
+"""
+import uuid
+from dataclasses import dataclass
+
+
+class VersionConflict(Exception):
+    """put(expected=...) found another version of the record."""
+
+
+@dataclass(frozen=True)
+class Collection:
+    path: str    # file of the 'files' backend (.json or .csv)
+    key: str     # field holding the record key
+
+
+def new_key():
+    """Random key for a record written without one."""
+    return uuid.uuid4().hex[:16]
+
+
+def matches(record, where):
+    """True if record has every field value of where (None = no filter)."""
+    return not where or all(record.get(field) == value for field, value in where.items())
+
+
+class Storage:
+    """Base class: backends implement every method except append()."""
+
+    def __init__(self, collections):
+        self.collections = collections   # name -> Collection
+
+    def _keyed(self, collection, record):
+        """(key, record), giving the record a new key if it has none."""
+        field = self.collections[collection].key
+        key = record.get(field)
+        if key is None or key == '':
+            key = new_key()
+            record = dict(record, **{field: key})
+        return key, record
+
+    def _with_key(self, collection, key, record):
+        """Copy of record with its key field set to key."""
+        return dict(record, **{self.collections[collection].key: key})
+
+    def get(self, collection, key):
+        """(record, version), or None if there is no such record."""
+        raise NotImplementedError
+
+    def put(self, collection, key, record, expected=None):
+        """Insert or replace one record; returns its new version."""
+        raise NotImplementedError
+
+    def append(self, collection, record):
+        """Insert a record, under a new key if it has none; returns the key."""
+        key, record = self._keyed(collection, record)
+        self.put(collection, key, record)
+        return key
+
+    def delete(self, collection, key):
+        """Remove one record; False if there was none."""
+        raise NotImplementedError
+
+    def query(self, collection, where=None):
+        """Records in insertion order, optionally only those matching where ({field: value})."""
+        raise NotImplementedError
+
+    def replace_all(self, collection, records):
+        """Replace the whole collection by records, in that order (bulk save)."""
+        raise NotImplementedError
+
+    def version(self, collection):
+        """Change token of the whole collection."""
+        raise NotImplementedError
+
+    def import_from(self, source):
+        """Copy every collection this storage has no record of from source."""
+        for name in self.collections:
+            if not self.query(name):
+                records = source.query(name)
+                if records:
+                    self.replace_all(name, records)
+
+    def close(self):
+        pass
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+Flat-file storage: one file per collection, as the app has always kept
+its data (users.json, forum_comments.csv, game_requests.csv).
+
+.json files hold a list of objects, .csv files one row per record (read
+as strings, '' for empty cells). A file is parsed again only when its
+stamp (mtime, inode, size) changed, so outside edits and git pulls are
+seen. Every write rewrites the file atomically (temp file, fsync,
+rename) and then calls on_write(collection): the app passes the
+background git commit there, and nothing else here knows about git.
+
+A record's version is a hash of its content, so it holds across
+processes.
+"""
+import os
+import json
+import hashlib
+import threading
+import pandas as pd
+
+from modules.storage.base import Storage, VersionConflict, matches
+
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_ino, st.st_size)
+
+
+def record_version(record):
+    return hashlib.sha1(json.dumps(record, sort_keys=True, ensure_ascii=False, default=str)
+                        .encode('utf-8')).hexdigest()[:12]
+
+
+def file_format(path):
+    """'csv' or 'json', from the file name."""
+    return 'csv' if path.endswith('.csv') else 'json'
+
+
+def read_records(source, fmt):
+    """Records of a CSV / JSON file (path or file object); [] for an empty file."""
+    if fmt == 'csv':
+        try:
+            return pd.read_csv(source, encoding='utf-8', dtype=str, keep_default_na=False).to_dict('records')
+        except pd.errors.EmptyDataError:
+            return []
+    if isinstance(source, str):
+        with open(source, 'r', encoding='utf-8') as f:
+            text = f.read()
+    else:
+        text = source.read()
+    return json.loads(text) if text.strip() else []
+
+
+def write_records(path, records, fmt):
+    """Replace path atomically (temp file, fsync, rename) in the app's own layout."""
+    tmp = f"{path}.tmp"
+    if fmt == 'csv':
+        pd.DataFrame(records).to_csv(tmp, index=False, encoding='utf-8')
+    else:
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(records, f, indent=4, ensure_ascii=False)
+    with open(tmp, 'rb') as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class FileStorage(Storage):
+
+    def __init__(self, collections, on_write=None, lock=None):
+        super().__init__(collections)
+        self.on_write = on_write
+        # Shared with whatever else rewrites the files (the git sync passes its worktree lock)
+        self._lock = lock if lock is not None else threading.RLock()
+        self._cache = {}   # name -> (stamp, records, {key: position})
+
+    # --- Files ---
+
+    def _load(self, collection):
+        """(records, index) of the current file contents (caller holds the lock)."""
+        path = self.collections[collection].path
+        stamp = _stamp(path)
+        cached = self._cache.get(collection)
+        if cached is not None and cached[0] == stamp:
+            return cached[1], cached[2]
+        try:
+            records = read_records(path, file_format(path)) if stamp is not None else []
+        except (OSError, ValueError):
+            records = []
+        field = self.collections[collection].key
+        index = {r.get(field): i for i, r in enumerate(records) if r.get(field) not in (None, '')}
+        self._cache[collection] = (stamp, records, index)
+        return records, index
+
+    def _write(self, collection, records):
+        """Replace the file atomically (caller holds the lock)."""
+        path = self.collections[collection].path
+        write_records(path, records, file_format(path))
+        field = self.collections[collection].key
+        index = {r.get(field): i for i, r in enumerate(records) if r.get(field) not in (None, '')}
+        self._cache[collection] = (_stamp(path), records, index)
+        if self.on_write is not None:
+            self.on_write(collection)
+
+    # --- Storage ---
+
+    def get(self, collection, key):
+        with self._lock:
+            records, index = self._load(collection)
+            if key not in index:
+                return None
+            record = dict(records[index[key]])
+        return record, record_version(record)
+
+    def put(self, collection, key, record, expected=None):
+        with self._lock:
+            records, index = self._load(collection)
+            pos = index.get(key)
+            if expected is not None and (pos is None or record_version(records[pos]) != expected):
+                raise VersionConflict(f"{collection}/{key}")
+            records = list(records)
+            record = self._with_key(collection, key, record)
+            if pos is None:
+                records.append(record)
+            else:
+                records[pos] = record
+            self._write(collection, records)
+        return record_version(record)
+
+    def delete(self, collection, key):
+        with self._lock:
+            records, index = self._load(collection)
+            pos = index.get(key)
+            if pos is None:
+                return False
+            self._write(collection, records[:pos] + records[pos + 1:])
+            return True
+
+    def query(self, collection, where=None):
+        with self._lock:
+            records, _ = self._load(collection)
+            return [dict(r) for r in records if matches(r, where)]
+
+    def replace_all(self, collection, records):
+        with self._lock:
+            self._write(collection, [self._keyed(collection, r)[1] for r in records])
+
+    def version(self, collection):
+        with self._lock:
+            return _stamp(self.collections[collection].path)
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+In-memory storage: dicts behind a lock, nothing persists.
+
+Baseline of the storage benchmark and a stand-in for tests.
+"""
+import copy
+import threading
+import itertools
+
+from modules.storage.base import Storage, VersionConflict, matches
+
+
+class MemoryStorage(Storage):
+
+    def __init__(self, collections):
+        super().__init__(collections)
+        self._lock = threading.RLock()
+        self._records = {name: {} for name in collections}   # key -> (record, version)
+        self._versions = dict.fromkeys(collections, 0)
+        self._counter = itertools.count(1)
+
+    def get(self, collection, key):
+        with self._lock:
+            found = self._records[collection].get(key)
+            return None if found is None else (copy.deepcopy(found[0]), found[1])
+
+    def put(self, collection, key, record, expected=None):
+        with self._lock:
+            records = self._records[collection]
+            if expected is not None:
+                current = records.get(key)
+                if current is None or current[1] != expected:
+                    raise VersionConflict(f"{collection}/{key}")
+            version = next(self._counter)
+            records[key] = (copy.deepcopy(self._with_key(collection, key, record)), version)
+            self._versions[collection] += 1
+            return version
+
+    def delete(self, collection, key):
+        with self._lock:
+            if self._records[collection].pop(key, None) is None:
+                return False
+            self._versions[collection] += 1
+            return True
+
+    def query(self, collection, where=None):
+        with self._lock:
+            return [copy.deepcopy(r) for r, _ in self._records[collection].values() if matches(r, where)]
+
+    def replace_all(self, collection, records):
+        with self._lock:
+            fresh = {}
+            for record in records:
+                key, record = self._keyed(collection, record)
+                fresh[key] = (copy.deepcopy(record), next(self._counter))
+            self._records[collection] = fresh
+            self._versions[collection] += 1
+
+    def version(self, collection):
+        with self._lock:
+            return self._versions[collection]
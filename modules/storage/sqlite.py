@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+SQLite storage: every collection in one WAL database.
+
+Records are JSON documents in one table keyed by (collection, key), with
+an insertion sequence for ordering and an integer version per record.
+Each collection row carries a version bumped by every write, so
+version() also sees other processes' commits. query(where=...) filters
+with json_extract in SQL. The tables can share a connection (and its
+lock) with another user of the same database.
+"""
+import json
+import sqlite3
+import threading
+
+from modules.storage.base import Storage, VersionConflict
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS collections (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0,
+    next_seq INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS records (
+    collection TEXT NOT NULL,
+    key TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (collection, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS records_order ON records (collection, seq);
+"""
+
+
+class SQLiteStorage(Storage):
+
+    def __init__(self, path, collections, shared=None):
+        """shared: (connection, lock) already open on path, left open by close()."""
+        super().__init__(collections)
+        self.path = path
+        self._owned = shared is None
+        if shared is None:
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._lock = threading.Lock()
+        else:
+            self._conn, self._lock = shared
+        with self._lock:
+            self._conn.executescript(SCHEMA)
+            self._conn.executemany('INSERT OR IGNORE INTO collections (name) VALUES (?)', [(n,) for n in collections])
+
+    def _transaction(self, fn):
+        """Run fn(conn) in one BEGIN IMMEDIATE transaction."""
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                result = fn(self._conn)
+                self._conn.execute('COMMIT')
+                return result
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    @staticmethod
+    def _bump(conn, collection, seqs=0):
+        """Bump the collection version; returns the first of seqs new sequence numbers."""
+        return conn.execute('UPDATE collections SET version = version + 1, next_seq = next_seq + ? '
+                            'WHERE name = ? RETURNING next_seq - ?', (seqs, collection, seqs)).fetchone()[0]
+
+    def get(self, collection, key):
+        with self._lock:
+            row = self._conn.execute('SELECT data, version FROM records WHERE collection = ? AND key = ?',
+                                     (collection, key)).fetchone()
+        return None if row is None else (json.loads(row[0]), row[1])
+
+    def put(self, collection, key, record, expected=None):
+        data = json.dumps(self._with_key(collection, key, record), ensure_ascii=False)
+
+        def write(conn):
+            row = conn.execute('SELECT version FROM records WHERE collection = ? AND key = ?',
+                               (collection, key)).fetchone()
+            if expected is not None and (row is None or row[0] != expected):
+                raise VersionConflict(f"{collection}/{key}")
+            if row is None:
+                seq = self._bump(conn, collection, 1)
+                conn.execute('INSERT INTO records (collection, key, seq, version, data) VALUES (?, ?, ?, 1, ?)',
+                             (collection, key, seq, data))
+                return 1
+            self._bump(conn, collection)
+            conn.execute('UPDATE records SET version = version + 1, data = ? WHERE collection = ? AND key = ?',
+                         (data, collection, key))
+            return row[0] + 1
+
+        return self._transaction(write)
+
+    def delete(self, collection, key):
+        def remove(conn):
+            if conn.execute('DELETE FROM records WHERE collection = ? AND key = ?', (collection, key)).rowcount == 0:
+                return False
+            self._bump(conn, collection)
+            return True
+
+        return self._transaction(remove)
+
+    def query(self, collection, where=None):
+        sql = 'SELECT data FROM records WHERE collection = ?'
+        params = [collection]
+        for field, value in (where or {}).items():
+            sql += ' AND json_extract(data, ?) = ?'
+            params += [f'$."{field}"', value]
+        with self._lock:
+            rows = self._conn.execute(sql + ' ORDER BY seq', params).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def replace_all(self, collection, records):
+        rows = [self._keyed(collection, r) for r in records]
+
+        def replace(conn):
+            conn.execute('DELETE FROM records WHERE collection = ?', (collection,))
+            seq = self._bump(conn, collection, len(rows))
+            conn.executemany('INSERT OR REPLACE INTO records (collection, key, seq, version, data) VALUES (?, ?, ?, 1, ?)',
+                             [(collection, key, seq + i, json.dumps(r, ensure_ascii=False))
+                              for i, (key, r) in enumerate(rows)])
+
+        self._transaction(replace)
+
+    def version(self, collection):
+        with self._lock:
+            return self._conn.execute('SELECT version FROM collections WHERE name = ?', (collection,)).fetchone()[0]
+
+    def close(self):
+        if self._owned:
+            with self._lock:
+                self._conn.close()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Users indexed by username, shared by every session: UserRepository keeps the
+USERS collection in a dict, so get() is answered from memory, reloads it when
+the storage version changed (checked at most every POLL_INTERVAL seconds),
+and writes through modules.storage, updating the index at once.
+"""
+import time
+import threading
+
+from modules.storage import USERS
+
+POLL_INTERVAL = 2.0   # seconds between checks of the storage for outside changes
+
+
+class UserRepository:
+    """username -> user record over a Storage's USERS collection."""
+
+    def __init__(self, storage, poll_interval=POLL_INTERVAL):
+        self.storage = storage
+        self.poll_interval = poll_interval
+        self._lock = threading.RLock()
+        self._users = {}
+        self._version = None
+        self._next_poll = 0.0
+        self.reload()
+
+    # --- Index ---
+
+    def reload(self):
+        """Rebuild the index from the storage."""
+        with self._lock:
+            self._version = self.storage.version(USERS)
+            self._users = {u['username']: u for u in self.storage.query(USERS) if u.get('username')}
+            self._next_poll = time.monotonic() + self.poll_interval
+
+    def _refresh(self, force=False):
+        """Reload if the storage changed since the index was built; rate-limited unless force."""
+        now = time.monotonic()
+        if not force and now < self._next_poll:
+            return
+        with self._lock:
+            self._next_poll = now + self.poll_interval
+            if self.storage.version(USERS) != self._version:
+                self.reload()
+
+    def _synced(self):
+        """Our own write changed the storage: the index already matches (caller holds the lock)."""
+        self._version = self.storage.version(USERS)
+
+    # --- Reads ---
+
+    def get(self, username):
+        """Copy of the user's record, or None."""
+        self._refresh()
+        with self._lock:
+            user = self._users.get(username)
+            return dict(user) if user is not None else None
+
+    def all(self):
+        """Copies of every user record, in storage order."""
+        self._refresh()
+        with self._lock:
+            return [dict(u) for u in self._users.values()]
+
+    # --- Writes ---
+
+    def add(self, user):
+        """Store a new user; False if the username is taken."""
+        with self._lock:
+            self._refresh(force=True)
+            username = user['username']
+            if username in self._users:
+                return False
+            self.storage.put(USERS, username, user)
+            self._users[username] = dict(user)
+            self._synced()
+            return True
+
+    def put(self, user):
+        """Store a user, new or not (one record rewritten)."""
+        with self._lock:
+            self.storage.put(USERS, user['username'], user)
+            self._users[user['username']] = dict(user)
+            self._synced()
+
+    def save_all(self, users):
+        """Replace every user (admin edits)."""
+        with self._lock:
+            self.storage.replace_all(USERS, users)
+            self._users = {u['username']: dict(u) for u in users if u.get('username')}
+            self._synced()
+
@@ -3,10 +3,11 @@
 Utility functions: string normalization, geolocation, image/menu matching, encoding.
 """
 import os
+import re
 import base64
 import chardet
-import difflib
 import unicodedata
+import numpy as np
 import pandas as pd
 from math import radians, cos, sin, asin, sqrt
 from geopy.geocoders import Nominatim
@@ -23,6 +24,22 @@ def normalize_string(s):
     return ns.lower().strip().replace(' ', '_').replace('-', '_')
 
 
+def fold_text(s):
+    """Accent-insensitive, lowercase form of free text; punctuation becomes spaces."""
+    if not isinstance(s, str):
+        return ""
+    ns = unicodedata.normalize('NFKD', s).encode('ASCII', 'ignore').decode('utf-8').lower()
+    return re.sub(r'[^a-z0-9]+', ' ', ns).strip()
+
+
+def file_version(path):
+    """Cheap change stamp for a data file (mtime in ns, 0 if missing)."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
+
 def haversine(lon1, lat1, lon2, lat2):
     """
     Calculate the great circle distance between two points
@@ -37,6 +54,14 @@ def haversine(lon1, lat1, lon2, lat2):
     return c * r
 
 
+def haversine_array(lon1, lat1, lon2, lat2):
+    """Vectorized haversine (km) from one point to arrays of points."""
+    lon1, lat1 = np.radians(lon1), np.radians(lat1)
+    lon2, lat2 = np.radians(np.asarray(lon2, dtype=float)), np.radians(np.asarray(lat2, dtype=float))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371 * np.arcsin(np.sqrt(a))
+
+
 def get_coordinates(address):
     """Geocode an address to (lat, lon) using Nominatim."""
     geo_locator = Nominatim(user_agent="echec_map_app")
@@ -68,6 +93,18 @@ def find_closest_bar(user_lat, user_lon, df):
     return closest_bar, min_dist
 
 
+def _best_file_match(name, directory, files, min_score=0.5):
+    """Closest file (by stem) to a bar name using the shared trigram index."""
+    from modules.fuzzy import get_fuzzy_index
+
+    if not files:
+        return None
+    stems = [os.path.splitext(f)[0] for f in files]
+    index = get_fuzzy_index(f"files:{directory}", stems, tuple(files))
+    matches = index.lookup(name, k=1, min_score=min_score)
+    return files[matches[0][2]] if matches else None
+
+
 def find_best_image_match(bar_name, images_dir=None):
     """Find the best matching image file for a given bar name using fuzzy matching."""
     if images_dir is None:
@@ -90,11 +127,9 @@ def find_best_image_match(bar_name, images_dir=None):
             return os.path.join(images_dir, img_file)
 
     # 2. Fuzzy match
-    norm_map = {normalize_string(os.path.splitext(f)[0]): f for f in image_files}
-    matches = difflib.get_close_matches(normalized_name, norm_map.keys(), n=1, cutoff=0.6)
-
-    if matches:
-        return os.path.join(images_dir, norm_map[matches[0]])
+    match = _best_file_match(bar_name, images_dir, image_files)
+    if match:
+        return os.path.join(images_dir, match)
 
     return None
 
@@ -127,10 +162,9 @@ def get_menu_pdf_path(bar_name):
         if normalize_string(os.path.splitext(f)[0]) == normalized_name:
             return os.path.join(MENUS_DIR, f)
 
-    norm_map = {normalize_string(os.path.splitext(f)[0]): f for f in files}
-    matches = difflib.get_close_matches(normalized_name, norm_map.keys(), n=1, cutoff=0.5)
-    if matches:
-        return os.path.join(MENUS_DIR, norm_map[matches[0]])
+    match = _best_file_match(bar_name, MENUS_DIR, files)
+    if match:
+        return os.path.join(MENUS_DIR, match)
 
     return None
 